@@ -10,15 +10,131 @@ class Settings(BaseSettings):
     ollama_url: str = "http://localhost:11434"
     ollama_chat_model: str = "gemma3"
     ollama_embed_model: str = "nomic-embed-text"
+    ollama_stream: bool = True  # stream /api/chat deltas to the client as they arrive
+    ollama_num_ctx: int = 4096  # sent as options.num_ctx; the prompt budget is derived from it
+    ollama_keep_alive: str = "30m"  # per-request keep_alive: how long a model stays loaded after use
+    ollama_keep_warm_interval_s: float = 600.0  # keep-warm tick; keep it well below keep_alive
+    # Startup warm-up gating /ready (app/services/warmup.py)
+    warmup_enabled: bool = True
+    warmup_step_timeout_s: float = 120.0
+    warmup_retry_s: float = 5.0
+    # Shared HTTP transport (app/services/ollama_transport.py)
+    ollama_pool_max_connections: int = 32
+    ollama_pool_max_keepalive: int = 16
+    ollama_keepalive_expiry_s: float = 60.0
+    ollama_connect_timeout_s: float = 5.0
+    ollama_read_timeout_s: float = 120.0
+    ollama_max_retries: int = 2
+    ollama_retry_backoff_s: float = 0.25
+    # LLM admission control (app/services/llm_scheduler.py)
+    llm_max_concurrency: int = 2  # generations in flight at once; match OLLAMA_NUM_PARALLEL
+    llm_background_max_slots: int = 1  # slots memory/ingestion work may hold; the rest stay free for chat
+    llm_chat_max_wait_s: float = 8.0  # chat queue SLO: a longer (predicted) wait gets a "busy" frame
+    llm_background_max_wait_s: float | None = None  # None: background work waits as long as it takes
+    llm_hold_estimate_s: float = 4.0  # initial guess of a generation's duration, refined as calls finish
     embedding_dim: int = 768
     embedding_similarity: str = "cosine"
 
+    # Query embedding cache (app/services/embedding_cache.py)
+    embed_cache_enabled: bool = True
+    embed_cache_max_entries: int = 4096
+    embed_cache_ttl_s: float = 24 * 3600
+    embed_cache_path: str | None = None  # e.g. ".cache/query_embeddings.bin" to survive restarts
+
     qdrant_url: str = "http://localhost:6333"
     qdrant_collection_docs: str = "kb_docs"
     qdrant_collection_memory: str = "user_memory"
+    # Per-collection search timeouts (seconds); a slow collection is skipped, not awaited
+    qdrant_kb_search_timeout_s: float = 2.0
+    qdrant_mem_search_timeout_s: float = 1.0
+    # Shared clients and writes (app/services/qdrant_store.py)
+    qdrant_prefer_grpc: bool = False  # gRPC for collection/points calls; needs qdrant_grpc_port reachable
+    qdrant_grpc_port: int = 6334
+    qdrant_timeout_s: int | None = None  # client request timeout; None keeps qdrant-client's default
+    qdrant_write_batch_size: int = 256  # points per upsert request
+    # Memory upserts: True waits until indexed; False returns once logged, but then the
+    # next turn's dedup search can miss a memory written moments earlier.
+    # None: wait while memory_dedup_enabled, otherwise don't.
+    qdrant_memory_write_wait: bool | None = None
+
+    # KB retrieval backend: "qdrant" (HTTP) or "memory" (in-process NumPy index of kb_docs)
+    kb_retriever_backend: str = "qdrant"
+    kb_index_dtype: str = "float32"  # float16 halves memory at a small precision cost
+    kb_index_reload_check_s: float = 5.0  # how often to look for a new KB manifest version
+
+    # Hybrid retrieval: BM25 next to dense search, fused by reciprocal rank fusion
+    hybrid_retrieval_enabled: bool = True
+    hybrid_candidate_k: int = 10  # candidates fetched per ranker before fusion
+    hybrid_rrf_k: int = 60  # RRF constant: score = sum(1 / (k + rank))
+    kb_lexical_path: str = ".cache/kb_bm25.json"  # BM25 snapshot written by the KB indexer
+    # Memory BM25 is per user, read from Qdrant on demand: other workers' writes show up within the TTL
+    memory_lexical_ttl_s: float = 60.0
+    memory_lexical_max_users: int = 1024
+    retrieval_max_snippets: int = 6  # fused snippets handed to the prompt
+
+    # Post-retrieval rerank: cosine relevance floor, score-gap cutoff, MMR diversity
+    # (thresholds are cosine similarities; tune with app/testing/retrieval_eval.py)
+    rerank_enabled: bool = True
+    rerank_floor: float = 0.45
+    rerank_gap: float = 0.12
+    rerank_mmr_lambda: float = 0.7  # 1.0 = relevance only, lower = more diversity
+    rerank_redundancy: float = 0.95  # skip snippets this similar to one already packed
+
+    # Prompt assembly: one token budget for system prompt + context + history + query
+    prompt_max_input_tokens: int = 1024  # ~ the old 1800-char context + 1200-char history limits
+    prompt_reserve_output_tokens: int = 512  # kept free in num_ctx for the answer
+    prompt_context_share: float = 0.6  # of what system prompt and query leave; the rest is history
+    prompt_message_overhead_tokens: int = 4  # chat-template tokens per message
+    prompt_min_snippet_tokens: int = 24  # don't pack trimmed snippets shorter than this
+    prompt_tokenizer_path: str | None = None  # tokenizer.json for exact counts (needs `tokenizers`)
+    prompt_chars_per_token: float = 3.5  # estimator start value, calibrated from Ollama counts
+
+    # Semantic answer cache for knowledge-only turns (no memory docs in context); opt-in
+    answer_cache_enabled: bool = False
+    answer_cache_threshold: float = 0.95  # min cosine between query embeddings for a hit
+    answer_cache_max_entries: int = 1024
+    answer_cache_ttl_s: float = 6 * 3600
+
+    # Cross-caller embedding batching (app/services/embed_batcher.py)
+    embed_batch_max_size: int = 32  # inputs per /api/embed request
+    embed_batch_max_wait_ms: float = 10.0  # memory/ingestion: how long a request waits for company
+    embed_batch_queries: bool = False  # also batch chat query embeddings (adds up to the wait below to TTFT)
+    embed_batch_query_wait_ms: float = 2.0
+    # KB ingestion (app/services/ingestion.py); sizes in characters
+    kb_folder: str = "./context_doc"
+    ingest_chunk_size: int = 600  # matches the per-snippet budget of the prompt context
+    ingest_chunk_overlap: int = 100
+    ingest_embed_batch_size: int = 16
+    ingest_embed_concurrency: int = 2
+    ingest_upsert_batch_size: int = 64
+    kb_manifest_path: str = ".cache/kb_manifest.json"  # content hashes + chunk ids of what is indexed
+    kb_watch_enabled: bool = False  # server polls kb_folder and re-indexes changed files
+    kb_watch_interval_s: float = 10.0
+
+    # Background memory summarization (app/services/memory_queue.py)
+    memory_queue_maxsize: int = 256  # pending turns across all sessions
+    memory_workers: int = 2
+    memory_coalesce_max_turns: int = 4
+    memory_coalesce_window_s: float = 2.0
+    memory_drop_policy: str = "drop_oldest"  # drop_oldest | drop_newest | block
+    memory_enqueue_timeout_s: float = 0.5  # only used by the "block" policy
+    memory_write_batch_size: int = 16
+    memory_write_window_s: float = 0.5
+    memory_drain_timeout_s: float = 10.0
+    # Near-duplicate suppression on memory writes (cosine similarity)
+    memory_dedup_enabled: bool = True
+    memory_dedup_threshold: float = 0.92
+    memory_dedup_mode: str = "touch"  # touch: refresh timestamp/hit_count | merge: also append new bullets
+    memory_dedup_scope: str = "session"  # session | user; "session" matches the chat retriever's filter
+    memory_merge_max_lines: int = 8
 
     session_backend: str = "memory"
+    session_max_sessions: int = 10000
+    session_idle_ttl_s: float = 3600.0
+    session_sweep_interval_s: float = 60.0
+    session_history_window: int = 10  # messages kept per session == what the prompt builder reads
     redis_url: str | None = None
+    session_redis_prefix: str = "wellbot:session:"
 
     mongodb_uri: str = "placeholder"
     mongodb_db: str = "placeholder"
@@ -1,25 +1,153 @@
+import asyncio
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
+from app.config import settings
 from app.routers import ws_chat
-from app.services.qdrant_store import bootstrap_qdrant
+from app.services.answer_cache import answer_cache
+from app.services.embed_batcher import background_embedder, query_embedder
+from app.services.embedding_cache import query_embedding_cache
+from app.services.kb_indexer import KBIndexer
+from app.services.llm_scheduler import llm_scheduler
+from app.services.memory_queue import memory_queue
+from app.services.ollama_transport import close_ollama_transports, get_ollama_transport
+from app.services.qdrant_store import bootstrap_qdrant, close_qdrant_clients
+from app.services.warmup import Warmup
+from app.state.session_store import session_backend
 from app.utils.logging import get_logger
+from app.utils.metrics import CONTENT_TYPE, cache_samples, registry
 
 logger = get_logger(__name__)
 
+
+def _embed_batchers():
+    yield "background", background_embedder
+    if query_embedder is not None:
+        yield "query", query_embedder
+
+
+# Scrape-time metrics: read from their owners only when /metrics is hit
+registry.callback(
+    "wellbot_memory_queue_depth", "Turns waiting for memory summarization.", "gauge",
+    lambda: {(): memory_queue.stats()["depth"]},
+)
+registry.callback(
+    "wellbot_ollama_in_flight", "Ollama HTTP calls currently open.", "gauge",
+    lambda: {(): get_ollama_transport().stats()["in_flight"]},
+)
+registry.callback(
+    "wellbot_llm_queue_depth", "Requests waiting for an LLM slot, by priority.", "gauge",
+    lambda: {(p,): n for p, n in llm_scheduler.stats()["waiting"].items()},
+    ["priority"],
+)
+registry.callback(
+    "wellbot_llm_slots_active", "LLM slots in use, by priority.", "gauge",
+    lambda: {(p,): n for p, n in llm_scheduler.stats()["active"].items()},
+    ["priority"],
+)
+registry.callback(
+    "wellbot_cache_lookups_total", "Cache lookups by cache and result.", "counter",
+    lambda: cache_samples([("answer", answer_cache), ("query_embedding", query_embedding_cache)]),
+    ["cache", "result"],
+)
+registry.callback(
+    "wellbot_embed_batches_total", "Batched /api/embed calls, by batcher.", "counter",
+    lambda: {(name,): b.stats()["batches"] for name, b in _embed_batchers()},
+    ["batcher"],
+)
+registry.callback(
+    "wellbot_embed_inputs_total", "Texts submitted for embedding, by batcher.", "counter",
+    lambda: {(name,): b.stats()["inputs"] for name, b in _embed_batchers()},
+    ["batcher"],
+)
+
+
 def create_app() -> FastAPI:
     app = FastAPI(title="Well-Bot Realtime RAG")
 
     # Routers
     app.include_router(ws_chat.router)
 
+    background: list[asyncio.Task] = []
+    warmup = Warmup(ws_chat.pipeline)
+
     @app.on_event("startup")
     async def startup_event():
         logger.info("Bootstrapping Qdrant collections")
         bootstrap_qdrant()
+        await memory_queue.start()
+        background.append(asyncio.create_task(session_backend.run_sweeper()))
+        if settings.kb_watch_enabled:
+            background.append(asyncio.create_task(KBIndexer().watch()))
+        if settings.warmup_enabled:
+            # Models, Qdrant connections and in-process indexes; flips /ready when done
+            background.append(asyncio.create_task(warmup.run_then_keep_warm()))
+        else:
+            warmup.ready = True
+
+    @app.on_event("shutdown")
+    async def shutdown_event():
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        await memory_queue.stop()
+        await session_backend.close()
+        if query_embedding_cache:
+            query_embedding_cache.save()
+        await close_ollama_transports()
+        await close_qdrant_clients()
 
     @app.get("/health")
     async def health():
+        # Liveness only; use /ready to know whether turns will be served warm
         return {"status": "ok"}
 
+    @app.get("/ready")
+    async def ready():
+        status = warmup.status()
+        return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+    @app.get("/metrics")
+    async def metrics():
+        # Prometheus text format; no external collector needed to read it
+        return Response(registry.render(), media_type=CONTENT_TYPE)
+
+    @app.get("/stats/ollama")
+    async def ollama_stats():
+        # Pool occupancy and retry counters of the shared Ollama transport
+        return get_ollama_transport().stats()
+
+    @app.get("/stats/llm_scheduler")
+    async def llm_scheduler_stats():
+        # Slots, queue depth per priority, rejections (busy frames) and wait times
+        return llm_scheduler.stats()
+
+    @app.get("/stats/embed_batcher")
+    async def embed_batcher_stats():
+        # Batch sizes actually achieved (mean_batch) vs. the configured max
+        return {name: b.stats() for name, b in _embed_batchers()}
+
+    @app.get("/stats/embed_cache")
+    async def embed_cache_stats():
+        return query_embedding_cache.stats() if query_embedding_cache else {"enabled": False}
+
+    @app.get("/stats/answer_cache")
+    async def answer_cache_stats():
+        return answer_cache.stats() if answer_cache else {"enabled": False}
+
+    @app.get("/stats/sessions")
+    async def session_stats():
+        return await session_backend.stats()
+
+    @app.get("/stats/kb_index")
+    async def kb_index_stats():
+        kb_index = ws_chat.pipeline.dual_ret.kb_index
+        return kb_index.stats() if kb_index is not None else {"backend": "qdrant"}
+
+    @app.get("/stats/memory_queue")
+    async def memory_queue_stats():
+        return memory_queue.stats()
+
     return app
 
 app = create_app()
@@ -4,15 +4,19 @@ from __future__ import annotations
 
 import asyncio
 import json
-from typing import Any
+import math
+from typing import Any, Optional
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
 
-from app.schemas import ChatIn, TokenOut, MetaOut, DoneOut, ErrorOut
-from app.state.session_store import session_store
+from app.schemas import ChatIn, CancelIn, CancelledOut, TokenOut, MetaOut, DoneOut, ErrorOut
+from app.state.session_store import session_backend
 from app.utils.logging import get_logger
+from app.utils.metrics import TURNS_CANCELLED, TURNS_IN_FLIGHT, WS_CONNECTIONS, count_error
 from app.services.RAG_pipeline import RAGPipeline
-from app.services.memory_summarizer import memory_summarizer
+from app.services.llm_scheduler import LLMBusy
+from app.services.memory_queue import memory_queue
 
 router = APIRouter()
 logger = get_logger(__name__)
@@ -21,10 +25,117 @@ logger = get_logger(__name__)
 pipeline = RAGPipeline()
 
 
+class _Turn:
+    """The in-flight turn of one socket (at most one runs at a time)."""
+
+    def __init__(self, websocket: WebSocket) -> None:
+        self.websocket = websocket
+        self.task: Optional[asyncio.Task] = None
+
+    async def cancel(self, reason: str) -> None:
+        """
+        Abort the turn (retrieval, Ollama request) and wait until it has unwound.
+        The client gets a cancellation frame unless it is the one that went away.
+        """
+        if self.task is None or self.task.done():
+            return
+        self.task.cancel()
+        await asyncio.wait([self.task])
+        if not self.task.cancelled():
+            return  # it had already finished generating; the answer was delivered
+        TURNS_CANCELLED.labels(reason).inc()
+        logger.info(f"Turn cancelled ({reason})")
+        if reason != "disconnect":
+            await self.websocket.send_text(CancelledOut(reason=reason).model_dump_json())
+
+
+def _parse_cancel(data: Any) -> Optional[CancelIn]:
+    try:
+        return CancelIn.model_validate(data)
+    except ValidationError:
+        return None
+
+
+async def _finish_turn(websocket: WebSocket, chat_in: ChatIn, user_msg: dict, final_text: str, meta: dict) -> None:
+    # Send meta frame (retrieval, usage, latency)
+    await websocket.send_text(MetaOut(**meta).model_dump_json())
+
+    # Update conversation window
+    await session_backend.append_history(
+        chat_in.session_id, user_msg, {"role": "assistant", "content": final_text}
+    )
+
+    # Hand the turn to the bounded memory queue (summarize + upsert in the background)
+    await memory_queue.submit(
+        user_id=chat_in.user_id,
+        session_id=chat_in.session_id,
+        user_text=user_msg["content"],
+        bot_text=final_text,
+    )
+
+
+async def _run_turn(websocket: WebSocket, chat_in: ChatIn) -> None:
+    text = chat_in.text.strip()
+
+    # Rolling conversation window in the configured session backend (memory | redis).
+    # The user message is stored together with the reply, so a turn that is
+    # turned away (busy) or cancelled leaves no dangling entry behind.
+    user_msg = {"role": "user", "content": text}
+    hist = [*await session_backend.get_history(chat_in.session_id), user_msg]
+
+    async def on_token(tok: str) -> None:
+        try:
+            await websocket.send_text(TokenOut(text=tok).model_dump_json())
+        except Exception as e:
+            logger.error(f"Failed to send token: {e}")
+
+    # The whole turn (embed, Qdrant, Ollama stream) runs on the event loop, so
+    # cancelling this task stops retrieval and closes the Ollama stream, which
+    # frees its decode slot. Generation streams by default (settings.ollama_stream).
+    TURNS_IN_FLIGHT.inc()
+    try:
+        final_text, meta = await pipeline.arun_rag(
+            user_id=chat_in.user_id,
+            session_id=chat_in.session_id,
+            query=text,
+            history=hist,  # <-- include short-term conversation window
+            on_token=on_token,
+        )
+    except LLMBusy as e:
+        # Queue wait would exceed the chat SLO: tell the client when to retry
+        count_error("admission", e)
+        await websocket.send_text(
+            ErrorOut(
+                message="Well-Bot is busy right now, please retry shortly.",
+                code="busy",
+                retry_after_s=float(max(1, math.ceil(e.retry_after_s))),
+            ).model_dump_json()
+        )
+        return
+    except Exception as e:
+        logger.exception("Turn failed")
+        count_error("turn", e)
+        try:
+            await websocket.send_text(ErrorOut(message=str(e)).model_dump_json())
+        finally:
+            await websocket.close()
+        return
+    finally:
+        TURNS_IN_FLIGHT.dec()
+
+    # The answer is complete: a late cancel must not drop its meta, history or memory job
+    finish = asyncio.ensure_future(_finish_turn(websocket, chat_in, user_msg, final_text, meta))
+    try:
+        await asyncio.shield(finish)
+    except asyncio.CancelledError:
+        await finish
+
+
 @router.websocket("/ws/chat")
 async def ws_chat(websocket: WebSocket):
     await websocket.accept()
     logger.info("WebSocket connected")
+    WS_CONNECTIONS.inc()
 
     # Optional: greet immediately so clients see the stream is alive
     try:
@@ -33,75 +144,44 @@ async def ws_chat(websocket: WebSocket):
         # greet is best-effort; continue either way
         pass
 
+    # Frames keep being read while a turn runs, so a disconnect, a cancel frame
+    # or a new message can abort it; at most one turn runs per socket.
+    turn = _Turn(websocket)
     try:
         while True:
             raw = await websocket.receive_text()
 
             # Expect JSON from client; friendly fallback if it's just plain text
             try:
-                data: dict[str, Any] = json.loads(raw)
+                data: Any = json.loads(raw)
+            except Exception:
+                data = None
+            if _parse_cancel(data) is not None:
+                await turn.cancel("client_cancel")
+                continue
+            try:
                 chat_in = ChatIn(**data)
             except Exception:
                 # If plain text, fabricate a minimal payload (dev convenience)
                 chat_in = ChatIn(session_id="dev-session", user_id="dev-user", text=raw)
 
-            text = chat_in.text.strip()
+            # A new message supersedes whatever is still being generated
+            await turn.cancel("superseded")
 
-            if text.lower() == "exit":
+            if chat_in.text.strip().lower() == "exit":
                 await websocket.send_text(DoneOut().model_dump_json())
                 await websocket.close()
                 logger.info("WebSocket closed by client request (exit).")
                 break
 
-            # Maintain a tiny rolling window in memory (optional, non-persistent)
-            state = session_store.get(chat_in.session_id)
-            hist = state.get("history", [])
-            hist.append({"role": "user", "content": text})
-            session_store.set(chat_in.session_id, {"history": hist})
-
-            loop = asyncio.get_running_loop()
-
-            # Bridge callback from a background thread to this async WS safely
-            def on_token(tok: str) -> None:
-                try:
-                    frame = TokenOut(text=tok).model_dump_json()
-                    asyncio.run_coroutine_threadsafe(websocket.send_text(frame), loop)
-                except Exception as e:
-                    logger.error(f"Failed to send token: {e}")
-
-            # Run the blocking RAG call in a worker thread so we don't block the event loop
-            # NOTE: RAGPipeline.run_rag now accepts a `history` parameter (list of {"role","content"}).
-            final_text, meta = await asyncio.to_thread(
-                pipeline.run_rag,
-                user_id=chat_in.user_id,
-                session_id=chat_in.session_id,
-                query=text,
-                history=hist,  # <-- include short-term conversation window
-                on_token=on_token,
-            )
-
-            # Send meta frame (retrieval, usage, latency)
-            await websocket.send_text(MetaOut(**meta).model_dump_json())
-
-            # Update in-memory conversation window
-            hist.append({"role": "assistant", "content": final_text})
-            session_store.set(chat_in.session_id, {"history": hist})
-
-            # Fire-and-forget: distill user memory and upsert to Qdrant
-            asyncio.create_task(
-                memory_summarizer.process_turn(
-                    user_id=chat_in.user_id,
-                    session_id=chat_in.session_id,
-                    user_text=text,
-                    bot_text=final_text,
-                )
-            )
+            turn = _Turn(websocket)
+            turn.task = asyncio.create_task(_run_turn(websocket, chat_in))
 
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected")
     except Exception as e:
-        logger.exception("WebSocket error")
-        try:
-            await websocket.send_text(ErrorOut(message=str(e)).model_dump_json())
-        finally:
-            await websocket.close()
+        # Also reached when a failed turn has closed the socket under the reader
+        logger.info(f"WebSocket receive loop ended: {e!r}")
+    finally:
+        WS_CONNECTIONS.dec()
+        await turn.cancel("disconnect")
@@ -18,6 +18,11 @@ class ChatIn(BaseModel):
     text: Str1
 
 
+class CancelIn(BaseModel):
+    """Abort the in-flight turn (sending a new message does the same)."""
+    type: Literal["cancel"]  # required: a chat message must never parse as a cancel
+
+
 # ---------- Outbound (server -> client, streamed) ----------
 
 class TokenOut(BaseModel):
@@ -33,6 +38,11 @@ class RetrievalDocMeta(BaseModel):
     score: Optional[float] = None
     source: Optional[str] = None  # e.g., filename/url
     meta: Optional[dict[str, Any]] = None  # user_id/session_id/timestamp etc.
+    # Rerank decision (absent when reranking is disabled)
+    relevance: Optional[float] = None  # cosine(query, doc), comparable across collections
+    selected: Optional[bool] = None  # packed into the prompt context
+    reason: Optional[str] = None  # selected | below_floor | score_gap | redundant | over_cap | over_budget
+    rank: Optional[int] = None  # position in the packed context
 
 
 class UsageMeta(BaseModel):
@@ -41,6 +51,20 @@ class UsageMeta(BaseModel):
     input_tokens: Optional[int] = None
     output_tokens: Optional[int] = None
     model: Optional[str] = None
+    # Per-stage wall times (ms); retrieval stages overlap, so they don't sum to latency_ms
+    embed_ms: Optional[int] = None
+    lexical_ms: Optional[int] = None
+    kb_search_ms: Optional[int] = None
+    mem_search_ms: Optional[int] = None
+    rerank_ms: Optional[int] = None
+    prompt_build_ms: Optional[int] = None
+    ttft_ms: Optional[int] = None  # turn start -> first streamed token
+    generation_ms: Optional[int] = None
+    # Ollama's own phase split (from the final response record)
+    load_ms: Optional[int] = None
+    prompt_eval_ms: Optional[int] = None
+    decode_ms: Optional[int] = None
+    tokens_per_s: Optional[float] = None
 
 
 class MetaOut(BaseModel):
@@ -48,6 +72,7 @@ class MetaOut(BaseModel):
     type: Literal["meta"] = "meta"
     retrieval: list[RetrievalDocMeta] = Field(default_factory=list)
     usage: UsageMeta = UsageMeta()
+    cache_hit: bool = False  # answer served from the semantic answer cache
 
 
 class DoneOut(BaseModel):
@@ -55,8 +80,16 @@ class DoneOut(BaseModel):
     type: Literal["done"] = "done"
 
 
+class CancelledOut(BaseModel):
+    """The in-flight turn was aborted; nothing of it is stored or summarized."""
+    type: Literal["cancelled"] = "cancelled"
+    reason: Literal["client_cancel", "superseded"]
+
+
 class ErrorOut(BaseModel):
     """Error frame (non-fatal unless the server closes)."""
     type: Literal["error"] = "error"
     message: str
     detail: Optional[dict[str, Any]] = None
+    code: Optional[str] = None  # "busy": admission control turned the turn away; the socket stays open
+    retry_after_s: Optional[float] = None
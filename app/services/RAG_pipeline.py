@@ -2,17 +2,27 @@
 
 from __future__ import annotations
 
+import asyncio
 import time
 from datetime import datetime, timezone, timedelta
-from typing import Callable, Dict, List, Tuple
+from typing import Any, Callable, Dict, Tuple
 
-from haystack.dataclasses import ChatMessage
 from haystack import Document
 from datetime import datetime, timezone, timedelta
 
 from app.config import settings
+from app.utils.aio import call_maybe_async
 from app.utils.logging import get_logger
+from app.utils.metrics import observe_turn
+from app.utils.timing import ms_since, timed
+from app.utils.tokens import token_counter
+from app.services.answer_cache import AnswerCache, answer_cache, model_key
 from app.services.generator import LLMGenerator
+from app.services.ollama_client import usage_from_stats
+from app.services.ollama_transport import close_loop_ollama_clients
+from app.services.prompt_builder import PromptAssembler
+from app.services.qdrant_store import close_loop_qdrant_client
+from app.services.reranker import decision_meta, rerank
 from app.services.retriever import (
     DualRetriever,
     RetrieverConfig,
@@ -26,23 +36,6 @@ class HistMsg(TypedDict):
     role: str  # "user" | "assistant"
     content: str
 
-def _history_to_messages(history: Sequence[HistMsg], max_chars: int = 1200) -> list[ChatMessage]:
-    msgs: list[ChatMessage] = []
-    used = 0
-    for h in history[-10:]:  # last 10 turns (user/assistant = ~20 msgs)
-        txt = (h.get("content") or "").strip()
-        if not txt:
-            continue
-        if used + len(txt) > max_chars:
-            break
-        used += len(txt)
-        role = (h.get("role") or "user").lower()
-        if role == "assistant":
-            msgs.append(ChatMessage.from_assistant(txt))
-        else:
-            msgs.append(ChatMessage.from_user(txt))
-    return msgs
-
 
 logger = get_logger(__name__)
 
@@ -52,26 +45,18 @@ def _epoch_now() -> float:
 def _epoch_minutes_back(minutes: int) -> float:
     return (datetime.now(timezone.utc) - timedelta(minutes=minutes)).timestamp()
 
-def _format_context(docs: List[Document], max_chars: int = 1800) -> str:
-    """
-    Join snippets from retrieved docs into a compact context block for the prompt.
-    Trim aggressively to keep LLM focused (real UIs can show full context separately).
-    """
-    parts = []
-    used = 0
-    for d in docs:
-        src = d.meta.get("source") or d.meta.get("name") or d.id[:8]
-        chunk = (d.content or "").strip()
-        if not chunk:
-            continue
-        # prefer shorter, dense chunks
-        chunk = chunk[:600]
-        line = f"[{src}] {chunk}"
-        if used + len(line) > max_chars:
-            break
-        used += len(line)
-        parts.append(line)
-    return "\n".join(parts)
+def _doc_meta(collection: str, d: Document) -> Dict[str, Any]:
+    """RetrievalDocMeta fields for one retrieved doc (memories expose only ownership/time)."""
+    meta = d.meta
+    if collection == settings.qdrant_collection_memory:
+        meta = {k: v for k, v in d.meta.items() if k in ("user_id", "session_id", "timestamp")}
+    return {
+        "collection": collection,
+        "doc_id": d.id,
+        "score": d.score if hasattr(d, "score") else None,
+        "source": d.meta.get("source") or d.meta.get("name"),
+        "meta": meta,
+    }
 
 def _system_prompt() -> str:
     """
@@ -96,12 +81,30 @@ class RAGPipeline:
         kb_top_k: int = 4,
         mem_top_k: int = 4,
         mem_time_window_min: int | None = 7 * 24 * 60,  # last 7 days default
+        answer_cache: Optional[AnswerCache] = answer_cache,
     ) -> None:
         self.dual_ret = DualRetriever(
-            kb_cfg=RetrieverConfig(collection=settings.qdrant_collection_docs, top_k=kb_top_k),
-            mem_cfg=RetrieverConfig(collection=settings.qdrant_collection_memory, top_k=mem_top_k),
+            kb_cfg=RetrieverConfig(
+                collection=settings.qdrant_collection_docs,
+                top_k=kb_top_k,
+                timeout_s=settings.qdrant_kb_search_timeout_s,
+                backend=settings.kb_retriever_backend,
+                hybrid=settings.hybrid_retrieval_enabled,
+                candidate_k=settings.hybrid_candidate_k,
+            ),
+            mem_cfg=RetrieverConfig(
+                collection=settings.qdrant_collection_memory,
+                top_k=mem_top_k,
+                timeout_s=settings.qdrant_mem_search_timeout_s,
+                hybrid=settings.hybrid_retrieval_enabled,
+                candidate_k=settings.hybrid_candidate_k,
+            ),
+            with_embeddings=settings.rerank_enabled,
         )
         self.generator = LLMGenerator()
+        self.assembler = PromptAssembler()
+        self.answer_cache = answer_cache
+        self.answer_key = model_key(self.generator.model, self.generator.options, _system_prompt())
         self.mem_time_window_min = mem_time_window_min
 
     def run_rag(
@@ -114,7 +117,38 @@ class RAGPipeline:
         on_token: Callable[[str], None] | None = None,
     ) -> Tuple[str, Dict]:
         """
-        Execute retrieval + generation. Streams tokens via on_token.
+        Blocking wrapper around `arun_rag` for CLI tools and scripts.
+        Must not be called from inside a running event loop (use `arun_rag`).
+        """
+
+        async def _run() -> Tuple[str, Dict]:
+            try:
+                return await self.arun_rag(
+                    user_id=user_id,
+                    session_id=session_id,
+                    query=query,
+                    history=history,
+                    on_token=on_token,
+                )
+            finally:
+                # Each call runs on a fresh loop: don't leave its HTTP clients behind
+                await close_loop_ollama_clients()
+                await close_loop_qdrant_client()
+
+        return asyncio.run(_run())
+
+    async def arun_rag(
+        self,
+        *,
+        user_id: str,
+        session_id: str,
+        query: str,
+        history: Optional[Sequence[HistMsg]] = None,
+        on_token: Callable[[str], Any] | None = None,
+    ) -> Tuple[str, Dict]:
+        """
+        Execute retrieval + generation on the event loop. Streams tokens via
+        on_token (sync or async callback).
         Returns:
             final_text, meta (retrieval list + usage)
         """
@@ -129,60 +163,103 @@ class RAGPipeline:
         )
         kb_filters = None
 
+        # Per-stage wall times (ms) reported in UsageMeta
+        stages: Dict[str, Any] = {}
+
         # --- Retrieve ---
-        kb_docs, mem_docs = self.dual_ret.retrieve(
-            query=query, user_filters=mem_filters, kb_filters=kb_filters
-        )
-        all_docs = self.dual_ret.combine_results(kb_docs, mem_docs, cap_total=8)
+        # The embedding is also needed for rerank and the answer cache: start it
+        # here and hand the pending future over so BM25 runs while it computes
+        emb_fut = asyncio.ensure_future(timed(self.dual_ret.aembed_query(query), stages, "embed_ms"))
+        try:
+            kb_docs, mem_docs = await self.dual_ret.aretrieve(
+                query=query, user_filters=mem_filters, kb_filters=kb_filters, query_embedding=emb_fut, timings=stages
+            )
+            q_emb = await emb_fut
+        except BaseException:
+            emb_fut.cancel()
+            raise
+        candidates = [(settings.qdrant_collection_memory, d) for d in mem_docs] + [
+            (settings.qdrant_collection_docs, d) for d in kb_docs
+        ]
 
-        # --- Build prompt ---
-        ctx_block = _format_context(all_docs)
-        sys = _system_prompt()
-        messages: List[ChatMessage] = [ChatMessage.from_system(f"{sys}\n\nCONTEXT:\n{ctx_block}" if ctx_block else sys)]
+        # --- Rerank: smallest sufficient context ---
+        t_stage = time.perf_counter()
+        decisions = None
+        if settings.rerank_enabled:
+            all_docs, decisions = rerank(q_emb, candidates)
+        else:
+            all_docs = self.dual_ret.combine_results(kb_docs, mem_docs, cap_total=settings.retrieval_max_snippets)
+        stages["rerank_ms"] = ms_since(t_stage)
+
+        # --- Build prompt (one token budget across system, context, history, query) ---
+        t_stage = time.perf_counter()
+        prompt = self.assembler.assemble(system=_system_prompt(), query=query, docs=all_docs, history=history)
+        stages["prompt_build_ms"] = ms_since(t_stage)
+        if decisions is not None:
+            packed = {d.id for d in prompt.context_docs}
+            for dec in decisions:
+                if dec.selected and dec.doc.id not in packed:
+                    dec.selected, dec.reason, dec.rank = False, "over_budget", None
 
-        if history:
-            messages.extend(_history_to_messages(history))
+        # --- Semantic answer cache (knowledge-only context, no conversation history) ---
+        # The key covers query + KB ids only: an answer shaped by this user's
+        # memories or earlier turns must neither be stored nor replayed
+        mem_ids = {d.id for d in mem_docs}
+        cache_ids = [d.id for d in prompt.context_docs]
+        no_history = len(prompt.messages) == 2  # system + query
+        cacheable = self.answer_cache is not None and no_history and not any(i in mem_ids for i in cache_ids)
+        cached = self.answer_cache.get(q_emb, cache_ids, self.answer_key) if cacheable else None
 
-        messages.append(ChatMessage.from_user(query))
+        async def on_token_timed(tok: str) -> None:
+            # Time to first token, measured from the start of the turn
+            stages.setdefault("ttft_ms", ms_since(t0))
+            await call_maybe_async(on_token, tok)
 
-        # --- Generate with streaming ---
-        final_text, usage = self.generator.stream_chat(messages, on_token=on_token)
+        emit = on_token_timed if on_token is not None else None
 
-        latency_ms = int((time.perf_counter() - t0) * 1000)
+        t_stage = time.perf_counter()
+        if cached is not None:
+            final_text, usage = cached, {"model": self.generator.model}
+            await self.generator.areplay(final_text, emit)
+        else:
+            # --- Generate with streaming ---
+            final_text, usage = await self.generator.astream_chat(prompt.messages, on_token=emit)
+            if usage.get("prompt_eval_count"):
+                token_counter.observe(
+                    prompt.prompt_chars,
+                    usage["prompt_eval_count"] - self.assembler.overhead * len(prompt.messages),
+                )
+            # Answers cut off by the length limit are not worth repeating
+            if cacheable and usage.get("done_reason") in (None, "stop"):
+                self.answer_cache.put(q_emb, cache_ids, self.answer_key, final_text)
+
+        stages["generation_ms"] = ms_since(t_stage)
+
+        latency_ms = ms_since(t0)
         # --- Meta to report back to client ---
-        retrieval_meta = []
-        for d in mem_docs:
-            retrieval_meta.append(
-                {
-                    "collection": settings.qdrant_collection_memory,
-                    "doc_id": d.id,
-                    "score": d.score if hasattr(d, "score") else None,
-                    "source": d.meta.get("source") or d.meta.get("name"),
-                    "meta": {
-                        k: v
-                        for k, v in d.meta.items()
-                        if k in ("user_id", "session_id", "timestamp")
-                    },
-                }
-            )
-        for d in kb_docs:
-            retrieval_meta.append(
-                {
-                    "collection": settings.qdrant_collection_docs,
-                    "doc_id": d.id,
-                    "score": d.score if hasattr(d, "score") else None,
-                    "source": d.meta.get("source") or d.meta.get("name"),
-                    "meta": d.meta,
-                }
-            )
+        if decisions is not None:
+            retrieval_meta = [{**_doc_meta(dec.collection, dec.doc), **decision_meta(dec)} for dec in decisions]
+        else:
+            retrieval_meta = [_doc_meta(collection, d) for collection, d in candidates]
+
+        # Token counts and prompt-eval/decode split as reported by Ollama;
+        # the assembler's count stands in when the response carried none
+        ollama_usage = usage_from_stats(usage)
+        if cached is not None:
+            # Nothing reaches the model on a cache hit
+            ollama_usage.update(input_tokens=0, output_tokens=0)
+        ollama_usage.setdefault("input_tokens", prompt.input_tokens)
 
         meta = {
             "retrieval": retrieval_meta,
             "usage": {
                 "model": usage.get("model"),
                 "latency_ms": latency_ms,
-                # token counts can be added later once exposed
+                **stages,
+                **ollama_usage,
             },
+            "cache_hit": cached is not None,
         }
+        observe_turn(meta["usage"])
 
         return final_text, meta
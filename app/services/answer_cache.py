@@ -0,0 +1,162 @@
+# app/services/answer_cache.py
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional, Sequence, Set
+
+import numpy as np
+
+from app.config import settings
+from app.services.kb_indexer import ManifestWatch, read_kb_version
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def model_key(model: str, options: Mapping[str, Any], system_prompt: str) -> str:
+    """Everything besides the context that shapes an answer: model, sampling options, system prompt."""
+    raw = json.dumps({"model": model, "options": dict(options), "system": system_prompt}, sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Entry:
+    text: str
+    embedding: np.ndarray  # unit-normalized float32 query embedding
+    bucket: str
+    created_at: float
+
+
+class AnswerCache:
+    """
+    Semantic cache of generated answers for knowledge-only turns.
+
+    Entries are bucketed by (model key, exact set of KB doc ids in the
+    context); a lookup is a hit when an entry in the same bucket has a query
+    embedding with cosine >= `threshold`. Only turns whose prompt holds no
+    personal memory docs and no conversation history may be stored or served,
+    so answers never leak between users or sessions. Bounded by LRU + TTL, and cleared when the KB manifest
+    publishes a new index version.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_entries: Optional[int] = None,
+        ttl_s: Optional[float] = None,
+        threshold: Optional[float] = None,
+        manifest_path: Optional[str] = None,
+    ) -> None:
+        self.max_entries = max_entries or settings.answer_cache_max_entries
+        self.ttl_s = ttl_s or settings.answer_cache_ttl_s
+        self.threshold = threshold or settings.answer_cache_threshold
+        self.manifest_path = manifest_path or settings.kb_manifest_path
+        self.watch = ManifestWatch(self.manifest_path)
+        self.kb_version = read_kb_version(self.manifest_path)
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._buckets: Dict[str, Set[int]] = {}
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _bucket(key: str, kb_ids: Sequence[str]) -> str:
+        return hashlib.sha1("\0".join([key, *sorted(kb_ids)]).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _unit(vec: Sequence[float]) -> Optional[np.ndarray]:
+        v = np.asarray(vec, dtype=np.float32)
+        norm = float(np.linalg.norm(v))
+        return v / norm if norm else None
+
+    def _drop(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        ids = self._buckets.get(entry.bucket)
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._buckets[entry.bucket]
+
+    def _check_version(self) -> None:
+        if not self.watch.due():
+            return
+        version = read_kb_version(self.manifest_path)
+        if version != self.kb_version:
+            with self._lock:
+                self._entries.clear()
+                self._buckets.clear()
+                self.invalidations += 1
+            logger.info(f"KB index v{self.kb_version} -> v{version}; answer cache cleared")
+            self.kb_version = version
+
+    def get(self, query_embedding: Sequence[float], kb_ids: Sequence[str], key: str) -> Optional[str]:
+        self._check_version()
+        q = self._unit(query_embedding)
+        if q is None or not kb_ids:
+            return None
+        bucket = self._bucket(key, kb_ids)
+        now = time.time()
+        with self._lock:
+            best_id, best_sim = None, self.threshold
+            for entry_id in list(self._buckets.get(bucket, ())):
+                entry = self._entries[entry_id]
+                if now - entry.created_at > self.ttl_s:
+                    self._drop(entry_id)
+                    continue
+                sim = float(entry.embedding @ q)
+                if sim >= best_sim:
+                    best_id, best_sim = entry_id, sim
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id].text
+
+    def put(self, query_embedding: Sequence[float], kb_ids: Sequence[str], key: str, text: str) -> None:
+        q = self._unit(query_embedding)
+        if q is None or not kb_ids or not text:
+            return
+        bucket = self._bucket(key, kb_ids)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(text=text, embedding=q, bucket=bucket, created_at=time.time())
+            self._buckets.setdefault(bucket, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": True,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "kb_version": self.kb_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+# Opt-in (answer_cache_enabled); None when disabled
+answer_cache: Optional[AnswerCache] = AnswerCache() if settings.answer_cache_enabled else None
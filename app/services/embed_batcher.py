@@ -0,0 +1,126 @@
+# app/services/embed_batcher.py
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.config import settings
+from app.services.llm_scheduler import BACKGROUND, INTERACTIVE
+from app.services.ollama_client import DirectOllamaClient
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces embedding requests from concurrent callers into batched
+    /api/embed calls.
+
+    Each input waits at most `max_wait_ms` for company; a batch is sent as soon
+    as it holds `max_batch` inputs or the window closes, and the vectors are
+    fanned back out to the callers' futures. Identical texts within a batch are
+    embedded once. A caller's inputs may span several batches (any size is
+    accepted). Cancelled callers simply drop out of the batch they were in; a
+    failed call fails every caller in that batch.
+    """
+
+    def __init__(
+        self,
+        client: DirectOllamaClient,
+        *,
+        max_batch: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+    ) -> None:
+        self.client = client
+        self.max_batch = max(1, max_batch or settings.embed_batch_max_size)
+        self.max_wait_s = (settings.embed_batch_max_wait_ms if max_wait_ms is None else max_wait_ms) / 1000
+
+        self._pending: List[tuple[str, asyncio.Future]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight: set[asyncio.Task] = set()
+        self._counters = {"requests": 0, "inputs": 0, "batches": 0, "embedded": 0, "deduped": 0, "max_batch_seen": 0, "failures": 0}
+
+    async def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        """Vectors for `texts`, in order; resolved when every batch holding them returns."""
+        if not texts:
+            return []
+        loop = asyncio.get_running_loop()
+        if self._loop is not None and self._loop is not loop and self._pending:
+            # A different event loop owns the open window (tools running their own loop)
+            return await self.client.aembed(list(texts))
+
+        self._counters["requests"] += 1
+        self._counters["inputs"] += len(texts)
+        self._loop = loop
+        futures = []
+        for text in texts:
+            fut = loop.create_future()
+            self._pending.append((text, fut))
+            futures.append(fut)
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+        if self._pending and self._timer is None:
+            self._timer = loop.call_later(self.max_wait_s, self._flush)
+        return list(await asyncio.gather(*futures))
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending[: self.max_batch], self._pending[self.max_batch :]
+        batch = [(t, f) for t, f in batch if not f.done()]
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+        if self._pending:
+            # Leftovers beyond max_batch: send them when full or after a fresh window
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            else:
+                self._timer = asyncio.get_running_loop().call_later(self.max_wait_s, self._flush)
+
+    async def _run(self, batch: List[tuple[str, asyncio.Future]]) -> None:
+        unique: Dict[str, int] = {}
+        for text, _ in batch:
+            unique.setdefault(text, len(unique))
+        self._counters["batches"] += 1
+        self._counters["embedded"] += len(unique)
+        self._counters["deduped"] += len(batch) - len(unique)
+        self._counters["max_batch_seen"] = max(self._counters["max_batch_seen"], len(unique))
+        try:
+            vecs = await self.client.aembed(list(unique))
+        except Exception as e:
+            self._counters["failures"] += 1
+            logger.warning(f"Batched embed of {len(unique)} inputs failed: {e}")
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for text, fut in batch:
+            if not fut.done():
+                fut.set_result(vecs[unique[text]])
+
+    def stats(self) -> Dict[str, Any]:
+        batches = self._counters["batches"]
+        return {
+            **self._counters,
+            "mean_batch": round(self._counters["embedded"] / batches, 2) if batches else 0.0,
+            "pending": len(self._pending),
+            "in_flight": len(self._inflight),
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait_s * 1000,
+        }
+
+
+# Memory writes and KB ingestion share one background batcher; chat query
+# embeddings get their own interactive one when embed_batch_queries is on.
+background_embedder = EmbeddingBatcher(DirectOllamaClient(priority=BACKGROUND))
+query_embedder: Optional[EmbeddingBatcher] = (
+    EmbeddingBatcher(DirectOllamaClient(priority=INTERACTIVE), max_wait_ms=settings.embed_batch_query_wait_ms)
+    if settings.embed_batch_queries
+    else None
+)
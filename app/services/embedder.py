@@ -1,34 +1,57 @@
 # app/services/embedder.py
+#
+# KB indexing entry point:  python app/services/embedder.py [--folder ./context_doc] [--full] [--watch]
+# Incremental by default: only new/changed chunks are embedded and stale points are deleted
+# (see app/services/kb_indexer.py). --watch keeps polling the folder for changes.
 
-from haystack import Document
-from haystack_integrations.document_stores.qdrant import QdrantDocumentStore
-from haystack_integrations.components.embedders.ollama.document_embedder import OllamaDocumentEmbedder
+import argparse
+import asyncio
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 from app.config import settings
+from app.services.ingestion import IngestConfig, KBIngestor
+from app.services.kb_indexer import KBIndexer
 
 
-def load_documents_from_folder(folder_path: str):
-    docs = []
-    for fn in os.listdir(folder_path):
-        if fn.endswith(".txt"):
-            p = os.path.join(folder_path, fn)
-            with open(p, "r", encoding="utf-8") as f:
-                docs.append(Document(content=f.read(), meta={"name": fn, "source": fn}))
-    return docs
-
-store = QdrantDocumentStore(
-    url=settings.qdrant_url,
-    index=settings.qdrant_collection_docs,  # <- kb_docs
-    recreate_index=False,
-    return_embedding=True,
-    wait_result_from_api=True,
-    embedding_dim=settings.embedding_dim,
-    similarity=settings.embedding_similarity,
-)
-
-docs = load_documents_from_folder("./context_doc")
-embedder = OllamaDocumentEmbedder(model=settings.ollama_embed_model)  # 768-dim
-embedded = embedder.run(docs)["documents"]
-store.write_documents(embedded, policy="upsert")
-print(f"Indexed {len(embedded)} docs into {settings.qdrant_collection_docs}")
+def main() -> None:
+    cfg = IngestConfig()
+    parser = argparse.ArgumentParser(description="Chunk, embed and upsert KB documents into Qdrant.")
+    parser.add_argument("--folder", default=settings.kb_folder)
+    parser.add_argument("--chunk-size", type=int, default=cfg.chunk_size)
+    parser.add_argument("--chunk-overlap", type=int, default=cfg.chunk_overlap)
+    parser.add_argument("--embed-batch-size", type=int, default=cfg.embed_batch_size)
+    parser.add_argument("--embed-concurrency", type=int, default=cfg.embed_concurrency)
+    parser.add_argument("--upsert-batch-size", type=int, default=cfg.upsert_batch_size)
+    parser.add_argument("--manifest", default=settings.kb_manifest_path)
+    parser.add_argument("--full", action="store_true", help="re-embed every file regardless of the manifest")
+    parser.add_argument("--watch", action="store_true", help="keep running and re-index on file changes")
+    args = parser.parse_args()
+
+    ingestor = KBIngestor(
+        cfg=IngestConfig(
+            chunk_size=args.chunk_size,
+            chunk_overlap=args.chunk_overlap,
+            embed_batch_size=args.embed_batch_size,
+            embed_concurrency=args.embed_concurrency,
+            upsert_batch_size=args.upsert_batch_size,
+        )
+    )
+    indexer = KBIndexer(folder=args.folder, manifest_path=args.manifest, ingestor=ingestor)
+
+    if args.watch:
+        try:
+            asyncio.run(indexer.watch())
+        except KeyboardInterrupt:
+            pass
+        return
+
+    report = asyncio.run(indexer.sync(full=args.full))
+    print(
+        f"KB index v{report.version} ({settings.qdrant_collection_docs}): "
+        f"{report.files_changed}/{report.files_scanned} files changed, {report.files_removed} removed, "
+        f"{report.chunks_embedded} chunks embedded, {report.chunks_moved} moved, {report.chunks_deleted} deleted in {report.elapsed_s:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# app/services/embedding_cache.py
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# On-disk layout: MAGIC | u32 header length | JSON header | float32 vectors (row-major)
+# All fields are little-endian, so a file moves between hosts unchanged.
+_MAGIC = b"WBEC1"
+_DTYPE = np.dtype("<f4")
+
+
+def normalize_query(text: str) -> str:
+    """Unicode-normalize, casefold and collapse whitespace so trivially different queries share a key."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU + TTL cache of query embeddings keyed by (model, normalized text).
+    Vectors are held as float32 arrays; an optional file tier lets a restart
+    start warm. Entries are dropped automatically when the embed model or
+    embedding_dim in settings no longer match what the cache was built for.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_entries: int = 4096,
+        ttl_s: float = 24 * 3600,
+        path: Optional[str] = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()  # key -> (created_at, vec)
+        self._fingerprint = self._current_fingerprint()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.path:
+            self.load()
+
+    @classmethod
+    def from_settings(cls) -> "EmbeddingCache":
+        return cls(
+            max_entries=settings.embed_cache_max_entries,
+            ttl_s=settings.embed_cache_ttl_s,
+            path=settings.embed_cache_path,
+        )
+
+    @staticmethod
+    def _current_fingerprint() -> Tuple[str, int]:
+        return settings.ollama_embed_model, settings.embedding_dim
+
+    def _key(self, text: str) -> str:
+        model = self._fingerprint[0]
+        return hashlib.sha1(f"{model}\0{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def _check_fingerprint(self) -> None:
+        """Invalidate everything if the embed model or dimension changed (caller holds the lock)."""
+        current = self._current_fingerprint()
+        if current != self._fingerprint:
+            logger.info(f"Embedding model changed {self._fingerprint} -> {current}; clearing query embedding cache")
+            self._entries.clear()
+            self._fingerprint = current
+
+    # ---------- lookup ----------
+
+    def get(self, text: str) -> Optional[List[float]]:
+        now = time.time()
+        with self._lock:
+            self._check_fingerprint()
+            key = self._key(text)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            created_at, vec = entry
+            if now - created_at > self.ttl_s:
+                del self._entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vec.tolist()
+
+    def put(self, text: str, embedding: List[float]) -> None:
+        with self._lock:
+            self._check_fingerprint()
+            if len(embedding) != self._fingerprint[1]:
+                # Never cache a vector the collections would reject
+                return
+            key = self._key(text)
+            self._entries[key] = (time.time(), np.asarray(embedding, dtype=_DTYPE))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "model": self._fingerprint[0],
+            "dim": self._fingerprint[1],
+        }
+
+    # ---------- disk tier ----------
+
+    def save(self) -> None:
+        """Write live entries to `path` atomically (header + packed float32 rows)."""
+        if not self.path:
+            return
+        now = time.time()
+        with self._lock:
+            model, dim = self._fingerprint
+            live = [(k, ts, v) for k, (ts, v) in self._entries.items() if now - ts <= self.ttl_s]
+
+        header = json.dumps(
+            {"model": model, "dim": dim, "keys": [k for k, _, _ in live], "created": [ts for _, ts, _ in live]}
+        ).encode("utf-8")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            for _, _, vec in live:
+                f.write(vec.tobytes())
+        os.replace(tmp, self.path)
+        logger.info(f"Saved {len(live)} query embeddings to {self.path}")
+
+    def load(self) -> None:
+        """Load entries written by `save`; files from another model/dim are ignored."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                if f.read(len(_MAGIC)) != _MAGIC:
+                    raise ValueError("bad magic")
+                (hlen,) = struct.unpack("<I", f.read(4))
+                header = json.loads(f.read(hlen).decode("utf-8"))
+                if (header.get("model"), header.get("dim")) != self._fingerprint:
+                    logger.info(f"Ignoring embedding cache file built for {header.get('model')}/{header.get('dim')}")
+                    return
+                dim = int(header["dim"])
+                now = time.time()
+                loaded = 0
+                with self._lock:
+                    for key, ts in zip(header["keys"], header["created"]):
+                        buf = f.read(dim * _DTYPE.itemsize)
+                        if len(buf) != dim * _DTYPE.itemsize:
+                            raise ValueError("truncated vector data")
+                        vec = np.frombuffer(buf, dtype=_DTYPE)
+                        if now - ts <= self.ttl_s:
+                            self._entries[key] = (ts, vec)
+                            loaded += 1
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            logger.info(f"Loaded {loaded} query embeddings from {self.path}")
+        except Exception as e:
+            logger.warning(f"Could not load embedding cache {self.path}: {e}")
+
+
+# Process-wide cache for query embeddings (None when disabled)
+query_embedding_cache: Optional[EmbeddingCache] = (
+    EmbeddingCache.from_settings() if settings.embed_cache_enabled else None
+)
@@ -2,12 +2,14 @@
 
 from __future__ import annotations
 
-from typing import Callable, Optional, Dict, Any, List
+from typing import Any, Callable, Dict, List, Optional
 
 from haystack.dataclasses import ChatMessage
 
 from app.config import settings
+from app.services.llm_scheduler import INTERACTIVE
 from app.services.ollama_client import DirectOllamaClient
+from app.utils.aio import call_maybe_async
 
 
 def _to_ollama_messages(hs_msgs: List[ChatMessage]) -> List[Dict[str, str]]:
@@ -27,8 +29,9 @@ def _to_ollama_messages(hs_msgs: List[ChatMessage]) -> List[Dict[str, str]]:
 
 class LLMGenerator:
     """
-    Generation via direct Ollama /api/chat (stream: false).
-    We simulate streaming by chunking the final text to on_token.
+    Generation via direct Ollama /api/chat.
+    With stream enabled (default) deltas are forwarded to on_token as Ollama
+    produces them; otherwise the final text is chunked to on_token.
     """
 
     def __init__(
@@ -36,16 +39,21 @@ class LLMGenerator:
         model: Optional[str] = None,
         url: Optional[str] = None,
         generation_kwargs: Optional[Dict[str, Any]] = None,
+        stream: Optional[bool] = None,
+        priority: int = INTERACTIVE,
     ) -> None:
         self.model = model or settings.ollama_chat_model
         self.url = url or settings.ollama_url
+        self.stream = settings.ollama_stream if stream is None else stream
         # Configure options for Ollama (temperature/top_p map to "options" in /api/chat)
         self.options = {
             "temperature": 0.8,
             "top_p": 0.9,
+            # Same window the prompt assembler budgets against
+            "num_ctx": settings.ollama_num_ctx,
             **(generation_kwargs or {}),
         }
-        self.client = DirectOllamaClient(base_url=self.url, model=self.model)
+        self.client = DirectOllamaClient(base_url=self.url, model=self.model, priority=priority)
 
     def _chunk_text(self, text: str, max_len: int = 40) -> List[str]:
         chunks: List[str] = []
@@ -66,11 +74,22 @@ class LLMGenerator:
         self,
         messages: List[ChatMessage],
         on_token: Optional[Callable[[str], None]] = None,
+        *,
+        stream: Optional[bool] = None,
     ) -> tuple[str, dict]:
         # Convert to Ollama’s expected shape
         ollama_msgs = _to_ollama_messages(messages)
+        use_stream = self.stream if stream is None else stream
+
+        # Real streaming only pays off when somebody consumes the deltas
+        if use_stream and on_token is not None:
+            final_text, stats = self.client.chat_stream(
+                ollama_msgs, options=self.options, on_delta=on_token
+            )
+            return final_text, {"model": self.model, **stats}
+
         # Non-streaming call (robust)
-        final_text = self.client.chat(ollama_msgs, options=self.options)
+        final_text, stats = self.client.chat_full(ollama_msgs, options=self.options)
 
         # Faux streaming: emit slices to on_token
         if on_token and final_text:
@@ -80,5 +99,34 @@ class LLMGenerator:
                 except Exception:
                     pass
 
-        usage = {"model": self.model}
-        return final_text, usage
+        return final_text, {"model": self.model, **stats}
+
+    async def astream_chat(
+        self,
+        messages: List[ChatMessage],
+        on_token: Optional[Callable[[str], Any]] = None,
+        *,
+        stream: Optional[bool] = None,
+    ) -> tuple[str, dict]:
+        """Async twin of `stream_chat`; on_token may be sync or async."""
+        ollama_msgs = _to_ollama_messages(messages)
+        use_stream = self.stream if stream is None else stream
+
+        if use_stream and on_token is not None:
+            final_text, stats = await self.client.achat_stream(
+                ollama_msgs, options=self.options, on_delta=on_token
+            )
+            return final_text, {"model": self.model, **stats}
+
+        final_text, stats = await self.client.achat_full(ollama_msgs, options=self.options)
+        await self.areplay(final_text, on_token)
+        return final_text, {"model": self.model, **stats}
+
+    async def areplay(self, text: str, on_token: Optional[Callable[[str], Any]]) -> None:
+        """Emit an already complete text to on_token in word-aligned slices (faux streaming)."""
+        if on_token and text:
+            for chunk in self._chunk_text(text, max_len=40):
+                try:
+                    await call_maybe_async(on_token, chunk)
+                except Exception:
+                    pass
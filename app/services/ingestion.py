@@ -0,0 +1,242 @@
+# app/services/ingestion.py
+
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import time
+from dataclasses import dataclass, field, replace
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from haystack import Document
+
+from app.config import settings
+from app.services.embed_batcher import background_embedder
+from app.services.qdrant_store import document_store
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+_PARA_RE = re.compile(r"\n\s*\n")
+_SENT_RE = re.compile(r"(?<=[.!?…])\s+")
+
+
+# ---------- chunking ----------
+
+def _hard_split(text: str, size: int) -> List[str]:
+    """Split an over-long sentence on word boundaries (last resort)."""
+    out: List[str] = []
+    cur: List[str] = []
+    cur_len = 0
+    for word in text.split():
+        if cur and cur_len + 1 + len(word) > size:
+            out.append(" ".join(cur))
+            cur, cur_len = [], 0
+        cur.append(word)
+        cur_len += len(word) + (1 if cur_len else 0)
+    if cur:
+        out.append(" ".join(cur))
+    return out
+
+
+def _units(text: str, chunk_size: int) -> List[Tuple[int, str]]:
+    """
+    Break text into (paragraph_index, unit) pairs. A unit is a line, or a
+    sentence of a long line, never longer than chunk_size.
+    """
+    units: List[Tuple[int, str]] = []
+    for p_idx, para in enumerate(_PARA_RE.split(text)):
+        for line in para.splitlines():
+            line = " ".join(line.split())
+            if not line:
+                continue
+            for sent in (_SENT_RE.split(line) if len(line) > chunk_size else [line]):
+                if len(sent) > chunk_size:
+                    units.extend((p_idx, piece) for piece in _hard_split(sent, chunk_size))
+                elif sent:
+                    units.append((p_idx, sent))
+    return units
+
+
+def _join(units: Sequence[Tuple[int, str]]) -> str:
+    parts: List[str] = []
+    prev: Optional[int] = None
+    for p_idx, unit in units:
+        if prev is not None:
+            parts.append("\n\n" if p_idx != prev else "\n")
+        parts.append(unit)
+        prev = p_idx
+    return "".join(parts)
+
+
+def chunk_text(text: str, *, chunk_size: Optional[int] = None, overlap: Optional[int] = None) -> List[str]:
+    """
+    Paragraph/sentence-aware chunking. Units are packed greedily up to
+    chunk_size characters; each new chunk starts with the trailing units of
+    the previous one (up to `overlap` characters) so facts on a boundary
+    survive in at least one chunk. Sizes default to the ingest settings, so
+    direct callers produce the same chunks (and chunk ids) as the indexer.
+    """
+    chunk_size = settings.ingest_chunk_size if chunk_size is None else chunk_size
+    overlap = settings.ingest_chunk_overlap if overlap is None else overlap
+    chunks: List[str] = []
+    cur: List[Tuple[int, str]] = []
+    cur_len = 0
+    for unit in _units(text, chunk_size):
+        add = len(unit[1]) + (2 if cur else 0)
+        if cur and cur_len + add > chunk_size:
+            chunks.append(_join(cur))
+            tail: List[Tuple[int, str]] = []
+            tail_len = 0
+            for prev in reversed(cur):
+                if tail_len + len(prev[1]) + 2 > overlap:
+                    break
+                tail.insert(0, prev)
+                tail_len += len(prev[1]) + 2
+            if tail_len + len(unit[1]) > chunk_size:
+                tail, tail_len = [], 0
+            cur, cur_len = tail, tail_len
+            add = len(unit[1]) + (2 if cur else 0)
+        cur.append(unit)
+        cur_len += add
+    if cur:
+        chunks.append(_join(cur))
+    return chunks
+
+
+# ---------- loading ----------
+
+def load_documents_from_folder(folder_path: str) -> List[Document]:
+    docs = []
+    for fn in sorted(os.listdir(folder_path)):
+        if fn.endswith(".txt"):
+            p = os.path.join(folder_path, fn)
+            with open(p, "r", encoding="utf-8") as f:
+                docs.append(Document(content=f.read(), meta={"name": fn, "source": fn}))
+    return docs
+
+
+def split_documents(docs: Iterable[Document], *, chunk_size: int, overlap: int) -> List[Document]:
+    """One Document per chunk; meta keeps the source plus chunk position."""
+    out: List[Document] = []
+    for doc in docs:
+        pieces = chunk_text(doc.content or "", chunk_size=chunk_size, overlap=overlap)
+        for i, piece in enumerate(pieces):
+            out.append(
+                Document(
+                    content=piece,
+                    meta={**doc.meta, "chunk_index": i, "chunk_count": len(pieces)},
+                )
+            )
+    return out
+
+
+def _batched(items: Sequence[Document], size: int) -> Iterator[List[Document]]:
+    for i in range(0, len(items), size):
+        yield list(items[i : i + size])
+
+
+# ---------- pipeline ----------
+
+@dataclass
+class IngestConfig:
+    chunk_size: int = field(default_factory=lambda: settings.ingest_chunk_size)
+    chunk_overlap: int = field(default_factory=lambda: settings.ingest_chunk_overlap)
+    embed_batch_size: int = field(default_factory=lambda: settings.ingest_embed_batch_size)
+    embed_concurrency: int = field(default_factory=lambda: settings.ingest_embed_concurrency)
+    upsert_batch_size: int = field(default_factory=lambda: settings.ingest_upsert_batch_size)
+
+
+@dataclass
+class IngestProgress:
+    files: int = 0
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    chunks_upserted: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed_s(self) -> float:
+        return time.perf_counter() - self.started_at
+
+
+def _log_progress(p: IngestProgress) -> None:
+    logger.info(
+        f"[ingest] embedded {p.chunks_embedded}/{p.chunks_total}, "
+        f"upserted {p.chunks_upserted}/{p.chunks_total} ({p.elapsed_s:.1f}s)"
+    )
+
+
+class KBIngestor:
+    """
+    Chunk -> batched embed (bounded concurrency) -> streamed upsert into the KB collection.
+    Upserts start as soon as the first embedding batches return, in fixed-size
+    batches, so memory stays flat however large the folder is.
+    """
+
+    def __init__(
+        self,
+        *,
+        collection: Optional[str] = None,
+        cfg: Optional[IngestConfig] = None,
+        on_progress: Callable[[IngestProgress], None] = _log_progress,
+    ) -> None:
+        self.cfg = cfg or IngestConfig()
+        self.collection = collection or settings.qdrant_collection_docs
+        self.on_progress = on_progress
+        # Chunk batches coalesce with concurrent memory writes into full /api/embed calls
+        self.embedder = background_embedder
+        self.store = document_store(self.collection, return_embedding=True)
+
+    async def _embed_batch(self, batch: List[Document], sem: asyncio.Semaphore) -> List[Document]:
+        async with sem:
+            vecs = await self.embedder.embed([d.content or "" for d in batch])
+        return [replace(d, embedding=v) for d, v in zip(batch, vecs)]
+
+    async def _upsert(self, batch: List[Document], progress: IngestProgress) -> None:
+        await self.store.write_documents_async(batch, policy="upsert")
+        progress.chunks_upserted += len(batch)
+        self.on_progress(progress)
+
+    async def ingest_chunks(self, chunks: Sequence[Document], progress: Optional[IngestProgress] = None) -> IngestProgress:
+        progress = progress or IngestProgress()
+        progress.chunks_total += len(chunks)
+        sem = asyncio.Semaphore(self.cfg.embed_concurrency)
+        # Keep at most a couple of batches queued per embed slot
+        max_pending = self.cfg.embed_concurrency * 2
+
+        pending: set[asyncio.Task] = set()
+        ready: List[Document] = []
+
+        async def drain(return_when: str) -> None:
+            nonlocal pending
+            done, pending = await asyncio.wait(pending, return_when=return_when)
+            for t in done:
+                batch = t.result()
+                progress.chunks_embedded += len(batch)
+                ready.extend(batch)
+            while len(ready) >= self.cfg.upsert_batch_size:
+                await self._upsert(ready[: self.cfg.upsert_batch_size], progress)
+                del ready[: self.cfg.upsert_batch_size]
+
+        try:
+            for batch in _batched(chunks, self.cfg.embed_batch_size):
+                pending.add(asyncio.create_task(self._embed_batch(batch, sem)))
+                if len(pending) >= max_pending:
+                    await drain(asyncio.FIRST_COMPLETED)
+            if pending:
+                await drain(asyncio.ALL_COMPLETED)
+            if ready:
+                await self._upsert(ready, progress)
+        finally:
+            for t in pending:
+                t.cancel()
+        return progress
+
+    async def ingest_folder(self, folder_path: str) -> IngestProgress:
+        docs = load_documents_from_folder(folder_path)
+        chunks = split_documents(docs, chunk_size=self.cfg.chunk_size, overlap=self.cfg.chunk_overlap)
+        progress = IngestProgress(files=len(docs))
+        logger.info(f"[ingest] {len(docs)} files -> {len(chunks)} chunks from {folder_path}")
+        return await self.ingest_chunks(chunks, progress)
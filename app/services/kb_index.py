@@ -0,0 +1,213 @@
+# app/services/kb_index.py
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from haystack import Document
+
+from app.config import settings
+from app.services.kb_indexer import ManifestWatch, read_kb_version
+from app.services.qdrant_store import document_store
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+_COMPARATORS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+}
+
+
+class InMemoryVectorIndex:
+    """
+    Read-only, in-process copy of a static collection for serving.
+
+    All vectors live in one contiguous (n, dim) matrix with L2-normalized rows,
+    so cosine similarity for a query is a single matrix-vector product and
+    top-k is an `argpartition`. Haystack-format metadata filters become boolean
+    masks; equality masks and numeric columns for range filters are cached
+    until the next reload.
+    The index reloads itself when the KB manifest publishes a new version.
+    """
+
+    def __init__(
+        self,
+        collection: str,
+        *,
+        dtype: Optional[str] = None,
+        manifest_path: Optional[str] = None,
+        reload_check_s: Optional[float] = None,
+    ) -> None:
+        self.collection = collection
+        self.dtype = np.dtype(dtype or settings.kb_index_dtype)
+        self.manifest_path = manifest_path or settings.kb_manifest_path
+        self.watch = ManifestWatch(self.manifest_path, reload_check_s)
+        self.store = document_store(collection, return_embedding=True)
+
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((0, settings.embedding_dim), dtype=self.dtype)
+        self._ids: List[str] = []
+        self._pos: Dict[str, int] = {}
+        self._contents: List[Optional[str]] = []
+        self._metas: List[Dict[str, Any]] = []
+        self._eq_masks: Dict[Tuple[str, Any], np.ndarray] = {}
+        self._num_cols: Dict[str, np.ndarray] = {}
+        self.version: Optional[int] = None
+        self._loaded = False
+
+    # ---------- loading ----------
+
+    def load(self) -> None:
+        """Pull every point (with vectors) from Qdrant and swap in a fresh matrix."""
+        t0 = time.perf_counter()
+        version = read_kb_version(self.manifest_path)
+        docs = [d for d in self.store.filter_documents() if d.embedding is not None]
+
+        matrix = np.asarray([d.embedding for d in docs], dtype=np.float32).reshape(len(docs), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = np.ascontiguousarray(matrix / norms, dtype=self.dtype)
+
+        with self._lock:
+            self._matrix = matrix
+            self._ids = [d.id for d in docs]
+            self._pos = {d.id: i for i, d in enumerate(docs)}
+            self._contents = [d.content for d in docs]
+            self._metas = [dict(d.meta) for d in docs]
+            self._eq_masks = {}
+            self._num_cols = {}
+            self.version = version
+            self._loaded = True
+        logger.info(
+            f"In-memory index '{self.collection}' v{version}: {len(docs)} vectors, "
+            f"{matrix.nbytes / 1024:.0f} KiB {self.dtype} ({(time.perf_counter() - t0) * 1000:.0f} ms)"
+        )
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    def ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def reload_due(self) -> bool:
+        """Cheap check (rate-limited mtime stat) whether the manifest may have a new version."""
+        return self.watch.due()
+
+    def reload_if_changed(self) -> bool:
+        if read_kb_version(self.manifest_path) == self.version:
+            return False
+        self.load()
+        return True
+
+    # ---------- filtering ----------
+
+    def _column(self, field: str) -> List[Any]:
+        if field == "id":
+            return self._ids
+        if field == "content":
+            return self._contents
+        key = field[5:] if field.startswith("meta.") else field
+        return [m.get(key) for m in self._metas]
+
+    def _eq_mask(self, field: str, value: Any) -> np.ndarray:
+        key = (field, value if not isinstance(value, list) else tuple(value))
+        mask = self._eq_masks.get(key)
+        if mask is None:
+            mask = np.fromiter((v == value for v in self._column(field)), dtype=bool, count=len(self._ids))
+            self._eq_masks[key] = mask
+        return mask
+
+    def _mask(self, flt: Dict[str, Any]) -> np.ndarray:
+        op = flt.get("operator")
+        if "conditions" in flt:
+            masks = [self._mask(c) for c in flt["conditions"]]
+            if op == "AND":
+                return np.logical_and.reduce(masks) if masks else np.ones(len(self._ids), dtype=bool)
+            if op == "OR":
+                return np.logical_or.reduce(masks) if masks else np.zeros(len(self._ids), dtype=bool)
+            if op == "NOT":
+                return ~np.logical_and.reduce(masks) if masks else np.zeros(len(self._ids), dtype=bool)
+            raise ValueError(f"Unsupported logical operator: {op}")
+
+        field, value = flt["field"], flt.get("value")
+        if op == "==":
+            return self._eq_mask(field, value)
+        if op == "!=":
+            return ~self._eq_mask(field, value)
+        if op == "in":
+            return np.logical_or.reduce([self._eq_mask(field, v) for v in value]) if value else np.zeros(len(self._ids), dtype=bool)
+        if op == "not in":
+            return ~self._mask({"field": field, "operator": "in", "value": value})
+        if op in _COMPARATORS:
+            col = self._num_cols.get(field)
+            if col is None:
+                col = np.array(
+                    [v if isinstance(v, (int, float)) else np.nan for v in self._column(field)], dtype=np.float64
+                )
+                self._num_cols[field] = col
+            with np.errstate(invalid="ignore"):
+                return _COMPARATORS[op](col, float(value))
+        raise ValueError(f"Unsupported filter operator: {op}")
+
+    # ---------- search ----------
+
+    def search(
+        self,
+        query_embedding: List[float],
+        *,
+        top_k: int,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Document]:
+        self.ensure_loaded()
+        with self._lock:
+            matrix, ids, contents, metas = self._matrix, self._ids, self._contents, self._metas
+            mask = self._mask(filters) if filters else None
+        n = len(ids)
+        if n == 0 or top_k <= 0:
+            return []
+
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q /= (np.linalg.norm(q) or 1.0)
+        scores = (matrix @ q.astype(self.dtype, copy=False)).astype(np.float32, copy=False)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+            n = int(mask.sum())
+        k = min(top_k, n)
+        if k == 0:
+            return []
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            Document(
+                id=ids[i],
+                content=contents[i],
+                meta=dict(metas[i]),
+                score=float(scores[i]),
+                embedding=matrix[i].astype(np.float32).tolist(),
+            )
+            for i in top
+        ]
+
+    def embeddings_for(self, ids: List[str]) -> Dict[str, List[float]]:
+        """Normalized vectors of the given ids (those present in the index)."""
+        with self._lock:
+            matrix, pos = self._matrix, self._pos
+        return {i: matrix[pos[i]].astype(np.float32).tolist() for i in ids if i in pos}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "collection": self.collection,
+            "version": self.version,
+            "vectors": len(self._ids),
+            "dtype": str(self.dtype),
+            "bytes": int(self._matrix.nbytes),
+        }
@@ -0,0 +1,359 @@
+# app/services/kb_indexer.py
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from haystack import Document
+from haystack_integrations.document_stores.qdrant.converters import convert_id
+from qdrant_client.http import models
+
+from app.config import settings
+from app.services.ingestion import IngestConfig, KBIngestor, chunk_text
+from app.services.qdrant_store import aensure_collection, get_async_qdrant_client
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def chunk_id(source: str, content: str) -> str:
+    """
+    Deterministic document id for a chunk: same file + same text -> same id,
+    hence the same Qdrant point, across runs and machines.
+    """
+    return _sha256(f"{source}\0{content}".encode("utf-8"))
+
+
+@dataclass
+class KBManifest:
+    """
+    What is currently indexed: per-file content hash and the ids of its chunks.
+    `version` increases on every sync that changed the collection so serving-side
+    caches and in-process indexes know when to reload.
+    """
+
+    fingerprint: Dict[str, Any] = field(default_factory=dict)
+    version: int = 0
+    updated_at: float = 0.0
+    files: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # name -> {"sha256", "chunks": [ids]}
+
+    @classmethod
+    def load(cls, path: str) -> "KBManifest":
+        if not os.path.exists(path):
+            return cls()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            return cls(
+                fingerprint=raw.get("fingerprint", {}),
+                version=int(raw.get("version", 0)),
+                updated_at=float(raw.get("updated_at", 0.0)),
+                files=raw.get("files", {}),
+            )
+        except Exception as e:
+            logger.warning(f"Unreadable KB manifest {path} ({e}); treating index as empty")
+            return cls()
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "fingerprint": self.fingerprint,
+                    "version": self.version,
+                    "updated_at": self.updated_at,
+                    "files": self.files,
+                },
+                f,
+                indent=1,
+            )
+        os.replace(tmp, path)
+
+
+def read_kb_version(path: Optional[str] = None) -> int:
+    """Current published KB index version (0 when nothing was indexed yet)."""
+    return KBManifest.load(path or settings.kb_manifest_path).version
+
+
+class ManifestWatch:
+    """
+    Rate-limited "was a new KB version published?" check for serving-side
+    indexes: at most one stat() of the manifest every `interval_s`.
+    """
+
+    def __init__(self, path: Optional[str] = None, interval_s: Optional[float] = None) -> None:
+        self.path = path or settings.kb_manifest_path
+        self.interval_s = interval_s or settings.kb_index_reload_check_s
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+
+    def due(self) -> bool:
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.interval_s
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        return True
+
+
+@dataclass
+class SyncReport:
+    files_scanned: int = 0
+    files_changed: int = 0
+    files_removed: int = 0
+    chunks_embedded: int = 0
+    chunks_moved: int = 0
+    chunks_deleted: int = 0
+    version: int = 0
+    elapsed_s: float = 0.0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.chunks_embedded or self.chunks_moved or self.chunks_deleted or self.files_removed)
+
+
+class KBIndexer:
+    """
+    Incremental KB indexing driven by a content-hash manifest.
+    Unchanged files are skipped without chunking; changed files are re-chunked
+    and only chunks with new content are embedded; kept chunks that moved
+    within their file get their position meta rewritten. Points belonging to removed
+    files or vanished chunks are deleted after the new ones are written; a
+    rebuild (no manifest, --full, fingerprint change) deletes every point that
+    is not part of the new chunk set, including ones the manifest never knew.
+    """
+
+    def __init__(
+        self,
+        *,
+        folder: Optional[str] = None,
+        manifest_path: Optional[str] = None,
+        cfg: Optional[IngestConfig] = None,
+        ingestor: Optional[KBIngestor] = None,
+        lexical_path: Optional[str] = None,
+    ) -> None:
+        self.folder = folder or settings.kb_folder
+        self.manifest_path = manifest_path or settings.kb_manifest_path
+        self.lexical_path = lexical_path or settings.kb_lexical_path
+        self.ingestor = ingestor or KBIngestor(cfg=cfg)
+        self.cfg = self.ingestor.cfg
+        self._lock = asyncio.Lock()
+
+    def _fingerprint(self) -> Dict[str, Any]:
+        # Any of these changing invalidates every stored vector/chunk boundary
+        return {
+            "collection": self.ingestor.collection,
+            "embed_model": settings.ollama_embed_model,
+            "embedding_dim": settings.embedding_dim,
+            "chunk_size": self.cfg.chunk_size,
+            "chunk_overlap": self.cfg.chunk_overlap,
+        }
+
+    def _scan(self) -> Dict[str, Tuple[str, str]]:
+        """name -> (sha256, text) for every .txt file in the folder."""
+        out: Dict[str, Tuple[str, str]] = {}
+        for fn in sorted(os.listdir(self.folder)):
+            if not fn.endswith(".txt"):
+                continue
+            with open(os.path.join(self.folder, fn), "rb") as f:
+                raw = f.read()
+            out[fn] = (_sha256(raw), raw.decode("utf-8"))
+        return out
+
+    def _chunk_file(self, name: str, text: str) -> List[Document]:
+        pieces = chunk_text(text, chunk_size=self.cfg.chunk_size, overlap=self.cfg.chunk_overlap)
+        return [
+            Document(
+                id=chunk_id(name, piece),
+                content=piece,
+                meta={"name": name, "source": name, "chunk_index": i, "chunk_count": len(pieces)},
+            )
+            for i, piece in enumerate(pieces)
+        ]
+
+    def _update_lexical_snapshot(
+        self,
+        *,
+        prev_version: int,
+        version: int,
+        added: List[Document],
+        stale_ids: List[str],
+        rebuild: bool,
+    ) -> None:
+        """
+        Keep the BM25 snapshot served by the hybrid retriever in step with the
+        collection: patched with this sync's delta when the previous snapshot is
+        current, otherwise rebuilt from every point in the collection.
+        """
+        # Imported here: lexical_index depends on this module for manifest access
+        from app.services.lexical_index import BM25Index
+
+        index = None if rebuild else BM25Index.load(self.lexical_path, expect_version=prev_version)
+        if index is None:
+            index = BM25Index()
+            index.add(self.ingestor.store.filter_documents())
+        else:
+            index.remove(stale_ids)
+            index.add(added)
+        index.save(self.lexical_path, version=version)
+
+    async def _collection_ids(self) -> set[str]:
+        """Document ids of every point in the collection (payload id only, no vectors)."""
+        await aensure_collection(self.ingestor.collection)
+        client = get_async_qdrant_client()
+        ids: set[str] = set()
+        offset = None
+        while True:
+            points, offset = await client.scroll(
+                collection_name=self.ingestor.collection,
+                with_payload=["id"],
+                with_vectors=False,
+                limit=1024,
+                offset=offset,
+            )
+            ids.update(p.payload["id"] for p in points if p.payload and "id" in p.payload)
+            if offset is None:
+                return ids
+
+    async def _update_positions(self, docs: List[Document]) -> None:
+        """Rewrite the payload meta of kept chunks; their text and vector are unchanged."""
+        store = self.ingestor.store
+        ops = [
+            models.SetPayloadOperation(set_payload=models.SetPayload(payload={"meta": d.meta}, points=[convert_id(d.id)]))
+            for d in docs
+        ]
+        client = get_async_qdrant_client()
+        for i in range(0, len(ops), settings.qdrant_write_batch_size):
+            await client.batch_update_points(
+                collection_name=store.index,
+                update_operations=ops[i : i + settings.qdrant_write_batch_size],
+                wait=store.wait_result_from_api,
+            )
+
+    async def sync(self, *, full: bool = False) -> SyncReport:
+        """Bring the collection in line with the folder; `full` re-embeds everything."""
+        async with self._lock:
+            t0 = time.perf_counter()
+            manifest = KBManifest.load(self.manifest_path)
+            fingerprint = self._fingerprint()
+            rebuild = full or manifest.fingerprint != fingerprint
+            if rebuild:
+                if manifest.files:
+                    logger.info("[kb-index] fingerprint changed or full rebuild requested; re-embedding all files")
+                known_ids: set[str] = set()
+            else:
+                known_ids = {cid for entry in manifest.files.values() for cid in entry.get("chunks", [])}
+
+            scanned = await asyncio.to_thread(self._scan)
+            report = SyncReport(files_scanned=len(scanned))
+
+            new_files: Dict[str, Dict[str, Any]] = {}
+            to_embed: List[Document] = []
+            moved: List[Document] = []  # kept chunks whose chunk_index/chunk_count changed
+            for name, (digest, text) in scanned.items():
+                prev = manifest.files.get(name)
+                if known_ids and prev and prev.get("sha256") == digest:
+                    new_files[name] = prev
+                    continue
+                chunks = self._chunk_file(name, text)
+                report.files_changed += 1
+                prev_chunks = prev.get("chunks", []) if prev else []
+                prev_pos = {cid: i for i, cid in enumerate(prev_chunks)}
+                for d in chunks:
+                    if d.id not in known_ids:
+                        to_embed.append(d)
+                    elif prev_pos.get(d.id) != d.meta["chunk_index"] or len(prev_chunks) != len(chunks):
+                        moved.append(d)
+                new_files[name] = {"sha256": digest, "chunks": [d.id for d in chunks]}
+
+            live_ids = {cid for entry in new_files.values() for cid in entry["chunks"]}
+            old_ids = {cid for entry in manifest.files.values() for cid in entry.get("chunks", [])}
+            if rebuild:
+                # Points from before this manifest (whole-file vectors, older chunkings)
+                old_ids |= await self._collection_ids()
+            stale_ids = sorted(old_ids - live_ids)
+            report.files_removed = len(set(manifest.files) - set(scanned))
+
+            # Write new points first so the KB never goes empty mid-sync
+            if to_embed:
+                progress = await self.ingestor.ingest_chunks(to_embed)
+                report.chunks_embedded = progress.chunks_upserted
+            if moved:
+                await self._update_positions(moved)
+                report.chunks_moved = len(moved)
+            if stale_ids:
+                await self.ingestor.store.delete_documents_async(stale_ids)
+                report.chunks_deleted = len(stale_ids)
+
+            prev_version = manifest.version
+            if report.changed or manifest.fingerprint != fingerprint:
+                manifest.version += 1
+                manifest.updated_at = time.time()
+            # Snapshot before the manifest: readers reload on the version bump
+            await asyncio.to_thread(
+                self._update_lexical_snapshot,
+                prev_version=prev_version,
+                version=manifest.version,
+                added=to_embed + moved,
+                stale_ids=stale_ids,
+                rebuild=rebuild,
+            )
+            manifest.fingerprint = fingerprint
+            manifest.files = new_files
+            manifest.save(self.manifest_path)
+
+            report.version = manifest.version
+            report.elapsed_s = time.perf_counter() - t0
+            logger.info(
+                f"[kb-index] v{report.version}: {report.files_changed}/{report.files_scanned} files changed, "
+                f"{report.files_removed} removed, {report.chunks_embedded} chunks embedded, "
+                f"{report.chunks_moved} moved, {report.chunks_deleted} deleted ({report.elapsed_s:.1f}s)"
+            )
+            return report
+
+    def _folder_signature(self) -> Tuple[Tuple[str, int, int], ...]:
+        """Cheap change detector: (name, size, mtime_ns) of every .txt file."""
+        sig = []
+        for fn in sorted(os.listdir(self.folder)):
+            if fn.endswith(".txt"):
+                st = os.stat(os.path.join(self.folder, fn))
+                sig.append((fn, st.st_size, st.st_mtime_ns))
+        return tuple(sig)
+
+    async def watch(self, *, interval_s: Optional[float] = None) -> None:
+        """
+        Poll the folder and sync whenever a file is added, removed or modified.
+        Runs until cancelled (used by the server when kb_watch_enabled is set,
+        and by `embedder.py --watch`).
+        """
+        interval = interval_s or settings.kb_watch_interval_s
+        last_sig = None
+        logger.info(f"[kb-index] watching {self.folder} every {interval}s")
+        while True:
+            try:
+                sig = await asyncio.to_thread(self._folder_signature)
+                if sig != last_sig:
+                    await self.sync()
+                    last_sig = sig
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[kb-index] sync failed: {e}")
+            await asyncio.sleep(interval)
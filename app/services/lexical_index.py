@@ -0,0 +1,323 @@
+# app/services/lexical_index.py
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from haystack import Document
+from haystack.utils.filters import document_matches_filter
+
+from app.config import settings
+from app.services.kb_indexer import ManifestWatch, read_kb_version
+from app.services.qdrant_store import document_store
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Only the most frequent function words: names, numbers and times must survive
+_STOPWORDS = frozenset(
+    "a an and are as at be but by do does for from has have he her his i in is it its me my of on or "
+    "our she so that the their them they this to was we were what when where which who why will with "
+    "you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word/number tokens without stopwords ("5:30 pm" -> ["5", "30", "pm"])."""
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over an in-memory inverted index (term -> {doc_id: tf}).
+    Documents can be added/replaced and removed by id, so the index follows
+    incremental KB syncs and memory upserts without a rebuild.
+    """
+
+    def __init__(self, *, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._docs: Dict[str, Document] = {}
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_len: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _remove_locked(self, doc_id: str) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._docs.pop(doc_id, None)
+        self._total_len -= self._doc_len.pop(doc_id, 0)
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+
+    def add(self, docs: Iterable[Document]) -> None:
+        """Index documents; an existing id is replaced."""
+        with self._lock:
+            for d in docs:
+                self._remove_locked(d.id)
+                terms = Counter(tokenize(d.content or ""))
+                self._docs[d.id] = Document(id=d.id, content=d.content, meta=dict(d.meta))
+                self._doc_terms[d.id] = terms
+                self._doc_len[d.id] = sum(terms.values())
+                self._total_len += self._doc_len[d.id]
+                for term, tf in terms.items():
+                    self._postings.setdefault(term, {})[d.id] = tf
+
+    def remove(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            for doc_id in ids:
+                self._remove_locked(doc_id)
+
+    def search(self, query: str, *, top_k: int, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """Top-k documents by BM25 score (only docs sharing a term with the query)."""
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self._docs)
+            if not terms or n == 0 or top_k <= 0:
+                return []
+            avg_len = self._total_len / n or 1.0
+            scores: Dict[str, float] = {}
+            for term in terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1.0 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    norm = tf + self.k1 * (1.0 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1.0) / norm
+
+            out: List[Document] = []
+            for doc_id, score in sorted(scores.items(), key=lambda kv: kv[1], reverse=True):
+                doc = self._docs[doc_id]
+                if filters and not document_matches_filter(filters, doc):
+                    continue
+                out.append(Document(id=doc.id, content=doc.content, meta=dict(doc.meta), score=score))
+                if len(out) >= top_k:
+                    break
+            return out
+
+    # ---------- snapshots ----------
+
+    def save(self, path: str, *, version: int) -> None:
+        """Atomically write the indexed documents (tokens are recomputed on load)."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._lock:
+            docs = [{"id": d.id, "content": d.content, "meta": d.meta} for d in self._docs.values()]
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": version, "k1": self.k1, "b": self.b, "docs": docs}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, *, expect_version: Optional[int] = None) -> Optional["BM25Index"]:
+        """Load a snapshot; None if missing, unreadable or not at `expect_version`."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except Exception as e:
+            logger.warning(f"Unreadable lexical snapshot {path} ({e}); ignoring it")
+            return None
+        if expect_version is not None and raw.get("version") != expect_version:
+            return None
+        index = cls(k1=raw.get("k1", 1.2), b=raw.get("b", 0.75))
+        index.add(Document(id=d["id"], content=d["content"], meta=d.get("meta") or {}) for d in raw["docs"])
+        return index
+
+
+class LexicalIndex:
+    """
+    BM25 view of one Qdrant collection, loaded lazily on first use.
+
+    With `snapshot_path` (the KB) the index comes from the snapshot written at
+    ingest time and is reloaded whenever the KB manifest publishes a new
+    version; a missing or stale snapshot falls back to reading the collection.
+    Without it the index is read from Qdrant once and then kept current by
+    `add()` calls (user memories use UserLexicalIndex instead).
+    """
+
+    def __init__(
+        self,
+        collection: str,
+        *,
+        snapshot_path: Optional[str] = None,
+        manifest_path: Optional[str] = None,
+    ) -> None:
+        self.collection = collection
+        self.snapshot_path = snapshot_path
+        self.manifest_path = manifest_path or settings.kb_manifest_path
+        self.watch = ManifestWatch(self.manifest_path) if snapshot_path else None
+        self.bm25 = BM25Index()
+        self.version: Optional[int] = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    def _read_collection(self) -> BM25Index:
+        store = document_store(self.collection, return_embedding=False)
+        index = BM25Index()
+        index.add(store.filter_documents())
+        return index
+
+    def load(self) -> None:
+        with self._load_lock:
+            t0 = time.perf_counter()
+            version = read_kb_version(self.manifest_path) if self.snapshot_path else None
+            index = BM25Index.load(self.snapshot_path, expect_version=version) if self.snapshot_path else None
+            origin = "snapshot"
+            if index is None:
+                index = self._read_collection()
+                origin = "collection"
+            self.bm25, self.version, self._loaded = index, version, True
+            logger.info(
+                f"Lexical index '{self.collection}' from {origin}: {len(index)} docs "
+                f"({(time.perf_counter() - t0) * 1000:.0f} ms)"
+            )
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    def ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def is_loaded_for(self, filters: Optional[Dict[str, Any]]) -> bool:
+        return self._loaded
+
+    def ensure_loaded_for(self, filters: Optional[Dict[str, Any]]) -> None:
+        self.ensure_loaded()
+
+    def reload_due(self) -> bool:
+        return self.watch is not None and self.watch.due()
+
+    def reload_if_changed(self) -> bool:
+        if read_kb_version(self.manifest_path) == self.version:
+            return False
+        self.load()
+        return True
+
+    def add(self, docs: Iterable[Document]) -> None:
+        # Before the first load the collection read will include these anyway
+        if self._loaded:
+            self.bm25.add(docs)
+
+    def search(self, query: str, *, top_k: int, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        self.ensure_loaded()
+        return self.bm25.search(query, top_k=top_k, filters=filters)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"collection": self.collection, "version": self.version, "docs": len(self.bm25)}
+
+
+def _user_id_of(filters: Optional[Dict[str, Any]]) -> Optional[str]:
+    """The meta.user_id equality condition of a build_filters() filter, if any."""
+    if not filters:
+        return None
+    for cond in filters.get("conditions", [filters]):
+        if cond.get("field") == "meta.user_id" and cond.get("operator") == "==":
+            return cond.get("value")
+    return None
+
+
+class UserLexicalIndex(LexicalIndex):
+    """
+    BM25 over one user's memories at a time, read from Qdrant (user_id filter)
+    on that user's first search and re-read once `ttl_s` has passed.
+
+    Memories are written by whichever worker served the turn, so no process
+    can keep a full-collection index current by itself; per-user loads with a
+    TTL bound the staleness for writes from other workers (or after a Redis
+    session moved a user between them) to `ttl_s`. Writes made by this
+    worker show up immediately via `add()`. The `max_users` most recently
+    searched users are kept.
+    """
+
+    def __init__(self, collection: str, *, ttl_s: Optional[float] = None, max_users: Optional[int] = None) -> None:
+        super().__init__(collection)
+        self.ttl_s = settings.memory_lexical_ttl_s if ttl_s is None else ttl_s
+        self.max_users = max(1, max_users or settings.memory_lexical_max_users)
+        self._users: "OrderedDict[str, Tuple[BM25Index, float]]" = OrderedDict()
+        self._users_lock = threading.Lock()
+        self._loaded = True  # nothing to preload
+        self.loads = 0
+
+    def _fresh(self, user_id: str) -> Optional[BM25Index]:
+        with self._users_lock:
+            entry = self._users.get(user_id)
+            if entry is None or time.monotonic() - entry[1] > self.ttl_s:
+                return None
+            self._users.move_to_end(user_id)
+            return entry[0]
+
+    def _load_user(self, user_id: str) -> BM25Index:
+        store = document_store(self.collection, return_embedding=False)
+        index = BM25Index()
+        index.add(store.filter_documents(filters={"field": "meta.user_id", "operator": "==", "value": user_id}))
+        with self._users_lock:
+            self._users[user_id] = (index, time.monotonic())
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+            self.loads += 1
+        return index
+
+    def load(self) -> None:
+        with self._users_lock:
+            self._users.clear()
+
+    def is_loaded_for(self, filters: Optional[Dict[str, Any]]) -> bool:
+        user_id = _user_id_of(filters)
+        return user_id is None or self._fresh(user_id) is not None
+
+    def ensure_loaded_for(self, filters: Optional[Dict[str, Any]]) -> None:
+        user_id = _user_id_of(filters)
+        if user_id is not None and self._fresh(user_id) is None:
+            self._load_user(user_id)
+
+    def reload_due(self) -> bool:
+        return False
+
+    def add(self, docs: Iterable[Document]) -> None:
+        # Only users with a cached index; the others read Qdrant on their next search
+        with self._users_lock:
+            for d in docs:
+                entry = self._users.get(d.meta.get("user_id"))
+                if entry is not None:
+                    entry[0].add([d])
+
+    def search(self, query: str, *, top_k: int, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        user_id = _user_id_of(filters)
+        if user_id is None:
+            return []  # memories are only ever searched for one user
+        index = self._fresh(user_id) or self._load_user(user_id)
+        return index.search(query, top_k=top_k, filters=filters)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._users_lock:
+            docs = sum(len(index) for index, _ in self._users.values())
+            users = len(self._users)
+        return {"collection": self.collection, "users": users, "docs": docs, "loads": self.loads, "ttl_s": self.ttl_s}
+
+
+# Shared by the retriever (search) and the memory writer (add after upsert)
+memory_lexical_index = UserLexicalIndex(settings.qdrant_collection_memory)
@@ -0,0 +1,163 @@
+# app/services/llm_scheduler.py
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Priority classes; lower runs first
+INTERACTIVE = 0  # live chat turns
+BACKGROUND = 1  # memory summaries / memory and ingestion embeddings
+
+_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+
+class LLMBusy(RuntimeError):
+    """Raised when a request would wait (or has waited) longer than its queue deadline."""
+
+    def __init__(self, retry_after_s: float, message: str = "LLM is busy") -> None:
+        super().__init__(f"{message}; retry after {retry_after_s:.1f}s")
+        self.retry_after_s = retry_after_s
+
+
+class LLMScheduler:
+    """
+    Process-wide admission control in front of Ollama.
+
+    At most `slots` calls hold a slot at once; background work may hold at
+    most `background_slots` of them, so a chat turn never finds every slot
+    taken by memory summaries. Waiters are served by priority, then FIFO.
+    A caller with a deadline is rejected up front (LLMBusy with retry-after)
+    when the predicted wait already exceeds it, and again if the wait runs
+    out. The prediction is (waiters ahead + 1) x EWMA hold time / slots.
+    """
+
+    def __init__(
+        self,
+        *,
+        slots: Optional[int] = None,
+        background_slots: Optional[int] = None,
+        hold_estimate_s: Optional[float] = None,
+    ) -> None:
+        self.slots = max(1, slots or settings.llm_max_concurrency)
+        self.background_slots = max(1, min(self.slots, background_slots or settings.llm_background_max_slots))
+        prior = hold_estimate_s or settings.llm_hold_estimate_s
+        self._hold_ewma = {INTERACTIVE: prior, BACKGROUND: prior}
+        self._active = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._waiting = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._heap: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._counters = {"granted": 0, "queued": 0, "rejected": 0, "timed_out": 0}
+        self._wait_max_ms = {INTERACTIVE: 0, BACKGROUND: 0}
+
+    # ---------- admission ----------
+
+    def _can_run(self, priority: int) -> bool:
+        if sum(self._active.values()) >= self.slots:
+            return False
+        return priority == INTERACTIVE or self._active[BACKGROUND] < self.background_slots
+
+    def _ahead(self, priority: int) -> int:
+        """Waiters that would be served before a new request of this priority."""
+        return sum(n for p, n in self._waiting.items() if p <= priority)
+
+    def predicted_wait_s(self, priority: int) -> float:
+        """Expected queueing time for a new request of this priority (0 when a slot is free)."""
+        ahead = self._ahead(priority)
+        if not ahead and self._can_run(priority):
+            return 0.0
+        lanes = self.slots if priority == INTERACTIVE else self.background_slots
+        return (ahead + 1) * self._hold_ewma[priority] / lanes
+
+    def _wake(self) -> None:
+        while self._heap:
+            priority, _, fut = self._heap[0]
+            if fut.done():  # abandoned (timed out / cancelled)
+                heapq.heappop(self._heap)
+                continue
+            if not self._can_run(priority):
+                # Heads are ordered by priority: a blocked interactive head means no
+                # free slot at all; a blocked background head only has background behind it
+                return
+            heapq.heappop(self._heap)
+            self._waiting[priority] -= 1
+            self._active[priority] += 1
+            fut.set_result(None)
+
+    def _release(self, priority: int, held_s: float) -> None:
+        self._active[priority] -= 1
+        self._hold_ewma[priority] = 0.8 * self._hold_ewma[priority] + 0.2 * held_s
+        self._wake()
+
+    async def _acquire(self, priority: int, max_wait_s: Optional[float]) -> None:
+        if not self._ahead(priority) and self._can_run(priority):
+            self._active[priority] += 1
+            self._counters["granted"] += 1
+            return
+
+        predicted = self.predicted_wait_s(priority)
+        if max_wait_s is not None and predicted > max_wait_s:
+            self._counters["rejected"] += 1
+            raise LLMBusy(predicted)
+
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._seq), fut))
+        self._waiting[priority] += 1
+        self._counters["queued"] += 1
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(fut, timeout=max_wait_s)
+        except BaseException as e:
+            if fut.done() and not fut.cancelled():
+                # Granted in the same tick we gave up: hand the slot straight back
+                self._active[priority] -= 1
+                self._wake()
+            else:
+                fut.cancel()
+                self._waiting[priority] -= 1
+            if isinstance(e, asyncio.TimeoutError):
+                self._counters["timed_out"] += 1
+                raise LLMBusy(self.predicted_wait_s(priority)) from None
+            raise
+        waited_ms = int((time.perf_counter() - t0) * 1000)
+        self._wait_max_ms[priority] = max(self._wait_max_ms[priority], waited_ms)
+        self._counters["granted"] += 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = INTERACTIVE, *, max_wait_s: Optional[float] = None) -> AsyncIterator[None]:
+        """Hold one LLM slot for the duration of the block."""
+        await self._acquire(priority, max_wait_s)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(priority, time.perf_counter() - t0)
+
+    def default_max_wait_s(self, priority: int) -> Optional[float]:
+        return settings.llm_chat_max_wait_s if priority == INTERACTIVE else settings.llm_background_max_wait_s
+
+    # ---------- introspection ----------
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._counters,
+            "slots": self.slots,
+            "background_slots": self.background_slots,
+            "active": {_NAMES[p]: n for p, n in self._active.items()},
+            "waiting": {_NAMES[p]: n for p, n in self._waiting.items()},
+            "hold_ewma_s": {_NAMES[p]: round(v, 3) for p, v in self._hold_ewma.items()},
+            "wait_max_ms": {_NAMES[p]: v for p, v in self._wait_max_ms.items()},
+            "predicted_wait_s": {_NAMES[p]: round(self.predicted_wait_s(p), 3) for p in _NAMES},
+        }
+
+
+llm_scheduler = LLMScheduler()
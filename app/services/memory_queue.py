@@ -0,0 +1,283 @@
+# app/services/memory_queue.py
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.memory_summarizer import MemorySummarizer, MemoryWrite, memory_summarizer
+from app.utils.logging import get_logger
+from app.utils.metrics import count_error
+
+logger = get_logger(__name__)
+
+_DROP_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+
+@dataclass
+class _Turn:
+    user_text: str
+    bot_text: str
+    enqueued_at: float  # time.monotonic()
+
+
+class MemoryQueue:
+    """
+    Bounded background queue for memory summarization.
+
+    Turns are grouped per (user_id, session_id): a worker takes all pending
+    turns of the oldest session (up to `max_coalesce`) and summarizes them in
+    one LLM call. Summaries are handed to a single writer that embeds and
+    upserts them in batches. When the queue is full the drop policy decides:
+      - drop_oldest: evict the oldest pending turn (default)
+      - drop_newest: reject the incoming turn
+      - block:       wait up to `enqueue_timeout_s` for space, then reject
+    `stop()` stops intake and drains pending work before shutdown.
+    """
+
+    def __init__(
+        self,
+        summarizer: MemorySummarizer,
+        *,
+        maxsize: Optional[int] = None,
+        workers: Optional[int] = None,
+        max_coalesce: Optional[int] = None,
+        coalesce_window_s: Optional[float] = None,
+        drop_policy: Optional[str] = None,
+        enqueue_timeout_s: Optional[float] = None,
+        write_batch_size: Optional[int] = None,
+        write_window_s: Optional[float] = None,
+    ) -> None:
+        self.summarizer = summarizer
+        self.maxsize = maxsize or settings.memory_queue_maxsize
+        self.n_workers = workers or settings.memory_workers
+        self.max_coalesce = max_coalesce or settings.memory_coalesce_max_turns
+        self.coalesce_window_s = (
+            settings.memory_coalesce_window_s if coalesce_window_s is None else coalesce_window_s
+        )
+        self.drop_policy = drop_policy or settings.memory_drop_policy
+        if self.drop_policy not in _DROP_POLICIES:
+            raise ValueError(f"memory_drop_policy must be one of {_DROP_POLICIES}, got {self.drop_policy!r}")
+        self.enqueue_timeout_s = enqueue_timeout_s or settings.memory_enqueue_timeout_s
+        self.write_batch_size = write_batch_size or settings.memory_write_batch_size
+        self.write_window_s = write_window_s or settings.memory_write_window_s
+
+        self._pending: "OrderedDict[Tuple[str, str], List[_Turn]]" = OrderedDict()
+        self._depth = 0
+        self._wake = asyncio.Event()
+        self._space = asyncio.Event()
+        self._writes: "asyncio.Queue[Optional[MemoryWrite]]" = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._writer: Optional[asyncio.Task] = None
+        self._accepting = False
+        self._in_flight = 0
+
+        self._counters = {
+            "accepted": 0,
+            "dropped": 0,
+            "coalesced": 0,
+            "jobs": 0,
+            "turns_processed": 0,
+            "memories_written": 0,
+            "failures": 0,
+        }
+        self._lag_last = 0.0
+        self._lag_max = 0.0
+        self._lag_ewma = 0.0
+
+    # ---------- lifecycle ----------
+
+    async def start(self) -> None:
+        if self._accepting:
+            return
+        self._accepting = True
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.n_workers)]
+        self._writer = asyncio.create_task(self._writer_loop())
+        logger.info(f"Memory queue started: {self.n_workers} workers, maxsize={self.maxsize}, policy={self.drop_policy}")
+
+    async def stop(self, timeout_s: Optional[float] = None) -> None:
+        """Stop intake, finish pending turns and flush writes (bounded by timeout_s)."""
+        timeout = timeout_s or settings.memory_drain_timeout_s
+        self._accepting = False
+        self._wake.set()
+        self._space.set()
+        deadline = time.monotonic() + timeout
+
+        try:
+            await asyncio.wait_for(asyncio.gather(*self._workers), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Memory queue drain timed out; {self._depth} pending turns discarded")
+            for t in self._workers:
+                t.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+
+        if self._writer is not None:
+            await self._writes.put(None)
+            try:
+                await asyncio.wait_for(self._writer, timeout=max(0.1, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                logger.warning(f"Memory writer flush timed out; {self._writes.qsize()} memories discarded")
+                self._writer.cancel()
+        self._workers, self._writer = [], None
+        logger.info(f"Memory queue stopped: {self.stats()}")
+
+    # ---------- intake ----------
+
+    def _drop_oldest(self) -> None:
+        key, turns = next(iter(self._pending.items()))
+        turns.pop(0)
+        if not turns:
+            del self._pending[key]
+        self._depth -= 1
+        self._counters["dropped"] += 1
+
+    async def submit(self, *, user_id: str, session_id: str, user_text: str, bot_text: str) -> bool:
+        """Enqueue a finished turn; returns False if it was dropped."""
+        if not self._accepting:
+            self._counters["dropped"] += 1
+            return False
+
+        if self._depth >= self.maxsize:
+            if self.drop_policy == "drop_oldest":
+                self._drop_oldest()
+            elif self.drop_policy == "block":
+                deadline = time.monotonic() + self.enqueue_timeout_s
+                while self._depth >= self.maxsize and self._accepting:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._space.clear()
+                    try:
+                        await asyncio.wait_for(self._space.wait(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+            if self._depth >= self.maxsize or not self._accepting:
+                self._counters["dropped"] += 1
+                logger.warning(f"Memory queue full ({self._depth}); dropped turn for session={session_id}")
+                return False
+
+        turn = _Turn(user_text=user_text, bot_text=bot_text, enqueued_at=time.monotonic())
+        self._pending.setdefault((user_id, session_id), []).append(turn)
+        self._depth += 1
+        self._counters["accepted"] += 1
+        self._wake.set()
+        return True
+
+    # ---------- workers ----------
+
+    async def _next_batch(self) -> Optional[Tuple[Tuple[str, str], List[_Turn]]]:
+        while True:
+            if self._pending:
+                key, turns = next(iter(self._pending.items()))
+                # Give the session a moment to accumulate more turns to coalesce
+                wait = turns[0].enqueued_at + self.coalesce_window_s - time.monotonic()
+                if wait > 0 and len(turns) < self.max_coalesce and self._accepting:
+                    await asyncio.sleep(wait)
+                    continue
+
+                batch, rest = turns[: self.max_coalesce], turns[self.max_coalesce :]
+                if rest:
+                    self._pending[key] = rest
+                    self._pending.move_to_end(key)
+                else:
+                    del self._pending[key]
+                self._depth -= len(batch)
+                self._space.set()
+                return key, batch
+
+            if not self._accepting:
+                return None
+            self._wake.clear()
+            await self._wake.wait()
+
+    def _record_lag(self, lag_s: float) -> None:
+        self._lag_last = lag_s
+        self._lag_max = max(self._lag_max, lag_s)
+        self._lag_ewma = lag_s if not self._lag_ewma else 0.9 * self._lag_ewma + 0.1 * lag_s
+
+    async def _worker(self, idx: int) -> None:
+        while (item := await self._next_batch()) is not None:
+            (user_id, session_id), turns = item
+            self._record_lag(time.monotonic() - turns[0].enqueued_at)
+            self._in_flight += 1
+            try:
+                summary = await self.summarizer.summarize_turns([(t.user_text, t.bot_text) for t in turns])
+                logger.info(f"Memory summary ({len(turns)} turns, session={session_id}): {summary!r}")
+                if summary and summary.upper() != "NONE":
+                    await self._writes.put(MemoryWrite(summary, user_id, session_id))
+                self._counters["jobs"] += 1
+                self._counters["turns_processed"] += len(turns)
+                self._counters["coalesced"] += len(turns) - 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._counters["failures"] += 1
+                count_error("memory_summarize", e)
+                logger.error(f"Memory summarization failed (worker {idx}): {e}")
+            finally:
+                self._in_flight -= 1
+
+    async def _writer_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._writes.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = loop.time() + self.write_window_s
+            while len(batch) < self.write_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._writes.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                ids = await self.summarizer.aupsert_memories(batch)
+                self._counters["memories_written"] += len(ids)
+                logger.info(f"User memories upserted: {len(ids)} in one batch")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._counters["failures"] += 1
+                count_error("memory_write", e)
+                logger.error(f"Memory upsert failed for {len(batch)} snippets: {e}")
+
+    # ---------- introspection ----------
+
+    def stats(self) -> Dict[str, Any]:
+        oldest = None
+        if self._pending:
+            first_turns = next(iter(self._pending.values()))
+            oldest = time.monotonic() - first_turns[0].enqueued_at
+        return {
+            **self._counters,
+            "depth": self._depth,
+            "sessions_pending": len(self._pending),
+            "in_flight": self._in_flight,
+            "write_queue": self._writes.qsize(),
+            "oldest_pending_ms": int(oldest * 1000) if oldest is not None else 0,
+            "dedup": dict(self.summarizer.dedup_stats),
+            "summarize": self.summarizer.summary_stats.stats(),
+            "write": self.summarizer.write_stats.stats(),
+            "lag_ms": {
+                "last": int(self._lag_last * 1000),
+                "max": int(self._lag_max * 1000),
+                "ewma": int(self._lag_ewma * 1000),
+            },
+        }
+
+
+# Singleton used by ws_chat; started/stopped by the app lifecycle
+memory_queue = MemoryQueue(memory_summarizer)
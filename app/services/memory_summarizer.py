@@ -2,26 +2,35 @@
 
 from __future__ import annotations
 
-import asyncio
+import math
+import time
+from dataclasses import replace
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
 
 from haystack import Document
 from haystack.dataclasses import ChatMessage
-from haystack_integrations.components.embedders.ollama.document_embedder import (
-    OllamaDocumentEmbedder,
-)
-from haystack_integrations.document_stores.qdrant import QdrantDocumentStore
+from haystack_integrations.components.retrievers.qdrant import QdrantEmbeddingRetriever
+from haystack_integrations.document_stores.qdrant.converters import convert_id
+from qdrant_client.http import models
 
 from app.config import settings
+from app.services.embed_batcher import background_embedder
 from app.services.generator import LLMGenerator
+from app.services.lexical_index import memory_lexical_index
+from app.services.llm_scheduler import BACKGROUND
+from app.services.ollama_client import DirectOllamaClient, usage_from_stats
+from app.services.qdrant_store import document_store, get_async_qdrant_client, get_qdrant_client
+from app.services.retriever import build_filters
 from app.utils.logging import get_logger
+from app.utils.metrics import MEMORY_DEDUP, observe_tokens
+from app.utils.timing import StageStats, ms_since
 
 logger = get_logger(__name__)
 
 # More permissive: treat explicit preferences as durable unless claimed temporary.
 _SUMMARY_SYSTEM_PROMPT = (
-    "You summarize a single user turn into durable memory for personalization.\n"
+    "You summarize one or more user turns into durable memory for personalization.\n"
     "Extract ONLY stable facts, preferences, habits, constraints, skills, goals, or recurring concerns.\n"
     "Treat explicit first-person preferences (e.g., 'I like mangoes') as durable unless marked temporary.\n"
     "Exclude one-off mood, chat logistics, or model/tool mentions.\n"
@@ -34,6 +43,35 @@ def _utc_iso() -> str:
 def _utc_epoch() -> float:
     return datetime.now(timezone.utc).timestamp()
 
+def _is_durable(text: str) -> bool:
+    return bool(text) and text.upper() != "NONE"
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a))
+    nb = math.sqrt(sum(y * y for y in b))
+    return dot / (na * nb) if na and nb else 0.0
+
+def _merge_bullets(old: str, new: str, max_lines: int) -> str:
+    """Append lines of `new` not already present in `old` (case/space-insensitive), newest kept."""
+    def norm(line: str) -> str:
+        return " ".join(line.lstrip("-•* ").casefold().split())
+
+    lines = [l for l in old.splitlines() if l.strip()]
+    seen = {norm(l) for l in lines}
+    for l in new.splitlines():
+        if l.strip() and norm(l) not in seen:
+            lines.append(l)
+            seen.add(norm(l))
+    return "\n".join(lines[-max_lines:])
+
+
+class MemoryWrite(NamedTuple):
+    """A summarized memory snippet waiting to be embedded and stored."""
+    text: str
+    user_id: str
+    session_id: str
+
 
 class MemorySummarizer:
     """
@@ -42,35 +80,40 @@ class MemorySummarizer:
     """
 
     def __init__(self) -> None:
-        self.generator = LLMGenerator()
-        self.embedder = OllamaDocumentEmbedder(model=settings.ollama_embed_model)
+        self.generator = LLMGenerator(priority=BACKGROUND)
+        # Embeddings share the pooled Ollama transport with chat; async writes
+        # go through the batcher shared with KB ingestion
+        self.ollama = DirectOllamaClient(priority=BACKGROUND)
+        self.embedder = background_embedder
 
         # <-- THIS was missing in your trace
-        self.mem_store = QdrantDocumentStore(
-            url=settings.qdrant_url,
-            index=settings.qdrant_collection_memory,
-            recreate_index=False,
-            return_embedding=True,
-            wait_result_from_api=True,
-            embedding_dim=settings.embedding_dim,
-            similarity=settings.embedding_similarity,
-        )
+        # Dedup searches must see the previous write, so upserts wait for
+        # indexing while it is on (unless qdrant_memory_write_wait says otherwise)
+        write_wait = settings.qdrant_memory_write_wait
+        if write_wait is None:
+            write_wait = settings.memory_dedup_enabled
+        self.mem_store = document_store(settings.qdrant_collection_memory, return_embedding=True, wait=write_wait)
+        # Used for near-duplicate lookups before each write; hits carry their
+        # vectors so a touched memory keeps its embedding
+        self.mem_retriever = QdrantEmbeddingRetriever(document_store=self.mem_store, return_embedding=True)
+        self.dedup_stats = {"inserted": 0, "touched": 0, "merged": 0}
+        # Per-job breakdowns: LLM summarization and embed + dedup + upsert batches
+        self.summary_stats = StageStats()
+        self.write_stats = StageStats()
 
-    def _summarize_sync(self, user_text: str, bot_text: str) -> str:
-        messages = [
-            ChatMessage.from_system(_SUMMARY_SYSTEM_PROMPT),
-            ChatMessage.from_user(f"User said: {user_text}"),
-            ChatMessage.from_assistant(f"Assistant replied: {bot_text}"),
-            ChatMessage.from_user("Now extract durable memory bullets."),
-        ]
-        summary, _ = self.generator.stream_chat(messages, on_token=None)
-        return (summary or "").strip()
+    @staticmethod
+    def _summary_messages(turns: Sequence[Tuple[str, str]]) -> list[ChatMessage]:
+        """One or more (user_text, bot_text) turns -> summarization prompt."""
+        messages = [ChatMessage.from_system(_SUMMARY_SYSTEM_PROMPT)]
+        for user_text, bot_text in turns:
+            messages.append(ChatMessage.from_user(f"User said: {user_text}"))
+            messages.append(ChatMessage.from_assistant(f"Assistant replied: {bot_text}"))
+        messages.append(ChatMessage.from_user("Now extract durable memory bullets."))
+        return messages
 
-    def _embed_and_upsert(self, text: str, user_id: str, session_id: str) -> Optional[str]:
-        if not text or text.upper() == "NONE":
-            return None
-
-        doc = Document(
+    @staticmethod
+    def _memory_doc(text: str, user_id: str, session_id: str) -> Document:
+        return Document(
             content=text,
             meta={
                 "user_id": user_id,
@@ -81,19 +124,196 @@ class MemorySummarizer:
             },
         )
 
-        embedded_doc = self.embedder.run([doc])["documents"][0]
-        # Use upsert so repeated memories get updated
-        self.mem_store.write_documents([embedded_doc], policy="upsert")
-        return embedded_doc.id
+    def _summarize_sync(self, user_text: str, bot_text: str) -> str:
+        messages = self._summary_messages([(user_text, bot_text)])
+        summary, _ = self.generator.stream_chat(messages, on_token=None)
+        return (summary or "").strip()
+
+    async def summarize_turns(self, turns: Sequence[Tuple[str, str]]) -> str:
+        """Summarize several turns of one session in a single LLM call."""
+        messages = self._summary_messages(turns)
+        t0 = time.perf_counter()
+        summary, usage = await self.generator.astream_chat(messages, on_token=None)
+        sample = {"turns": len(turns), "generation_ms": ms_since(t0), **usage_from_stats(usage)}
+        self.summary_stats.record(sample)
+        observe_tokens("memory", sample)
+        logger.debug(f"Memory summarization job: {sample}")
+        return (summary or "").strip()
+
+    # ---------- near-duplicate suppression ----------
+
+    def _dedup_filters(self, doc: Document) -> Optional[dict]:
+        # Scope matches what the chat retriever can see (user, or user + session)
+        session_id = doc.meta["session_id"] if settings.memory_dedup_scope == "session" else None
+        return build_filters(user_id=doc.meta["user_id"], session_id=session_id)
+
+    def _pick_duplicate(self, hits: List[Document]) -> Optional[Document]:
+        if hits and hits[0].score is not None and hits[0].score >= settings.memory_dedup_threshold:
+            return hits[0]
+        return None
+
+    def _find_duplicate(self, doc: Document) -> Optional[Document]:
+        out = self.mem_retriever.run(query_embedding=doc.embedding, top_k=1, filters=self._dedup_filters(doc))
+        return self._pick_duplicate(out.get("documents", []))
+
+    async def _afind_duplicate(self, doc: Document) -> Optional[Document]:
+        out = await self.mem_retriever.run_async(
+            query_embedding=doc.embedding, top_k=1, filters=self._dedup_filters(doc)
+        )
+        return self._pick_duplicate(out.get("documents", []))
+
+    def _count_dedup(self, decision: str) -> None:
+        self.dedup_stats[decision] += 1
+        MEMORY_DEDUP.labels(decision).inc()
+
+    def _apply_duplicate(self, existing: Document, new: Document) -> Tuple[Document, bool]:
+        """
+        Fold `new` into `existing` (same point id). Returns (doc, needs_embedding):
+        "touch" keeps the stored text/vector and refreshes timestamp + hit_count;
+        "merge" also appends bullets that are not already present.
+        """
+        content = existing.content or ""
+        decision = "touched"
+        if settings.memory_dedup_mode == "merge":
+            merged = _merge_bullets(content, new.content or "", settings.memory_merge_max_lines)
+            if merged != content:
+                content, decision = merged, "merged"
+
+        meta = {
+            **existing.meta,
+            "timestamp": new.meta["timestamp"],
+            "timestamp_epoch": new.meta["timestamp_epoch"],
+            "hit_count": int(existing.meta.get("hit_count", 1)) + 1,
+        }
+        self._count_dedup(decision)
+        logger.info(
+            f"Memory dedup: {decision} {existing.id} (score={existing.score:.3f}, "
+            f"hits={meta['hit_count']}, user={meta.get('user_id')})"
+        )
+        needs_embedding = decision == "merged"
+        doc = Document(
+            id=existing.id,
+            content=content,
+            meta=meta,
+            embedding=None if needs_embedding else existing.embedding,
+        )
+        return doc, needs_embedding
+
+    def _touch_ops(self, docs: Sequence[Document]) -> List[models.SetPayloadOperation]:
+        # The stored text and vector are unchanged: only the payload's meta is replaced
+        return [
+            models.SetPayloadOperation(set_payload=models.SetPayload(payload={"meta": d.meta}, points=[convert_id(d.id)]))
+            for d in docs
+        ]
+
+    def _touch(self, docs: Sequence[Document]) -> None:
+        get_qdrant_client().batch_update_points(
+            collection_name=self.mem_store.index,
+            update_operations=self._touch_ops(docs),
+            wait=self.mem_store.wait_result_from_api,
+        )
+
+    async def _atouch(self, docs: Sequence[Document]) -> None:
+        await get_async_qdrant_client().batch_update_points(
+            collection_name=self.mem_store.index,
+            update_operations=self._touch_ops(docs),
+            wait=self.mem_store.wait_result_from_api,
+        )
+
+    def _dedup_in_batch(self, doc: Document, pending: List[Document]) -> Optional[Document]:
+        """Near-duplicates inside one write batch never reach Qdrant search."""
+        for other in pending:
+            if other.embedding is None or other.meta.get("user_id") != doc.meta.get("user_id"):
+                continue
+            if settings.memory_dedup_scope == "session" and other.meta.get("session_id") != doc.meta.get("session_id"):
+                continue
+            score = _cosine(doc.embedding, other.embedding)
+            if score >= settings.memory_dedup_threshold:
+                return Document(
+                    id=other.id, content=other.content, meta=other.meta, embedding=other.embedding, score=score
+                )
+        return None
+
+    def _embed_and_upsert(self, text: str, user_id: str, session_id: str) -> Optional[str]:
+        if not _is_durable(text):
+            return None
+
+        doc = self._memory_doc(text, user_id, session_id)
+        doc = replace(doc, embedding=self.ollama.embed([text])[0])
+        needs_embedding = True
+        if settings.memory_dedup_enabled and (dup := self._find_duplicate(doc)) is not None:
+            doc, needs_embedding = self._apply_duplicate(dup, doc)
+            if needs_embedding:
+                doc = replace(doc, embedding=self.ollama.embed([doc.content])[0])
+        else:
+            doc.meta["hit_count"] = 1
+            self._count_dedup("inserted")
+        if needs_embedding:
+            # Use upsert so repeated memories get updated
+            self.mem_store.write_documents([doc], policy="upsert")
+        else:
+            self._touch([doc])
+        memory_lexical_index.add([doc])
+        return doc.id
+
+    async def aupsert_memories(self, items: Sequence[MemoryWrite]) -> List[str]:
+        """
+        Embed all durable snippets in one batched /api/embed call and write them in one upsert.
+        Snippets that are near-duplicates of a stored memory (or of each other)
+        update that memory instead of inserting a new point; a stored memory that
+        is only touched gets a payload update, not a re-upsert.
+        """
+        docs = [self._memory_doc(it.text, it.user_id, it.session_id) for it in items if _is_durable(it.text)]
+        if not docs:
+            return []
+
+        t0 = time.perf_counter()
+        vecs = await self.embedder.embed([d.content for d in docs])
+        docs = [replace(d, embedding=v) for d, v in zip(docs, vecs)]
+        sample = {"snippets": len(docs), "embed_ms": ms_since(t0)}
+
+        t0 = time.perf_counter()
+        to_write: List[Document] = []  # new points and re-embedded merges
+        touched: Dict[str, Document] = {}  # stored points whose meta changes
+        for d in docs:
+            dup = None
+            if settings.memory_dedup_enabled:
+                dup = self._dedup_in_batch(d, [*to_write, *touched.values()]) or await self._afind_duplicate(d)
+            if dup is None:
+                d.meta["hit_count"] = 1
+                self._count_dedup("inserted")
+                to_write.append(d)
+                continue
+            folded, needs_embedding = self._apply_duplicate(dup, d)
+            if needs_embedding:
+                folded = replace(folded, embedding=(await self.embedder.embed([folded.content]))[0])
+            if needs_embedding or any(x.id == folded.id for x in to_write):
+                # Replace an in-batch original rather than writing the same id twice
+                to_write = [x for x in to_write if x.id != folded.id] + [folded]
+                touched.pop(folded.id, None)
+            else:
+                touched[folded.id] = folded
+        sample["dedup_ms"] = ms_since(t0)
+
+        t0 = time.perf_counter()
+        if to_write:
+            await self.mem_store.write_documents_async(to_write, policy="upsert")
+        if touched:
+            await self._atouch(list(touched.values()))
+        written = [*to_write, *touched.values()]
+        memory_lexical_index.add(written)
+        sample["upsert_ms"] = ms_since(t0)
+        self.write_stats.record(sample)
+        return [d.id for d in written]
 
     async def process_turn(self, *, user_id: str, session_id: str, user_text: str, bot_text: str) -> None:
         try:
-            summary = await asyncio.to_thread(self._summarize_sync, user_text, bot_text)
+            summary = await self.summarize_turns([(user_text, bot_text)])
             logger.info(f"Memory summary: {summary!r}")
-            upserted_id = await asyncio.to_thread(self._embed_and_upsert, summary, user_id, session_id)
+            upserted = await self.aupsert_memories([MemoryWrite(summary, user_id, session_id)])
 
-            if upserted_id:
-                logger.info(f"User memory upserted: {upserted_id} (user={user_id}, session={session_id})")
+            if upserted:
+                logger.info(f"User memory upserted: {upserted[0]} (user={user_id}, session={session_id})")
             else:
                 logger.info("No durable memory extracted for this turn.")
         except Exception as e:
@@ -1,39 +1,331 @@
 from __future__ import annotations
 
-from typing import List, Dict, Any
-import httpx
+import json
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
 
 from app.config import settings
+from app.services.llm_scheduler import BACKGROUND, INTERACTIVE, LLMScheduler, llm_scheduler
+from app.services.ollama_transport import OllamaTransport, get_ollama_transport
+from app.utils.aio import call_maybe_async
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Fields of the final `done` record worth surfacing as usage/telemetry.
+_DONE_STAT_KEYS = (
+    "done_reason",
+    "total_duration",
+    "load_duration",
+    "prompt_eval_count",
+    "prompt_eval_duration",
+    "eval_count",
+    "eval_duration",
+)
+
+
+class OllamaError(RuntimeError):
+    """Raised when Ollama returns an error frame or an incomplete stream."""
+
+
+class _NDJSONDecoder:
+    """
+    Incremental decoder for Ollama's newline-delimited JSON stream.
+    Network chunks may split a record anywhere, so partial lines are buffered
+    until their newline arrives.
+    """
+
+    def __init__(self) -> None:
+        self._buf = ""
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        self._buf += chunk
+        frames: List[Dict[str, Any]] = []
+        while "\n" in self._buf:
+            line, self._buf = self._buf.split("\n", 1)
+            frame = self._decode(line)
+            if frame is not None:
+                frames.append(frame)
+        return frames
+
+    def flush(self) -> List[Dict[str, Any]]:
+        line, self._buf = self._buf, ""
+        frame = self._decode(line)
+        return [frame] if frame is not None else []
+
+    def iter_frames(self, chunks: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        for chunk in chunks:
+            yield from self.feed(chunk)
+        yield from self.flush()
+
+    async def aiter_frames(self, chunks: AsyncIterable[str]) -> AsyncIterator[Dict[str, Any]]:
+        async for chunk in chunks:
+            for frame in self.feed(chunk):
+                yield frame
+        for frame in self.flush():
+            yield frame
+
+    @staticmethod
+    def _decode(line: str) -> Optional[Dict[str, Any]]:
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError as e:
+            raise OllamaError(f"Malformed stream record from Ollama: {line[:200]!r}") from e
+
+
+def _done_stats(frame: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: frame[k] for k in _DONE_STAT_KEYS if k in frame}
+
+
+def usage_from_stats(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Token counts and per-phase timings (ms) from a `done` record's stats.
+    Ollama reports durations in nanoseconds; missing fields are left out.
+    """
+    out: Dict[str, Any] = {}
+    if "prompt_eval_count" in stats:
+        out["input_tokens"] = stats["prompt_eval_count"]
+    if "eval_count" in stats:
+        out["output_tokens"] = stats["eval_count"]
+    for src, dst in (
+        ("load_duration", "load_ms"),
+        ("prompt_eval_duration", "prompt_eval_ms"),
+        ("eval_duration", "decode_ms"),
+    ):
+        if src in stats:
+            out[dst] = int(stats[src] / 1e6)
+    if stats.get("eval_count") and stats.get("eval_duration"):
+        out["tokens_per_s"] = round(stats["eval_count"] / (stats["eval_duration"] / 1e9), 2)
+    return out
 
 
 class DirectOllamaClient:
     """
-    Minimal client for Ollama /api/chat (non-streaming).
-    We keep stream=False and chunk the final text ourselves.
+    Minimal client for Ollama /api/chat and /api/embed.
+    `chat` returns the whole completion (stream=False); `chat_stream` parses the
+    NDJSON stream and forwards content deltas as they arrive. Every call has an
+    async twin (`achat`, `achat_stream`, `aembed`) for the event-loop path.
+    All requests go through the shared pooled transport for `base_url`.
+    Async chat calls (and background embeddings) first take a slot from the
+    LLM scheduler at this client's `priority`; interactive query embeddings
+    skip it, being short and on the TTFT path.
     """
 
-    def __init__(self, base_url: str | None = None, model: str | None = None) -> None:
+    def __init__(
+        self,
+        base_url: str | None = None,
+        model: str | None = None,
+        embed_model: str | None = None,
+        transport: OllamaTransport | None = None,
+        keep_alive: str | None = None,
+        priority: int = INTERACTIVE,
+        scheduler: LLMScheduler | None = None,
+    ) -> None:
         self.base_url = (base_url or settings.ollama_url).rstrip("/")
         self.model = model or settings.ollama_chat_model
+        self.embed_model = embed_model or settings.ollama_embed_model
+        # Sent with every request: how long Ollama keeps the model loaded afterwards
+        self.keep_alive = keep_alive or settings.ollama_keep_alive
+        self.transport = transport or get_ollama_transport(self.base_url)
+        self.priority = priority
+        self.scheduler = scheduler or llm_scheduler
 
-    def chat(self, messages: List[Dict[str, str]], options: Dict[str, Any] | None = None) -> str:
-        """
-        messages = [{"role": "system"|"user"|"assistant", "content": "..."}, ...]
-        returns full assistant text (no streaming)
-        """
+    def _slot(self):
+        return self.scheduler.slot(self.priority, max_wait_s=self.scheduler.default_max_wait_s(self.priority))
+
+    def _payload(
+        self,
+        messages: List[Dict[str, str]],
+        options: Dict[str, Any] | None,
+        *,
+        stream: bool,
+    ) -> Dict[str, Any]:
         payload: Dict[str, Any] = {
             "model": self.model,
             "messages": messages,
-            "stream": False,  # critical: avoid unstable streaming shapes
+            "stream": stream,
+            "keep_alive": self.keep_alive,
         }
         if options:
             payload["options"] = options
+        return payload
+
+    # ---------- chat (non-streaming) ----------
+
+    def chat(self, messages: List[Dict[str, str]], options: Dict[str, Any] | None = None) -> str:
+        """
+        messages = [{"role": "system"|"user"|"assistant", "content": "..."}, ...]
+        returns full assistant text (no streaming)
+        """
+        return self.chat_full(messages, options)[0]
+
+    def chat_full(
+        self, messages: List[Dict[str, str]], options: Dict[str, Any] | None = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Like `chat`, plus the stats of the response (token counts, durations)."""
+        payload = self._payload(messages, options, stream=False)
+
+        r = self.transport.post("/api/chat", json=payload)
+        r.raise_for_status()
+        data = r.json()
+        return self._chat_content(data), _done_stats(data)
+
+    async def achat(self, messages: List[Dict[str, str]], options: Dict[str, Any] | None = None) -> str:
+        """Async twin of `chat`."""
+        return (await self.achat_full(messages, options))[0]
+
+    async def achat_full(
+        self, messages: List[Dict[str, str]], options: Dict[str, Any] | None = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Async twin of `chat_full`."""
+        payload = self._payload(messages, options, stream=False)
+
+        async with self._slot():
+            r = await self.transport.apost("/api/chat", json=payload)
+        r.raise_for_status()
+        data = r.json()
+        return self._chat_content(data), _done_stats(data)
+
+    @staticmethod
+    def _chat_content(data: Dict[str, Any]) -> str:
+        if "error" in data:
+            raise OllamaError(str(data["error"]))
+        # Ollama /api/chat (non-stream) returns {"message": {"role":"assistant","content":"..."} , ...}
+        msg = data.get("message") or {}
+        return msg.get("content", "") or ""
+
+    # ---------- chat (streaming) ----------
+
+    def chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        options: Dict[str, Any] | None = None,
+        on_delta: Optional[Callable[[str], None]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Stream /api/chat, calling on_delta(text) for every content delta.
+        Returns (full_text, stats) where stats holds the counters/durations of
+        the final `done` record (prompt_eval_count, eval_count, ...).
+        """
+        payload = self._payload(messages, options, stream=True)
+
+        parts: List[str] = []
+        with self.transport.stream("/api/chat", json=payload) as r:
+            if r.status_code >= 400:
+                r.read()
+                raise OllamaError(f"Ollama /api/chat failed ({r.status_code}): {r.text[:500]}")
+            for frame in _NDJSONDecoder().iter_frames(r.iter_text()):
+                delta, stats = self._parse_frame(frame)
+                if delta:
+                    parts.append(delta)
+                    if on_delta:
+                        try:
+                            on_delta(delta)
+                        except Exception as e:
+                            logger.debug(f"on_delta callback failed: {e}")
+                if stats is not None:
+                    return "".join(parts), stats
+
+        raise OllamaError("Ollama stream ended without a final `done` record.")
+
+    async def achat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        options: Dict[str, Any] | None = None,
+        on_delta: Optional[Callable[[str], Any]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Async twin of `chat_stream`. on_delta may be sync or async; an async
+        callback is awaited, so a slow consumer applies backpressure to the stream.
+        """
+        payload = self._payload(messages, options, stream=True)
+
+        parts: List[str] = []
+        async with self._slot(), self.transport.astream("/api/chat", json=payload) as r:
+            if r.status_code >= 400:
+                await r.aread()
+                raise OllamaError(f"Ollama /api/chat failed ({r.status_code}): {r.text[:500]}")
+            async for frame in _NDJSONDecoder().aiter_frames(r.aiter_text()):
+                delta, stats = self._parse_frame(frame)
+                if delta:
+                    parts.append(delta)
+                    if on_delta:
+                        try:
+                            await call_maybe_async(on_delta, delta)
+                        except Exception as e:
+                            logger.debug(f"on_delta callback failed: {e}")
+                if stats is not None:
+                    return "".join(parts), stats
+
+        raise OllamaError("Ollama stream ended without a final `done` record.")
+
+    @staticmethod
+    def _parse_frame(frame: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Decode one stream record into (content_delta, done_stats).
+        done_stats is None until the final record arrives.
+        """
+        if "error" in frame:
+            raise OllamaError(str(frame["error"]))
+
+        delta = (frame.get("message") or {}).get("content") or ""
+        if frame.get("done"):
+            return delta, _done_stats(frame)
+        return delta, None
+
+    # ---------- model residency ----------
+
+    async def aload_chat_model(self, options: Dict[str, Any] | None = None) -> None:
+        """
+        Load (or keep) the chat model in memory without generating: Ollama treats
+        a chat request with no messages as a load. Pass the same options as real
+        requests (num_ctx in particular) or the next request reloads the model.
+        """
+        r = await self.transport.apost("/api/chat", json=self._payload([], options, stream=False))
+        r.raise_for_status()
+        data = r.json()
+        if "error" in data:
+            raise OllamaError(str(data["error"]))
+
+    # ---------- embeddings ----------
+
+    def embed(self, inputs: List[str]) -> List[List[float]]:
+        """Embed a batch of texts via /api/embed (one vector per input, same order)."""
+        r = self.transport.post("/api/embed", json=self._embed_payload(inputs))
+        r.raise_for_status()
+        return self._embeddings(r.json(), len(inputs))
+
+    async def aembed(self, inputs: List[str]) -> List[List[float]]:
+        """Async twin of `embed`."""
+        if self.priority == BACKGROUND:
+            async with self._slot():
+                r = await self.transport.apost("/api/embed", json=self._embed_payload(inputs))
+        else:
+            r = await self.transport.apost("/api/embed", json=self._embed_payload(inputs))
+        r.raise_for_status()
+        return self._embeddings(r.json(), len(inputs))
+
+    def _embed_payload(self, inputs: List[str]) -> Dict[str, Any]:
+        return {"model": self.embed_model, "input": inputs, "keep_alive": self.keep_alive}
 
-        url = f"{self.base_url}/api/chat"
-        with httpx.Client(timeout=120) as client:
-            r = client.post(url, json=payload)
-            r.raise_for_status()
-            data = r.json()
-            # Ollama /api/chat (non-stream) returns {"message": {"role":"assistant","content":"..."} , ...}
-            msg = data.get("message") or {}
-            return msg.get("content", "") or ""
+    @staticmethod
+    def _embeddings(data: Dict[str, Any], expected: int) -> List[List[float]]:
+        if "error" in data:
+            raise OllamaError(str(data["error"]))
+        vecs = data.get("embeddings") or []
+        if len(vecs) != expected:
+            raise OllamaError(f"Ollama returned {len(vecs)} embeddings for {expected} inputs.")
+        return vecs
@@ -0,0 +1,274 @@
+# app/services/ollama_transport.py
+
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+import httpx
+
+from app.config import settings
+from app.utils.logging import get_logger
+from app.utils.metrics import OLLAMA_DURATION
+
+logger = get_logger(__name__)
+
+# Failures that happen before Ollama has seen the request (or on a stale
+# keep-alive socket) are safe to retry; everything else surfaces immediately.
+_RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+_RETRYABLE_STATUS = {502, 503, 504}
+
+
+class OllamaTransport:
+    """
+    Process-wide pooled HTTP transport for Ollama.
+    One keep-alive httpx.Client serves sync callers; async callers get one
+    httpx.AsyncClient per event loop (connections cannot cross loops).
+    Connection setup failures and 502/503/504 are retried with jittered
+    exponential backoff; streams are only retried before the first byte.
+    """
+
+    def __init__(
+        self,
+        base_url: str | None = None,
+        *,
+        max_connections: int | None = None,
+        max_keepalive: int | None = None,
+        keepalive_expiry_s: float | None = None,
+        connect_timeout_s: float | None = None,
+        read_timeout_s: float | None = None,
+        max_retries: int | None = None,
+        retry_backoff_s: float | None = None,
+    ) -> None:
+        self.base_url = (base_url or settings.ollama_url).rstrip("/")
+        self.limits = httpx.Limits(
+            max_connections=max_connections or settings.ollama_pool_max_connections,
+            max_keepalive_connections=max_keepalive or settings.ollama_pool_max_keepalive,
+            keepalive_expiry=keepalive_expiry_s or settings.ollama_keepalive_expiry_s,
+        )
+        connect = connect_timeout_s or settings.ollama_connect_timeout_s
+        read = read_timeout_s or settings.ollama_read_timeout_s
+        # pool: how long a caller may wait for a free connection
+        self.timeout = httpx.Timeout(connect=connect, read=read, write=connect, pool=connect)
+        self.max_retries = settings.ollama_max_retries if max_retries is None else max_retries
+        self.retry_backoff_s = retry_backoff_s or settings.ollama_retry_backoff_s
+
+        self._lock = threading.Lock()
+        self._client: Optional[httpx.Client] = None
+        self._aclients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._counters = {"requests": 0, "retries": 0, "failures": 0, "in_flight": 0}
+
+    # ---------- clients ----------
+
+    def _sync_client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(base_url=self.base_url, limits=self.limits, timeout=self.timeout)
+            return self._client
+
+    def _async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._aclients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(base_url=self.base_url, limits=self.limits, timeout=self.timeout)
+                self._aclients[loop] = client
+            return client
+
+    # ---------- bookkeeping ----------
+
+    def _bump(self, key: str, delta: int = 1) -> None:
+        with self._lock:
+            self._counters[key] += delta
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: uniform(0, base * 2^attempt), capped at 5s."""
+        return random.uniform(0, min(5.0, self.retry_backoff_s * (2 ** attempt)))
+
+    def _should_retry(self, r: httpx.Response, attempt: int) -> bool:
+        return r.status_code in _RETRYABLE_STATUS and attempt < self.max_retries
+
+    # ---------- sync API ----------
+
+    def _send(self, request: httpx.Request, *, stream: bool) -> httpx.Response:
+        client = self._sync_client()
+        attempt = 0
+        while True:
+            try:
+                r = client.send(request, stream=stream)
+            except _RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    self._bump("failures")
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"Ollama {request.url.path} failed ({e!r}); retry {attempt + 1} in {delay:.2f}s")
+            else:
+                if not self._should_retry(r, attempt):
+                    return r
+                r.close()
+                delay = self._backoff(attempt)
+                logger.warning(f"Ollama {request.url.path} returned {r.status_code}; retry {attempt + 1} in {delay:.2f}s")
+            self._bump("retries")
+            attempt += 1
+            time.sleep(delay)
+
+    def post(self, path: str, *, json: Dict[str, Any]) -> httpx.Response:
+        """POST and read the full response body."""
+        request = self._sync_client().build_request("POST", path, json=json)
+        self._bump("requests")
+        self._bump("in_flight")
+        t0 = time.perf_counter()
+        try:
+            return self._send(request, stream=False)
+        finally:
+            self._bump("in_flight", -1)
+            OLLAMA_DURATION.labels(path).observe(time.perf_counter() - t0)
+
+    @contextmanager
+    def stream(self, path: str, *, json: Dict[str, Any]) -> Iterator[httpx.Response]:
+        """POST and yield the streaming response; the connection returns to the pool on exit."""
+        request = self._sync_client().build_request("POST", path, json=json)
+        self._bump("requests")
+        self._bump("in_flight")
+        t0 = time.perf_counter()
+        try:
+            r = self._send(request, stream=True)
+            try:
+                yield r
+            finally:
+                r.close()
+        finally:
+            self._bump("in_flight", -1)
+            OLLAMA_DURATION.labels(path).observe(time.perf_counter() - t0)
+
+    # ---------- async API ----------
+
+    async def _asend(self, request: httpx.Request, *, stream: bool) -> httpx.Response:
+        client = self._async_client()
+        attempt = 0
+        while True:
+            try:
+                r = await client.send(request, stream=stream)
+            except _RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    self._bump("failures")
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"Ollama {request.url.path} failed ({e!r}); retry {attempt + 1} in {delay:.2f}s")
+            else:
+                if not self._should_retry(r, attempt):
+                    return r
+                await r.aclose()
+                delay = self._backoff(attempt)
+                logger.warning(f"Ollama {request.url.path} returned {r.status_code}; retry {attempt + 1} in {delay:.2f}s")
+            self._bump("retries")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def apost(self, path: str, *, json: Dict[str, Any]) -> httpx.Response:
+        """Async twin of `post`."""
+        request = self._async_client().build_request("POST", path, json=json)
+        self._bump("requests")
+        self._bump("in_flight")
+        t0 = time.perf_counter()
+        try:
+            return await self._asend(request, stream=False)
+        finally:
+            self._bump("in_flight", -1)
+            OLLAMA_DURATION.labels(path).observe(time.perf_counter() - t0)
+
+    @asynccontextmanager
+    async def astream(self, path: str, *, json: Dict[str, Any]) -> AsyncIterator[httpx.Response]:
+        """Async twin of `stream`. Cancelling the caller closes the response mid-stream."""
+        request = self._async_client().build_request("POST", path, json=json)
+        self._bump("requests")
+        self._bump("in_flight")
+        t0 = time.perf_counter()
+        try:
+            r = await self._asend(request, stream=True)
+            try:
+                yield r
+            finally:
+                await r.aclose()
+        finally:
+            self._bump("in_flight", -1)
+            OLLAMA_DURATION.labels(path).observe(time.perf_counter() - t0)
+
+    # ---------- introspection / lifecycle ----------
+
+    @staticmethod
+    def _pool_stats(client: httpx.Client | httpx.AsyncClient | None) -> Dict[str, int]:
+        # httpx does not expose pool state publicly; read httpcore's pool defensively.
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        conns = list(getattr(pool, "connections", []) or [])
+        idle = sum(1 for c in conns if getattr(c, "is_idle", lambda: False)())
+        return {"open": len(conns), "idle": idle, "active": len(conns) - idle}
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters plus open/idle/active connections per pool, for sizing under load."""
+        with self._lock:
+            counters = dict(self._counters)
+            sync_client = self._client
+            aclients = list(self._aclients.values())
+
+        pools = {"sync": self._pool_stats(sync_client)}
+        for i, c in enumerate(aclients):
+            pools[f"async_{i}"] = self._pool_stats(c)
+        return {
+            **counters,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive": self.limits.max_keepalive_connections,
+            "pools": pools,
+        }
+
+    async def aclose_loop_client(self) -> None:
+        """Close the async client of the running loop only (for short-lived loops)."""
+        with self._lock:
+            aclient = self._aclients.pop(asyncio.get_running_loop(), None)
+        if aclient is not None:
+            await aclient.aclose()
+
+    async def aclose(self) -> None:
+        with self._lock:
+            client, self._client = self._client, None
+            aclient = self._aclients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            client.close()
+        if aclient is not None:
+            await aclient.aclose()
+
+
+_transports: Dict[str, OllamaTransport] = {}
+_transports_lock = threading.Lock()
+
+
+def get_ollama_transport(base_url: str | None = None) -> OllamaTransport:
+    """Return the shared transport for an Ollama base URL (created on first use)."""
+    key = (base_url or settings.ollama_url).rstrip("/")
+    with _transports_lock:
+        transport = _transports.get(key)
+        if transport is None:
+            transport = _transports[key] = OllamaTransport(key)
+        return transport
+
+
+async def close_ollama_transports() -> None:
+    with _transports_lock:
+        transports = list(_transports.values())
+    for t in transports:
+        await t.aclose()
+
+
+async def close_loop_ollama_clients() -> None:
+    """Close every transport's async client bound to the running loop; sync pools stay open."""
+    with _transports_lock:
+        transports = list(_transports.values())
+    for t in transports:
+        await t.aclose_loop_client()
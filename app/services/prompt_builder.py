@@ -0,0 +1,152 @@
+# app/services/prompt_builder.py
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from haystack import Document
+from haystack.dataclasses import ChatMessage
+
+from app.config import settings
+from app.utils.tokens import TokenCounter, token_counter, trim_to_tokens
+
+_CONTEXT_HEADER = "\n\nCONTEXT:\n"
+
+
+@dataclass
+class AssembledPrompt:
+    messages: List[ChatMessage]
+    input_tokens: int  # counted (or estimated) tokens of the whole prompt
+    prompt_chars: int
+    sections: Dict[str, int] = field(default_factory=dict)  # tokens per section
+    context_docs: List[Document] = field(default_factory=list)  # docs that made it in
+    budget: int = 0
+
+
+class PromptAssembler:
+    """
+    Builds the chat messages under one token budget shared by the system
+    prompt, retrieved context, conversation history and the query.
+
+    budget = min(prompt_max_input_tokens, num_ctx - reserved output tokens).
+    System prompt and query are placed first; what remains is split between
+    context (`context_share`) and history, and whatever one side leaves unused
+    goes to the other. Snippets go in retrieval order and history newest
+    first; an item that doesn't fit whole is trimmed at sentence boundaries
+    instead of being cut mid-sentence or ending the packing.
+    """
+
+    def __init__(
+        self,
+        counter: TokenCounter = token_counter,
+        *,
+        num_ctx: Optional[int] = None,
+        reserve_output: Optional[int] = None,
+        max_input: Optional[int] = None,
+        context_share: Optional[float] = None,
+        message_overhead: Optional[int] = None,
+        min_snippet_tokens: Optional[int] = None,
+    ) -> None:
+        self.counter = counter
+        num_ctx = num_ctx or settings.ollama_num_ctx
+        reserve_output = reserve_output or settings.prompt_reserve_output_tokens
+        self.budget = min(max_input or settings.prompt_max_input_tokens, num_ctx - reserve_output)
+        self.context_share = settings.prompt_context_share if context_share is None else context_share
+        self.overhead = settings.prompt_message_overhead_tokens if message_overhead is None else message_overhead
+        self.min_snippet = min_snippet_tokens or settings.prompt_min_snippet_tokens
+
+    def _pack_context(self, docs: Sequence[Document], cap: int) -> Tuple[List[str], List[Document], int, bool]:
+        lines: List[str] = []
+        packed: List[Document] = []
+        used = 0
+        truncated = False
+        for d in docs:
+            text = (d.content or "").strip()
+            if not text:
+                continue
+            prefix = f"[{d.meta.get('source') or d.meta.get('name') or d.id[:8]}] "
+            n = self.counter.count(prefix + text) + 1  # + newline
+            if used + n > cap:
+                truncated = True
+                room = cap - used - self.counter.count(prefix) - 1
+                if room < self.min_snippet:
+                    continue
+                text = trim_to_tokens(text, room, self.counter)
+                if not text:
+                    continue
+                n = self.counter.count(prefix + text) + 1
+            lines.append(prefix + text)
+            packed.append(d)
+            used += n
+        return lines, packed, used, truncated
+
+    def _pack_history(self, history: Sequence[Mapping[str, str]], cap: int) -> Tuple[List[ChatMessage], int]:
+        out: List[ChatMessage] = []
+        used = 0
+        for h in reversed(history[-settings.session_history_window:]):
+            txt = (h.get("content") or "").strip()
+            if not txt:
+                continue
+            n = self.counter.count(txt) + self.overhead
+            stop = False
+            if used + n > cap:
+                room = cap - used - self.overhead
+                txt = trim_to_tokens(txt, room, self.counter, keep="tail") if room >= self.min_snippet else ""
+                if not txt:
+                    break
+                n = self.counter.count(txt) + self.overhead
+                stop = True  # older turns would not connect to a trimmed one
+            role = (h.get("role") or "user").lower()
+            out.append(ChatMessage.from_assistant(txt) if role == "assistant" else ChatMessage.from_user(txt))
+            used += n
+            if stop:
+                break
+        out.reverse()
+        return out, used
+
+    def assemble(
+        self,
+        *,
+        system: str,
+        query: str,
+        docs: Sequence[Document] = (),
+        history: Optional[Sequence[Mapping[str, str]]] = None,
+    ) -> AssembledPrompt:
+        history = list(history or [])
+        # The router stores the user's message before the turn runs; it is the query
+        if history and history[-1].get("role") == "user" and (history[-1].get("content") or "").strip() == query.strip():
+            history = history[:-1]
+
+        sys_t = self.counter.count(system) + self.overhead
+        query_cap = max(self.budget - sys_t, self.min_snippet)
+        if self.counter.count(query) + self.overhead > query_cap:
+            query = trim_to_tokens(query, query_cap - self.overhead, self.counter)
+        query_t = self.counter.count(query) + self.overhead
+
+        remaining = max(0, self.budget - sys_t - query_t - self.counter.count(_CONTEXT_HEADER))
+        ctx_cap = int(remaining * self.context_share)
+        lines, packed, ctx_t, truncated = self._pack_context(docs, ctx_cap)
+        hist_msgs, hist_t = self._pack_history(history, remaining - ctx_t)
+        if truncated and remaining - ctx_t - hist_t > self.min_snippet:
+            # History left room: give it back to the context
+            lines, packed, ctx_t, _ = self._pack_context(docs, remaining - hist_t)
+
+        ctx_block = "\n".join(lines)
+        system_text = f"{system}{_CONTEXT_HEADER}{ctx_block}" if ctx_block else system
+        messages = [ChatMessage.from_system(system_text), *hist_msgs, ChatMessage.from_user(query)]
+
+        sections = {
+            "system": self.counter.count(system) + self.overhead,
+            "context": self.counter.count(system_text) - self.counter.count(system) if ctx_block else 0,
+            "history": hist_t,
+            "query": query_t,
+        }
+        return AssembledPrompt(
+            messages=messages,
+            input_tokens=sum(sections.values()),
+            prompt_chars=sum(len(m.text or "") for m in messages),
+            sections=sections,
+            context_docs=packed,
+            budget=self.budget,
+        )
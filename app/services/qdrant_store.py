@@ -1,26 +1,101 @@
 # app/services/qdrant_store.py
 
-from qdrant_client import QdrantClient
+from __future__ import annotations
+
+import asyncio
+import threading
+import weakref
+from typing import Optional, Set
+
+from haystack_integrations.document_stores.qdrant import QdrantDocumentStore
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from qdrant_client.http import models
 from app.config import settings
 from app.utils.logging import get_logger
 
 logger = get_logger(__name__)
 
+# ---------- shared clients ----------
+# One sync client (thread-safe; also used from the search thread pool) and one
+# async client per event loop (gRPC aio channels are bound to their loop).
+
+_lock = threading.Lock()
+_client: Optional[QdrantClient] = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncQdrantClient]" = (
+    weakref.WeakKeyDictionary()
+)
+_ready: Set[str] = set()  # collections already checked by this process
+
+
+def _client_params() -> dict:
+    return {
+        "url": settings.qdrant_url,
+        "prefer_grpc": settings.qdrant_prefer_grpc,
+        "grpc_port": settings.qdrant_grpc_port,
+        "timeout": settings.qdrant_timeout_s,
+    }
+
+
+def get_qdrant_client() -> QdrantClient:
+    """Return the process-wide Qdrant client (created on first use)."""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = QdrantClient(**_client_params())
+            transport = "gRPC" if settings.qdrant_prefer_grpc else "HTTP"
+            logger.info(f"Qdrant client: {settings.qdrant_url} over {transport}")
+        return _client
+
+
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    """Return the async Qdrant client of the running event loop (created on first use)."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = AsyncQdrantClient(**_client_params())
+            _async_clients[loop] = client
+        return client
+
+
+async def close_loop_qdrant_client() -> None:
+    """Close the async client of the running loop only (for short-lived loops)."""
+    with _lock:
+        aclient = _async_clients.pop(asyncio.get_running_loop(), None)
+    if aclient is not None:
+        await aclient.close()
+
+
+async def close_qdrant_clients() -> None:
+    global _client
+    with _lock:
+        client, _client = _client, None
+        aclient = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        client.close()
+    if aclient is not None:
+        await aclient.close()
+
+
+# ---------- collections ----------
+
+_PAYLOAD_INDEXES = ["session_id", "user_id", "timestamp"]
+
+
+def _collection_config() -> models.VectorParams:
+    return models.VectorParams(size=settings.embedding_dim, distance=models.Distance.COSINE)
+
+
 def ensure_collection(name: str):
-    client = QdrantClient(url=settings.qdrant_url)
-    if name not in [c.name for c in client.get_collections().collections]:
+    if name in _ready:
+        return
+    client = get_qdrant_client()
+    if not client.collection_exists(name):
         logger.info(f"Creating Qdrant collection: {name}")
-        client.create_collection(
-            collection_name=name,
-            vectors_config=models.VectorParams(
-                size=settings.embedding_dim,
-                distance=models.Distance.COSINE
-            )
-        )
+        client.create_collection(collection_name=name, vectors_config=_collection_config())
 
     # Payload indexes
-    for field in ["session_id", "user_id", "timestamp"]:
+    for field in _PAYLOAD_INDEXES:
         try:
             client.create_payload_index(
                 collection_name=name,
@@ -29,8 +104,89 @@ def ensure_collection(name: str):
             )
         except Exception as e:
             logger.debug(f"Index for {field} may already exist: {e}")
+    _ready.add(name)
+
+
+async def aensure_collection(name: str):
+    if name in _ready:
+        return
+    client = get_async_qdrant_client()
+    if not await client.collection_exists(name):
+        logger.info(f"Creating Qdrant collection: {name}")
+        await client.create_collection(collection_name=name, vectors_config=_collection_config())
+    for field in _PAYLOAD_INDEXES:
+        try:
+            await client.create_payload_index(
+                collection_name=name,
+                field_name=field,
+                field_schema=models.PayloadSchemaType.KEYWORD
+            )
+        except Exception as e:
+            logger.debug(f"Index for {field} may already exist: {e}")
+    _ready.add(name)
+
 
 def bootstrap_qdrant():
     ensure_collection(settings.qdrant_collection_docs)
     ensure_collection(settings.qdrant_collection_memory)
     logger.info("Qdrant bootstrap complete.")
+
+
+# ---------- document stores ----------
+
+
+class SharedQdrantDocumentStore(QdrantDocumentStore):
+    """
+    QdrantDocumentStore on the shared clients instead of one connection per store.
+    Collection setup goes through ensure_collection (checked once per process),
+    and close() leaves the shared clients open. The async client is never
+    cached on the store: every access resolves the running loop's client, so
+    a store first used on another loop does not keep that loop's channel.
+    """
+
+    @property
+    def _async_client(self) -> Optional[AsyncQdrantClient]:
+        try:
+            return get_async_qdrant_client()
+        except RuntimeError:  # no running loop
+            return None
+
+    @_async_client.setter
+    def _async_client(self, value: Optional[AsyncQdrantClient]) -> None:
+        pass  # assigned by the base class; the shared client is resolved per access
+
+    def _initialize_client(self) -> None:
+        if self._client is None:
+            ensure_collection(self.index)
+            self._client = get_qdrant_client()
+
+    async def _initialize_async_client(self) -> None:
+        await aensure_collection(self.index)
+
+    def close(self) -> None:
+        self._client = None
+
+    async def close_async(self) -> None:
+        pass
+
+
+def document_store(collection: str, *, return_embedding: bool = False, wait: bool = True) -> QdrantDocumentStore:
+    """
+    Store for one collection on the shared clients. `wait=False` returns from
+    writes once Qdrant has logged them rather than after they are indexed;
+    upserts go out in batches of settings.qdrant_write_batch_size points.
+    """
+    return SharedQdrantDocumentStore(
+        url=settings.qdrant_url,
+        prefer_grpc=settings.qdrant_prefer_grpc,
+        grpc_port=settings.qdrant_grpc_port,
+        timeout=settings.qdrant_timeout_s,
+        index=collection,
+        recreate_index=False,
+        return_embedding=return_embedding,
+        wait_result_from_api=wait,
+        write_batch_size=settings.qdrant_write_batch_size,
+        progress_bar=False,
+        embedding_dim=settings.embedding_dim,
+        similarity=settings.embedding_similarity,
+    )
@@ -0,0 +1,120 @@
+# app/services/reranker.py
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from haystack import Document
+
+from app.config import settings
+
+
+@dataclass
+class RerankConfig:
+    floor: float = field(default_factory=lambda: settings.rerank_floor)
+    gap: float = field(default_factory=lambda: settings.rerank_gap)
+    mmr_lambda: float = field(default_factory=lambda: settings.rerank_mmr_lambda)
+    redundancy: float = field(default_factory=lambda: settings.rerank_redundancy)
+    max_keep: int = field(default_factory=lambda: settings.retrieval_max_snippets)
+
+
+@dataclass
+class RerankDecision:
+    """Why a candidate was or wasn't packed; reported per doc in MetaOut.retrieval."""
+
+    collection: str
+    doc: Document
+    relevance: Optional[float] = None
+    selected: bool = False
+    reason: str = ""  # selected | below_floor | score_gap | redundant | over_cap | over_budget
+    rank: Optional[int] = None  # position in the packed context (selected only)
+
+
+def rerank(
+    query_embedding: Sequence[float],
+    candidates: Sequence[Tuple[str, Document]],
+    cfg: Optional[RerankConfig] = None,
+) -> Tuple[List[Document], List[RerankDecision]]:
+    """
+    Pick the smallest sufficient context from (collection, doc) candidates.
+
+    1. normalize: relevance = cosine(query, doc embedding). Both collections
+       share the embedding model, so this puts KB and memory hits (dense or
+       lexical, whatever their retrieval score was) on one scale.
+    2. floor: drop candidates below `cfg.floor` (or without an embedding).
+    3. gap: walking down by relevance, cut everything after the first drop
+       larger than `cfg.gap`.
+    4. MMR: greedily take argmax(lambda * rel - (1 - lambda) * max_sim_to_taken)
+       up to `cfg.max_keep`, skipping near-duplicates of taken snippets
+       (similarity >= `cfg.redundancy`).
+    Returns (selected docs in packing order, one decision per candidate).
+    """
+    cfg = cfg or RerankConfig()
+
+    decisions: List[RerankDecision] = []
+    seen: set[str] = set()
+    for collection, d in candidates:
+        if d.id not in seen:
+            seen.add(d.id)
+            decisions.append(RerankDecision(collection=collection, doc=d))
+
+    # Unit vectors of candidates that have an embedding; row i <-> scored[i]
+    scored = [dec for dec in decisions if dec.doc.embedding]
+    q = np.asarray(query_embedding, dtype=np.float32)
+    q_norm = float(np.linalg.norm(q))
+    if scored and q_norm:
+        m = np.asarray([dec.doc.embedding for dec in scored], dtype=np.float32)
+        norms = np.linalg.norm(m, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        m /= norms
+        rel = m @ (q / q_norm)
+        sims = m @ m.T
+        for i, dec in enumerate(scored):
+            dec.relevance = float(rel[i])
+    row = {id(dec): i for i, dec in enumerate(scored)}
+
+    pool: List[RerankDecision] = []
+    for dec in decisions:
+        if dec.relevance is None or dec.relevance < cfg.floor:
+            dec.reason = "below_floor"
+        else:
+            pool.append(dec)
+    pool.sort(key=lambda x: x.relevance, reverse=True)
+
+    for i in range(1, len(pool)):
+        if pool[i - 1].relevance - pool[i].relevance > cfg.gap:
+            for dec in pool[i:]:
+                dec.reason = "score_gap"
+            pool = pool[:i]
+            break
+
+    taken: List[RerankDecision] = []
+    while pool and len(taken) < cfg.max_keep:
+        best, best_score, best_sim = None, -np.inf, 0.0
+        for dec in pool:
+            sim = max((float(sims[row[id(dec)], row[id(t)]]) for t in taken), default=0.0)
+            score = cfg.mmr_lambda * dec.relevance - (1.0 - cfg.mmr_lambda) * sim
+            if score > best_score:
+                best, best_score, best_sim = dec, score, sim
+        pool.remove(best)
+        if best_sim >= cfg.redundancy:
+            best.reason = "redundant"
+            continue
+        best.selected, best.reason, best.rank = True, "selected", len(taken)
+        taken.append(best)
+    for dec in pool:
+        dec.reason = "over_cap"
+
+    return [dec.doc for dec in taken], decisions
+
+
+def decision_meta(dec: RerankDecision) -> Dict[str, Any]:
+    """RetrievalDocMeta fields describing a rerank decision."""
+    return {
+        "relevance": round(dec.relevance, 4) if dec.relevance is not None else None,
+        "selected": dec.selected,
+        "reason": dec.reason,
+        "rank": dec.rank,
+    }
@@ -2,36 +2,39 @@
 
 from __future__ import annotations
 
+import asyncio
+import inspect
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from typing import Awaitable, Dict, List, Optional, Sequence, Tuple, Union
 
 from haystack import Document
-from haystack_integrations.components.embedders.ollama.text_embedder import (
-    OllamaTextEmbedder,
-)
 from haystack_integrations.components.retrievers.qdrant import (
     QdrantEmbeddingRetriever,
 )
 from haystack_integrations.document_stores.qdrant import QdrantDocumentStore
 
 from app.config import settings
+from app.services.embed_batcher import query_embedder
+from app.services.embedding_cache import EmbeddingCache, query_embedding_cache
+from app.services.kb_index import InMemoryVectorIndex
+from app.services.lexical_index import LexicalIndex, memory_lexical_index
+from app.services.ollama_client import DirectOllamaClient
+from app.services.qdrant_store import document_store
 from app.utils.logging import get_logger
+from app.utils.timing import timed
 from typing import Optional, Dict, Any, List
 
 logger = get_logger(__name__)
 
+# Shared pool for the blocking `retrieve` path (two searches per call).
+_search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="qdrant-search")
+
 
-def _build_qdrant_store(collection: str) -> QdrantDocumentStore:
-    """HTTP mode Qdrant store for a specific collection."""
-    return QdrantDocumentStore(
-        url=settings.qdrant_url,
-        index=collection,
-        recreate_index=False,
-        return_embedding=False,
-        wait_result_from_api=True,
-        embedding_dim=settings.embedding_dim,
-        similarity=settings.embedding_similarity,
-    )
+def _build_qdrant_store(collection: str, return_embedding: bool = False) -> QdrantDocumentStore:
+    """Qdrant store for a specific collection, on the shared clients."""
+    return document_store(collection, return_embedding=return_embedding)
 
 
 def build_filters(
@@ -66,10 +69,85 @@ def build_filters(
 
 
 
+def _result_or_empty(fut: Future, cfg: "RetrieverConfig", submitted_at: float) -> List[Document]:
+    # Timeouts run from submission, so waiting on two searches costs max(kb, mem), not the sum
+    remaining = None
+    if cfg.timeout_s is not None:
+        remaining = max(0.0, cfg.timeout_s - (time.monotonic() - submitted_at))
+    try:
+        return fut.result(timeout=remaining)
+    except FutureTimeout:
+        logger.warning(f"Qdrant search on '{cfg.collection}' exceeded {cfg.timeout_s}s; continuing without it")
+        return []
+
+
+def _build_memory_index(cfg: "RetrieverConfig") -> Optional[InMemoryVectorIndex]:
+    if cfg.backend == "memory":
+        return InMemoryVectorIndex(cfg.collection)
+    if cfg.backend != "qdrant":
+        raise ValueError(f"Unknown retriever backend for '{cfg.collection}': {cfg.backend!r}")
+    return None
+
+
+def _build_lexical_index(cfg: "RetrieverConfig") -> Optional[LexicalIndex]:
+    if not cfg.hybrid:
+        return None
+    if cfg.collection == settings.qdrant_collection_memory:
+        # Per-user, shared with the memory writer, which adds every upserted memory
+        return memory_lexical_index
+    return LexicalIndex(cfg.collection, snapshot_path=settings.kb_lexical_path)
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[List[Document]],
+    *,
+    k: Optional[int] = None,
+    top_n: Optional[int] = None,
+) -> List[Document]:
+    """
+    Fuse ranked lists by reciprocal rank: score(d) = sum of 1 / (k + rank) over
+    the lists containing d. Only ranks matter, so BM25 and cosine scores never
+    need to be calibrated against each other. Returned docs carry the fused score.
+    """
+    k = k or settings.hybrid_rrf_k
+    fused: Dict[str, float] = {}
+    first: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, d in enumerate(ranking, start=1):
+            fused[d.id] = fused.get(d.id, 0.0) + 1.0 / (k + rank)
+            # Keep the copy that carries an embedding (dense hits do, BM25 hits don't)
+            if d.id not in first or (first[d.id].embedding is None and d.embedding is not None):
+                first[d.id] = d
+    ordered = sorted(fused, key=fused.__getitem__, reverse=True)[:top_n]
+    return [
+        Document(
+            id=i,
+            content=first[i].content,
+            meta=first[i].meta,
+            score=fused[i],
+            embedding=first[i].embedding,
+        )
+        for i in ordered
+    ]
+
+
 @dataclass
 class RetrieverConfig:
     collection: str
     top_k: int = 4
+    # Per-collection search budget; on timeout that collection contributes no hits
+    timeout_s: Optional[float] = None
+    # "qdrant" searches over HTTP; "memory" serves a static collection from an
+    # in-process NumPy index (app/services/kb_index.py)
+    backend: str = "qdrant"
+    # Hybrid: BM25 ranks the collection too and both rankings are fused (RRF);
+    # each ranker contributes `candidate_k` candidates, the fused list keeps top_k
+    hybrid: bool = False
+    candidate_k: Optional[int] = None
+
+    @property
+    def fetch_k(self) -> int:
+        return max(self.top_k, self.candidate_k or 0) if self.hybrid else self.top_k
 
 
 class DualRetriever:
@@ -78,29 +156,68 @@ class DualRetriever:
       - Long-term knowledge (kb_docs)
       - User memory (user_memory)
     Embeds the query once, then calls both retrievers directly.
+    `aretrieve` is the event-loop variant used by the async pipeline.
+    With `with_embeddings` every returned doc carries its vector (lexical-only
+    hits are looked up), as the reranker's MMR stage needs them.
     """
 
     def __init__(
         self,
         kb_cfg: RetrieverConfig,
         mem_cfg: RetrieverConfig,
+        embed_cache: Optional[EmbeddingCache] = query_embedding_cache,
+        *,
+        with_embeddings: bool = False,
     ) -> None:
-        self.kb_store = _build_qdrant_store(kb_cfg.collection)
-        self.mem_store = _build_qdrant_store(mem_cfg.collection)
+        self.with_embeddings = with_embeddings
+        self.kb_store = _build_qdrant_store(kb_cfg.collection, return_embedding=with_embeddings)
+        self.mem_store = _build_qdrant_store(mem_cfg.collection, return_embedding=with_embeddings)
         self.kb_cfg = kb_cfg
         self.mem_cfg = mem_cfg
 
         # Components (not mounted into Pipelines)
-        self.text_embedder = OllamaTextEmbedder(model=settings.ollama_embed_model)
-        self.kb_retriever = QdrantEmbeddingRetriever(document_store=self.kb_store)
-        self.mem_retriever = QdrantEmbeddingRetriever(document_store=self.mem_store)
-
-    def _embed_query(self, query: str) -> list[float]:
-        out = self.text_embedder.run(text=query)
-        emb = out.get("embedding")
-        if not emb:
+        # Query embeddings go through the shared pooled Ollama transport
+        self.ollama = DirectOllamaClient()
+        self.embed_cache = embed_cache
+        # Set when settings.embed_batch_queries: concurrent turns share /api/embed calls
+        self.query_batcher = query_embedder
+        # Dense hits carry their vectors when asked to (the store-level flag does not apply to queries)
+        self.kb_retriever = QdrantEmbeddingRetriever(document_store=self.kb_store, return_embedding=with_embeddings)
+        self.mem_retriever = QdrantEmbeddingRetriever(document_store=self.mem_store, return_embedding=with_embeddings)
+        self.kb_index = _build_memory_index(kb_cfg)
+        self.mem_index = _build_memory_index(mem_cfg)
+        self.kb_lexical = _build_lexical_index(kb_cfg)
+        self.mem_lexical = _build_lexical_index(mem_cfg)
+
+    def embed_query(self, query: str) -> list[float]:
+        if self.embed_cache and (emb := self.embed_cache.get(query)) is not None:
+            return emb
+        vecs = self.ollama.embed([query])
+        if not vecs or not vecs[0]:
             raise RuntimeError("Failed to compute query embedding.")
-        return emb
+        if self.embed_cache:
+            self.embed_cache.put(query, vecs[0])
+        return vecs[0]
+
+    async def aembed_query(self, query: str) -> list[float]:
+        if self.embed_cache and (emb := self.embed_cache.get(query)) is not None:
+            return emb
+        if self.query_batcher is not None:
+            vecs = await self.query_batcher.embed([query])
+        else:
+            vecs = await self.ollama.aembed([query])
+        if not vecs or not vecs[0]:
+            raise RuntimeError("Failed to compute query embedding.")
+        if self.embed_cache:
+            self.embed_cache.put(query, vecs[0])
+        return vecs[0]
+
+    async def _aquery_embedding(
+        self, query: str, query_embedding: Union[List[float], Awaitable[List[float]], None]
+    ) -> List[float]:
+        if inspect.isawaitable(query_embedding):
+            return await query_embedding
+        return query_embedding or await self.aembed_query(query)
 
     def _retrieve_direct(
         self,
@@ -117,28 +234,216 @@ class DualRetriever:
         )
         return out.get("documents", [])
 
+    async def _aretrieve_direct(
+        self,
+        retriever: QdrantEmbeddingRetriever,
+        *,
+        query_embedding: List[float],
+        top_k: int,
+        filters: Dict,
+    ) -> List[Document]:
+        out = await retriever.run_async(
+            query_embedding=query_embedding,
+            top_k=top_k,
+            filters=filters,
+        )
+        return out.get("documents", [])
+
+    async def _asearch(
+        self,
+        retriever: QdrantEmbeddingRetriever,
+        cfg: RetrieverConfig,
+        *,
+        query_embedding: List[float],
+        filters: Dict,
+        index: Optional[InMemoryVectorIndex] = None,
+    ) -> List[Document]:
+        """One collection search bounded by cfg.timeout_s; a timeout yields no hits."""
+        if index is not None:
+            # Loading/reloading pulls the collection from Qdrant: keep it off the loop
+            if not index.is_loaded:
+                await asyncio.to_thread(index.ensure_loaded)
+            elif index.reload_due():
+                await asyncio.to_thread(index.reload_if_changed)
+            return index.search(query_embedding, top_k=cfg.fetch_k, filters=filters)
+
+        coro = self._aretrieve_direct(
+            retriever,
+            query_embedding=query_embedding,
+            top_k=cfg.fetch_k,
+            filters=filters,
+        )
+        try:
+            return await asyncio.wait_for(coro, timeout=cfg.timeout_s)
+        except asyncio.TimeoutError:
+            logger.warning(f"Qdrant search on '{cfg.collection}' exceeded {cfg.timeout_s}s; continuing without it")
+            return []
+
+    def _submit_search(
+        self,
+        retriever: QdrantEmbeddingRetriever,
+        cfg: RetrieverConfig,
+        index: Optional[InMemoryVectorIndex],
+        q_emb: List[float],
+        filters: Dict,
+    ) -> Future:
+        if index is not None:
+            if index.is_loaded and index.reload_due():
+                index.reload_if_changed()
+            fut: Future = Future()
+            fut.set_result(index.search(q_emb, top_k=cfg.fetch_k, filters=filters))
+            return fut
+        return _search_pool.submit(
+            self._retrieve_direct,
+            retriever,
+            query_embedding=q_emb,
+            top_k=cfg.fetch_k,
+            filters=filters,
+        )
+
+    @staticmethod
+    def _lexical_search(
+        lexical: Optional[LexicalIndex], cfg: RetrieverConfig, query: str, filters: Optional[Dict]
+    ) -> List[Document]:
+        if lexical is None:
+            return []
+        if lexical.is_loaded and lexical.reload_due():
+            lexical.reload_if_changed()
+        return lexical.search(query, top_k=cfg.fetch_k, filters=filters or None)
+
+    async def _alexical_search(
+        self, lexical: Optional[LexicalIndex], cfg: RetrieverConfig, query: str, filters: Optional[Dict]
+    ) -> List[Document]:
+        if lexical is None:
+            return []
+        # Loads read a snapshot or Qdrant (whole collection / one user): keep them off the loop
+        if not lexical.is_loaded_for(filters):
+            await asyncio.to_thread(lexical.ensure_loaded_for, filters)
+        elif lexical.reload_due():
+            await asyncio.to_thread(lexical.reload_if_changed)
+        return lexical.search(query, top_k=cfg.fetch_k, filters=filters or None)
+
+    def _missing_embeddings(self, docs: List[Document]) -> List[str]:
+        return [d.id for d in docs if d.embedding is None] if self.with_embeddings else []
+
+    @staticmethod
+    def _with_embeddings(docs: List[Document], found: Dict[str, List[float]]) -> List[Document]:
+        return [
+            Document(id=d.id, content=d.content, meta=d.meta, score=d.score, embedding=found[d.id])
+            if d.embedding is None and d.id in found
+            else d
+            for d in docs
+        ]
+
+    @staticmethod
+    def _lookup_embeddings(
+        store: QdrantDocumentStore, index: Optional[InMemoryVectorIndex], ids: List[str]
+    ) -> Dict[str, List[float]]:
+        if index is not None:
+            return index.embeddings_for(ids)
+        return {d.id: d.embedding for d in store.get_documents_by_id(ids) if d.embedding is not None}
+
+    def _fill_embeddings(
+        self, store: QdrantDocumentStore, index: Optional[InMemoryVectorIndex], docs: List[Document]
+    ) -> List[Document]:
+        missing = self._missing_embeddings(docs)
+        if not missing:
+            return docs
+        return self._with_embeddings(docs, self._lookup_embeddings(store, index, missing))
+
+    async def _afill_embeddings(
+        self, store: QdrantDocumentStore, index: Optional[InMemoryVectorIndex], docs: List[Document]
+    ) -> List[Document]:
+        """Fetch vectors for fused hits that came only from BM25 (one lookup per collection)."""
+        missing = self._missing_embeddings(docs)
+        if not missing:
+            return docs
+        found = await asyncio.to_thread(self._lookup_embeddings, store, index, missing)
+        return self._with_embeddings(docs, found)
+
+    @staticmethod
+    def _fuse(cfg: RetrieverConfig, dense: List[Document], sparse: List[Document]) -> List[Document]:
+        if not cfg.hybrid:
+            return dense
+        return reciprocal_rank_fusion([dense, sparse], top_n=cfg.top_k)
+
     def retrieve(
         self,
         *,
         query: str,
         user_filters: Dict,
         kb_filters: Optional[Dict] = None,
+        query_embedding: Optional[List[float]] = None,
     ) -> Tuple[List[Document], List[Document]]:
-        """Run both retrievers and return (kb_docs, user_memory_docs)."""
+        """Run both retrievers concurrently and return (kb_docs, user_memory_docs)."""
         kb_filters = kb_filters or {}
-        q_emb = self._embed_query(query)
+        q_emb = query_embedding or self.embed_query(query)
 
-        kb_docs = self._retrieve_direct(
-            self.kb_retriever,
-            query_embedding=q_emb,
-            top_k=self.kb_cfg.top_k,
-            filters=kb_filters,
+        submitted_at = time.monotonic()
+        kb_fut = self._submit_search(self.kb_retriever, self.kb_cfg, self.kb_index, q_emb, kb_filters)
+        mem_fut = self._submit_search(self.mem_retriever, self.mem_cfg, self.mem_index, q_emb, user_filters)
+        # BM25 runs here while the dense searches are in flight
+        kb_sparse = self._lexical_search(self.kb_lexical, self.kb_cfg, query, kb_filters)
+        mem_sparse = self._lexical_search(self.mem_lexical, self.mem_cfg, query, user_filters)
+        kb_docs = self._fuse(self.kb_cfg, _result_or_empty(kb_fut, self.kb_cfg, submitted_at), kb_sparse)
+        mem_docs = self._fuse(self.mem_cfg, _result_or_empty(mem_fut, self.mem_cfg, submitted_at), mem_sparse)
+        return (
+            self._fill_embeddings(self.kb_store, self.kb_index, kb_docs),
+            self._fill_embeddings(self.mem_store, self.mem_index, mem_docs),
         )
-        mem_docs = self._retrieve_direct(
-            self.mem_retriever,
-            query_embedding=q_emb,
-            top_k=self.mem_cfg.top_k,
-            filters=user_filters,
+
+    async def aretrieve(
+        self,
+        *,
+        query: str,
+        user_filters: Dict,
+        kb_filters: Optional[Dict] = None,
+        query_embedding: Union[List[float], Awaitable[List[float]], None] = None,
+        timings: Optional[Dict[str, int]] = None,
+    ) -> Tuple[List[Document], List[Document]]:
+        """
+        Async variant of `retrieve`: no worker thread is held while waiting on I/O.
+        Both searches run concurrently after the single query embedding, so
+        retrieval costs max(kb, mem) instead of their sum. With hybrid configs
+        the BM25 searches overlap the embedding, whether computed here or passed
+        in as a pending future, and each collection's dense and lexical rankings
+        are fused by reciprocal rank.
+        `timings`, when given, receives embed_ms (only when embedding here),
+        lexical_ms, kb_search_ms and mem_search_ms (the searches overlap, so
+        they don't add up).
+        """
+        kb_filters = kb_filters or {}
+        q_emb, (kb_sparse, mem_sparse) = await asyncio.gather(
+            timed(self._aquery_embedding(query, query_embedding), None if query_embedding else timings, "embed_ms"),
+            timed(
+                asyncio.gather(
+                    self._alexical_search(self.kb_lexical, self.kb_cfg, query, kb_filters),
+                    self._alexical_search(self.mem_lexical, self.mem_cfg, query, user_filters),
+                ),
+                timings if self.kb_lexical or self.mem_lexical else None,
+                "lexical_ms",
+            ),
+        )
+
+        kb_dense, mem_dense = await asyncio.gather(
+            timed(
+                self._asearch(
+                    self.kb_retriever, self.kb_cfg, query_embedding=q_emb, filters=kb_filters, index=self.kb_index
+                ),
+                timings,
+                "kb_search_ms",
+            ),
+            timed(
+                self._asearch(
+                    self.mem_retriever, self.mem_cfg, query_embedding=q_emb, filters=user_filters, index=self.mem_index
+                ),
+                timings,
+                "mem_search_ms",
+            ),
+        )
+        kb_docs, mem_docs = await asyncio.gather(
+            self._afill_embeddings(self.kb_store, self.kb_index, self._fuse(self.kb_cfg, kb_dense, kb_sparse)),
+            self._afill_embeddings(self.mem_store, self.mem_index, self._fuse(self.mem_cfg, mem_dense, mem_sparse)),
         )
         return kb_docs, mem_docs
 
@@ -149,14 +454,17 @@ class DualRetriever:
         *,
         cap_total: int = 8,
     ) -> List[Document]:
-        """Merge results preferring memory first, then KB, dedup by id."""
-        seen = set()
-        ordered: List[Document] = []
-        for group in (mem_docs, kb_docs):
-            for d in group:
-                if d.id not in seen:
-                    seen.add(d.id)
-                    ordered.append(d)
-                if len(ordered) >= cap_total:
-                    return ordered
-        return ordered
+        """
+        Merge both collections into one list ordered by score (fused RRF scores
+        for hybrid configs, similarity otherwise), dedup by id. Memory wins ties.
+        """
+        best: Dict[str, Document] = {}
+        for d in (*mem_docs, *kb_docs):
+            best.setdefault(d.id, d)
+        # sorted() is stable, so equal scores keep memory ahead of KB
+        ordered = sorted(
+            best.values(),
+            key=lambda d: d.score if d.score is not None else float("-inf"),
+            reverse=True,
+        )
+        return ordered[:cap_total]
@@ -0,0 +1,127 @@
+# app/services/warmup.py
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.RAG_pipeline import RAGPipeline
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class Warmup:
+    """
+    Startup warm-up and keep-warm for the serving path.
+
+    `run()` loads both Ollama models (with the configured keep_alive), issues
+    a dummy embed and a one-token chat with the same options as real turns,
+    opens the Qdrant connections of both collections and loads the in-process
+    indexes. Failed steps are retried until they all pass; only then does
+    `ready` become True (served by /ready). `keep_warm()` then reloads the
+    chat model and embeds a probe every `interval_s`, so an idle period never
+    hands model loading to a user request.
+    """
+
+    def __init__(self, pipeline: RAGPipeline) -> None:
+        self.pipeline = pipeline
+        self.ollama = pipeline.dual_ret.ollama
+        self.generator = pipeline.generator
+        self.ready = False
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.started_at: Optional[float] = None
+        self.ready_at: Optional[float] = None
+        self.keep_warm_ticks = 0
+        self.keep_warm_failures = 0
+
+    # ---------- steps ----------
+
+    async def _embed(self) -> None:
+        await self.ollama.aembed(["warm-up"])
+
+    async def _chat(self) -> None:
+        # One generated token exercises the whole path, with the real num_ctx
+        await self.generator.client.achat(
+            [{"role": "user", "content": "Hi"}],
+            options={**self.generator.options, "num_predict": 1},
+        )
+
+    async def _qdrant(self) -> None:
+        ret = self.pipeline.dual_ret
+        await asyncio.gather(ret.kb_store.count_documents_async(), ret.mem_store.count_documents_async())
+
+    async def _indexes(self) -> None:
+        ret = self.pipeline.dual_ret
+        for index in (ret.kb_index, ret.mem_index, ret.kb_lexical, ret.mem_lexical):
+            if index is not None:
+                await asyncio.to_thread(index.ensure_loaded)
+
+    def _plan(self) -> List[Tuple[str, Callable[[], Awaitable[None]]]]:
+        return [
+            ("ollama_embed", self._embed),
+            ("ollama_chat", self._chat),
+            ("qdrant", self._qdrant),
+            ("indexes", self._indexes),
+        ]
+
+    async def _step(self, name: str, fn: Callable[[], Awaitable[None]]) -> bool:
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(fn(), timeout=settings.warmup_step_timeout_s)
+            self.steps[name] = {"ok": True, "ms": int((time.perf_counter() - t0) * 1000)}
+            return True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.steps[name] = {"ok": False, "ms": int((time.perf_counter() - t0) * 1000), "error": str(e) or type(e).__name__}
+            logger.warning(f"Warm-up step {name} failed: {e!r}")
+            return False
+
+    # ---------- lifecycle ----------
+
+    async def run(self) -> None:
+        """Run every step, retrying failed ones, until all pass; then mark ready."""
+        self.started_at = time.time()
+        pending = self._plan()
+        while pending:
+            # Models load one at a time in Ollama anyway; the rest can overlap
+            results = await asyncio.gather(*(self._step(name, fn) for name, fn in pending))
+            pending = [step for step, ok in zip(pending, results) if not ok]
+            if pending:
+                await asyncio.sleep(settings.warmup_retry_s)
+        self.ready = True
+        self.ready_at = time.time()
+        logger.info(f"Warm-up finished in {self.ready_at - self.started_at:.1f}s: {self.steps}")
+
+    async def keep_warm(self, interval_s: Optional[float] = None) -> None:
+        """Refresh model residency forever (cancelled at shutdown)."""
+        interval = interval_s or settings.ollama_keep_warm_interval_s
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.gather(
+                    self.ollama.aembed(["keep-warm"]),
+                    self.generator.client.aload_chat_model(self.generator.options),
+                )
+                self.keep_warm_ticks += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.keep_warm_failures += 1
+                logger.warning(f"Keep-warm tick failed: {e!r}")
+
+    async def run_then_keep_warm(self) -> None:
+        await self.run()
+        await self.keep_warm()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "steps": self.steps,
+            "warmup_s": round(self.ready_at - self.started_at, 2) if self.ready_at and self.started_at else None,
+            "keep_warm_ticks": self.keep_warm_ticks,
+            "keep_warm_failures": self.keep_warm_failures,
+        }
@@ -0,0 +1,77 @@
+# app/state/redis_session_store.py
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.state.session_store import SessionBackend
+
+
+class RedisSessionBackend(SessionBackend):
+    """
+    Session history shared by every worker/node through Redis.
+    Each session is a capped list (`<prefix><session_id>:history`) with a
+    sliding TTL. Appends run RPUSH + LTRIM + EXPIRE + LRANGE in one MULTI/EXEC
+    pipeline, so concurrent writers never observe an uncapped list and a
+    turn costs a single round trip.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        *,
+        client: Any = None,
+        max_history: Optional[int] = None,
+        ttl_s: Optional[float] = None,
+        key_prefix: Optional[str] = None,
+    ) -> None:
+        if client is None:
+            from redis import asyncio as aioredis
+
+            client = aioredis.from_url(url or settings.redis_url, decode_responses=True)
+        self.client = client
+        self.max_history = max_history or settings.session_history_window
+        self.ttl_s = int(ttl_s or settings.session_idle_ttl_s)
+        self.key_prefix = key_prefix or settings.session_redis_prefix
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.key_prefix}{session_id}:history"
+
+    @staticmethod
+    def _decode(raw: List[str]) -> List[Dict[str, str]]:
+        return [json.loads(x) for x in raw]
+
+    async def get_history(self, session_id: str) -> List[Dict[str, str]]:
+        key = self._key(session_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.lrange(key, 0, -1)
+            pipe.expire(key, self.ttl_s)
+            raw, _ = await pipe.execute()
+        return self._decode(raw)
+
+    async def append_history(self, session_id: str, *messages: Dict[str, str]) -> List[Dict[str, str]]:
+        key = self._key(session_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, *(json.dumps(m, ensure_ascii=False) for m in messages))
+            pipe.ltrim(key, -self.max_history, -1)
+            pipe.expire(key, self.ttl_s)
+            pipe.lrange(key, 0, -1)
+            _, _, _, raw = await pipe.execute()
+        return self._decode(raw)
+
+    async def delete(self, session_id: str) -> None:
+        await self.client.delete(self._key(session_id))
+
+    async def stats(self) -> Dict[str, Any]:
+        # Counting sessions would need a SCAN over the keyspace; report configuration only
+        return {
+            "backend": "redis",
+            "max_history": self.max_history,
+            "ttl_s": self.ttl_s,
+            "key_prefix": self.key_prefix,
+        }
+
+    async def close(self) -> None:
+        await self.client.aclose()
@@ -1,16 +1,183 @@
 # app/state/session_store.py
 
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+def _approx_size(obj: Any) -> int:
+    """Rough deep size of the JSON-like session payloads (dict/list/str/scalars)."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_approx_size(k) + _approx_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_approx_size(v) for v in obj)
+    return size
+
+
 class SessionStore:
-    def __init__(self):
-        self.sessions = {}  # session_id -> dict
+    """
+    In-process session state, bounded three ways:
+      - at most `max_sessions` entries, least recently used evicted first
+      - entries idle longer than `idle_ttl_s` expire (on access and by the sweeper)
+      - `history` is compacted on write to the last `max_history` messages,
+        which is all the prompt builder ever reads
+    """
+
+    def __init__(
+        self,
+        *,
+        max_sessions: Optional[int] = None,
+        idle_ttl_s: Optional[float] = None,
+        max_history: Optional[int] = None,
+    ) -> None:
+        self.max_sessions = max_sessions or settings.session_max_sessions
+        self.idle_ttl_s = idle_ttl_s or settings.session_idle_ttl_s
+        self.max_history = max_history or settings.session_history_window
+        self.sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # session_id -> dict
+        self._last_seen: Dict[str, float] = {}
+        self.evicted = 0
+        self.expired = 0
+
+    def _is_expired(self, session_id: str, now: float) -> bool:
+        return now - self._last_seen.get(session_id, now) > self.idle_ttl_s
+
+    def _drop(self, session_id: str) -> None:
+        self.sessions.pop(session_id, None)
+        self._last_seen.pop(session_id, None)
 
     def get(self, session_id: str):
-        return self.sessions.get(session_id, {})
+        data = self.sessions.get(session_id)
+        if data is None:
+            return {}
+        now = time.monotonic()
+        if self._is_expired(session_id, now):
+            self._drop(session_id)
+            self.expired += 1
+            return {}
+        self.sessions.move_to_end(session_id)
+        self._last_seen[session_id] = now
+        return data
 
     def set(self, session_id: str, data: dict):
+        hist = data.get("history")
+        if isinstance(hist, list) and len(hist) > self.max_history:
+            data = {**data, "history": hist[-self.max_history:]}
         self.sessions[session_id] = data
+        self.sessions.move_to_end(session_id)
+        self._last_seen[session_id] = time.monotonic()
+        while len(self.sessions) > self.max_sessions:
+            oldest, _ = self.sessions.popitem(last=False)
+            self._last_seen.pop(oldest, None)
+            self.evicted += 1
 
     def delete(self, session_id: str):
-        self.sessions.pop(session_id, None)
+        self._drop(session_id)
+
+    def sweep(self) -> int:
+        """Remove every idle-expired session; returns how many were removed."""
+        now = time.monotonic()
+        removed = 0
+        # LRU order: once an entry is fresh, everything after it is fresher
+        for session_id in list(self.sessions):
+            if not self._is_expired(session_id, now):
+                break
+            self._drop(session_id)
+            removed += 1
+        self.expired += removed
+        return removed
+
+    async def run_sweeper(self, interval_s: Optional[float] = None) -> None:
+        interval = interval_s or settings.session_sweep_interval_s
+        while True:
+            await asyncio.sleep(interval)
+            removed = self.sweep()
+            if removed:
+                logger.info(f"Session sweeper expired {removed} sessions ({len(self.sessions)} live)")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "approx_bytes": sum(_approx_size(k) + _approx_size(v) for k, v in self.sessions.items()),
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
+
+
+class SessionBackend(ABC):
+    """
+    Async session-history interface used by the chat router.
+    `append_history` stores the new messages and returns the capped history,
+    so a turn needs one round trip per write whatever the backend.
+    """
+
+    @abstractmethod
+    async def get_history(self, session_id: str) -> List[Dict[str, str]]: ...
+
+    @abstractmethod
+    async def append_history(self, session_id: str, *messages: Dict[str, str]) -> List[Dict[str, str]]: ...
+
+    @abstractmethod
+    async def delete(self, session_id: str) -> None: ...
+
+    @abstractmethod
+    async def stats(self) -> Dict[str, Any]: ...
+
+    async def run_sweeper(self) -> None:
+        """Background expiry for backends without native TTLs (no-op otherwise)."""
+
+    async def close(self) -> None:
+        """Release connections on shutdown."""
+
+
+class MemorySessionBackend(SessionBackend):
+    """Single-process backend on top of the bounded SessionStore."""
+
+    def __init__(self, store: Optional[SessionStore] = None) -> None:
+        self.store = store or session_store
+
+    async def get_history(self, session_id: str) -> List[Dict[str, str]]:
+        return list(self.store.get(session_id).get("history", []))
+
+    async def append_history(self, session_id: str, *messages: Dict[str, str]) -> List[Dict[str, str]]:
+        state = self.store.get(session_id)
+        self.store.set(session_id, {**state, "history": [*state.get("history", []), *messages]})
+        return list(self.store.get(session_id).get("history", []))
+
+    async def delete(self, session_id: str) -> None:
+        self.store.delete(session_id)
+
+    async def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", **self.store.stats()}
+
+    async def run_sweeper(self) -> None:
+        await self.store.run_sweeper()
+
+
+def build_session_backend() -> SessionBackend:
+    """Select the backend from settings.session_backend ("memory" | "redis")."""
+    if settings.session_backend == "redis":
+        # Imported lazily: redis is only required when the backend is selected
+        from app.state.redis_session_store import RedisSessionBackend
+
+        if not settings.redis_url:
+            raise ValueError("session_backend=redis requires redis_url")
+        return RedisSessionBackend(settings.redis_url)
+    if settings.session_backend != "memory":
+        raise ValueError(f"Unknown session_backend: {settings.session_backend!r}")
+    return MemorySessionBackend()
+
 
 session_store = SessionStore()
+session_backend = build_session_backend()
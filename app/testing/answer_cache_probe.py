@@ -0,0 +1,75 @@
+# app/testing/answer_cache_probe.py
+#
+# Checks which turns the semantic answer cache may store and serve, without
+# Ollama or Qdrant:
+#   python -m app.testing.answer_cache_probe
+# Retrieval and generation are replaced by in-process fakes (KB-only context),
+# so only RAGPipeline's cacheability rules are exercised.
+
+import asyncio
+
+from haystack import Document
+
+from app.services.answer_cache import AnswerCache
+from app.services.RAG_pipeline import RAGPipeline
+
+QUERY = "How much water should I drink a day?"
+KB_DOCS = [Document(id="kb-water", content="Adults need about 2 litres of water a day.", embedding=[1.0, 0.0, 0.0])]
+EMBEDDING = [1.0, 0.0, 0.0]
+
+
+class FakeRetriever:
+    async def aembed_query(self, query):
+        return EMBEDDING
+
+    async def aretrieve(self, **kwargs):
+        return list(KB_DOCS), []  # knowledge-only: no memory docs
+
+    @staticmethod
+    def combine_results(kb_docs, mem_docs, cap_total=None):
+        return [*kb_docs, *mem_docs]
+
+
+class FakeGenerator:
+    model = "fake"
+    options = {}
+
+    def __init__(self):
+        self.calls = 0
+
+    async def astream_chat(self, messages, on_token=None):
+        self.calls += 1
+        return f"answer #{self.calls} ({len(messages)} messages)", {"model": self.model, "done_reason": "stop"}
+
+    async def areplay(self, text, on_token):
+        pass
+
+
+async def turn(pipeline, history):
+    _, meta = await pipeline.arun_rag(user_id="u1", session_id="s1", query=QUERY, history=history)
+    return meta["cache_hit"]
+
+
+async def main():
+    cache = AnswerCache(max_entries=16, ttl_s=60, threshold=0.95)
+    pipeline = RAGPipeline(answer_cache=cache)
+    pipeline.dual_ret = FakeRetriever()
+    pipeline.generator = FakeGenerator()
+    history = [
+        {"role": "user", "content": "I run marathons and sweat a lot."},
+        {"role": "assistant", "content": "Then you need more fluids than most."},
+    ]
+
+    # A turn with prior history neither stores its answer nor hits an entry
+    assert not await turn(pipeline, history)
+    assert cache.stats()["entries"] == 0, "history-shaped answer was stored"
+    assert not await turn(pipeline, []), "history-shaped answer was served"
+    assert cache.stats()["entries"] == 1
+    assert not await turn(pipeline, history), "cached answer served to a turn with history"
+    # Knowledge-only, history-free turns still hit
+    assert await turn(pipeline, [])
+    print("answer cache probe OK:", cache.stats())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,516 @@
+# app/testing/fake_backends.py
+#
+# Local stand-ins for Ollama and Qdrant, so the server can be load-tested on a
+# laptop or CI box with no GPU and no network:
+#   python -m app.testing.fake_backends [--tokens-per-s 40] [--parallel 4] ...
+# then start the app against them:
+#   OLLAMA_URL=http://127.0.0.1:11435 QDRANT_URL=http://127.0.0.1:6335 uvicorn app.main:app
+#
+# Fake Ollama: /api/chat (NDJSON stream and non-stream, empty-messages load),
+#   /api/embed, /api/tags, /api/version. Generation is paced at --tokens-per-s
+#   after a prompt-eval delay, and at most --parallel generations run at once
+#   (like OLLAMA_NUM_PARALLEL); the rest queue. Embeddings are hashed
+#   bag-of-words vectors, so texts sharing words get similar vectors and
+#   retrieval results are stable across restarts.
+# Fake Qdrant: the REST endpoints qdrant-client and the Haystack store use
+#   (collections, payload indexes, upsert/retrieve/scroll/count/delete,
+#   set-payload and batched payload updates,
+#   search and query) over an in-memory brute-force cosine index, with
+#   --qdrant-ms added to every search.
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_FILLER = (
+    "Staying well is mostly about small habits repeated every day . Drink water , move a little , "
+    "sleep at regular times and talk to someone you trust when things feel heavy . "
+).split()
+
+
+# ---------- fake Ollama ----------
+
+
+def hashed_embedding(text: str, dim: int) -> List[float]:
+    """Signed feature hashing of lowercase words (and bigrams), L2-normalized."""
+    vec = np.zeros(dim, dtype=np.float32)
+    words = _WORD.findall(text.lower())
+    for feat in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        h = zlib.crc32(feat.encode("utf-8"))
+        vec[h % dim] += 1.0 if (h >> 31) & 1 else -1.0
+    norm = float(np.linalg.norm(vec))
+    if not norm:
+        vec[0], norm = 1.0, 1.0
+    return (vec / norm).tolist()
+
+
+def build_ollama(args: argparse.Namespace) -> FastAPI:
+    app = FastAPI(title="fake-ollama")
+    slots = asyncio.Semaphore(args.parallel)
+    counters = {"chat": 0, "embed": 0, "inputs_embedded": 0, "queued": 0}
+
+    def prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+        return sum(len(m.get("content") or "") for m in messages) // 4 + 4 * len(messages)
+
+    def reply_tokens(options: Dict[str, Any]) -> List[str]:
+        n = args.max_tokens
+        if options.get("num_predict") and options["num_predict"] > 0:
+            n = min(n, int(options["num_predict"]))
+        if args.jitter:
+            n = max(1, int(n * random.uniform(1 - args.jitter, 1 + args.jitter)))
+        start = random.randrange(len(_FILLER))
+        return [(" " if i else "") + _FILLER[(start + i) % len(_FILLER)] for i in range(n)]
+
+    def done_record(model: str, p_tokens: int, n_tokens: int, t_start: float, load_ns: int, eval_ns: int) -> Dict[str, Any]:
+        return {
+            "model": model,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "message": {"role": "assistant", "content": ""},
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((time.perf_counter() - t_start) * 1e9),
+            "load_duration": load_ns,
+            "prompt_eval_count": p_tokens,
+            "prompt_eval_duration": int(args.prompt_eval_ms * 1e6),
+            "eval_count": n_tokens,
+            "eval_duration": eval_ns,
+        }
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake")
+        messages = body.get("messages") or []
+        options = body.get("options") or {}
+        t_start = time.perf_counter()
+
+        if not messages:
+            # Model load request
+            return {"model": model, "message": {"role": "assistant", "content": ""}, "done": True, "done_reason": "load"}
+
+        counters["chat"] += 1
+        p_tokens = prompt_tokens(messages)
+        tokens = reply_tokens(options)
+        delay = 1.0 / args.tokens_per_s
+
+        if not body.get("stream", True):
+            counters["queued"] += 1
+            async with slots:
+                counters["queued"] -= 1
+                await asyncio.sleep(args.prompt_eval_ms / 1000 + delay * len(tokens))
+            record = done_record(model, p_tokens, len(tokens), t_start, 0, int(delay * len(tokens) * 1e9))
+            record["message"]["content"] = "".join(tokens)
+            return record
+
+        async def frames():
+            counters["queued"] += 1
+            async with slots:
+                counters["queued"] -= 1
+                await asyncio.sleep(args.prompt_eval_ms / 1000)
+                t_eval = time.perf_counter()
+                for tok in tokens:
+                    await asyncio.sleep(delay)
+                    yield json.dumps({"model": model, "message": {"role": "assistant", "content": tok}, "done": False}) + "\n"
+                eval_ns = int((time.perf_counter() - t_eval) * 1e9)
+            yield json.dumps(done_record(model, p_tokens, len(tokens), t_start, 0, eval_ns)) + "\n"
+
+        return StreamingResponse(frames(), media_type="application/x-ndjson")
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        inputs = body.get("input") or []
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        counters["embed"] += 1
+        counters["inputs_embedded"] += len(inputs)
+        await asyncio.sleep((args.embed_ms + args.embed_item_ms * len(inputs)) / 1000)
+        return {
+            "model": body.get("model", "fake-embed"),
+            "embeddings": [hashed_embedding(t, args.dim) for t in inputs],
+            "prompt_eval_count": sum(len(t) // 4 for t in inputs),
+        }
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": "fake:latest", "model": "fake:latest", "size": 0}]}
+
+    @app.get("/api/version")
+    async def version():
+        return {"version": "0.0.0-fake"}
+
+    @app.get("/fake/stats")
+    async def stats():
+        return counters
+
+    return app
+
+
+# ---------- fake Qdrant ----------
+
+
+def _payload_value(payload: Dict[str, Any], key: str) -> Any:
+    value: Any = payload
+    for part in key.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _condition(payload: Dict[str, Any], point_id: Any, cond: Dict[str, Any]) -> bool:
+    if "must" in cond or "should" in cond or "must_not" in cond:
+        return _matches(payload, point_id, cond)
+    if "filter" in cond:
+        return _matches(payload, point_id, cond["filter"])
+    if "has_id" in cond:
+        return point_id in cond["has_id"]
+    if "is_empty" in cond:
+        return _payload_value(payload, cond["is_empty"]["key"]) in (None, [], "")
+    if "is_null" in cond:
+        return _payload_value(payload, cond["is_null"]["key"]) is None
+
+    value = _payload_value(payload, cond.get("key", ""))
+    values = value if isinstance(value, list) else [value]
+    if "match" in cond:
+        match = cond["match"]
+        if "value" in match:
+            return match["value"] in values
+        if "any" in match:
+            return any(v in match["any"] for v in values)
+        if "except" in match:
+            return all(v not in match["except"] for v in values)
+        if "text" in match:
+            return any(isinstance(v, str) and match["text"] in v for v in values)
+    if "range" in cond:
+        rng = cond["range"]
+        ok = [v for v in values if isinstance(v, (int, float))]
+        return bool(ok) and all(
+            (rng.get("gt") is None or v > rng["gt"])
+            and (rng.get("gte") is None or v >= rng["gte"])
+            and (rng.get("lt") is None or v < rng["lt"])
+            and (rng.get("lte") is None or v <= rng["lte"])
+            for v in ok
+        )
+    return True
+
+
+def _matches(payload: Dict[str, Any], point_id: Any, flt: Optional[Dict[str, Any]]) -> bool:
+    if not flt:
+        return True
+    if not all(_condition(payload, point_id, c) for c in flt.get("must") or []):
+        return False
+    should = flt.get("should") or []
+    if should and not any(_condition(payload, point_id, c) for c in should):
+        return False
+    return not any(_condition(payload, point_id, c) for c in flt.get("must_not") or [])
+
+
+class _Collection:
+    def __init__(self, size: int, distance: str) -> None:
+        self.size = size
+        self.distance = distance
+        self.points: Dict[Any, Dict[str, Any]] = {}  # id -> {"vector", "payload"}
+        self.payload_schema: Dict[str, Any] = {}
+
+    def upsert(self, pid: Any, vector: Any, payload: Optional[Dict[str, Any]]) -> None:
+        if isinstance(vector, dict):  # named vectors: keep the default one
+            vector = vector.get("") or next(iter(vector.values()), None)
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        self.points[pid] = {"vector": vector, "unit": vec / norm if norm else vec, "payload": payload or {}}
+
+    def record(self, pid: Any, with_payload: Any, with_vector: Any, score: Optional[float] = None) -> Dict[str, Any]:
+        p = self.points[pid]
+        out: Dict[str, Any] = {"id": pid, "payload": p["payload"] if with_payload is not False else None}
+        out["vector"] = p["vector"] if with_vector else None
+        if score is not None:
+            out.update(version=0, score=score)
+        return out
+
+    def search(self, vector: Any, flt: Optional[Dict[str, Any]], limit: int, offset: int = 0) -> List[tuple]:
+        ids = [pid for pid, p in self.points.items() if _matches(p["payload"], pid, flt)]
+        if not ids:
+            return []
+        q = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        q = q / norm if norm else q
+        scores = np.stack([self.points[pid]["unit"] for pid in ids]) @ q
+        order = np.argsort(-scores)[offset : offset + limit]
+        return [(ids[i], float(scores[i])) for i in order]
+
+
+def build_qdrant(args: argparse.Namespace) -> FastAPI:
+    app = FastAPI(title="fake-qdrant")
+    collections: Dict[str, _Collection] = {}
+
+    def ok(result: Any, t0: float) -> Dict[str, Any]:
+        return {"result": result, "status": "ok", "time": time.perf_counter() - t0}
+
+    def missing(name: str) -> JSONResponse:
+        return JSONResponse(
+            {"status": {"error": f"Not found: Collection `{name}` doesn't exist!"}, "time": 0.0}, status_code=404
+        )
+
+    def update_result() -> Dict[str, Any]:
+        return {"operation_id": 0, "status": "completed"}
+
+    @app.get("/")
+    async def root():
+        return {"title": "qdrant - vector search engine", "version": "1.15.1"}
+
+    @app.get("/collections")
+    async def list_collections():
+        return ok({"collections": [{"name": n} for n in collections]}, time.perf_counter())
+
+    @app.get("/collections/{name}/exists")
+    async def exists(name: str):
+        return ok({"exists": name in collections}, time.perf_counter())
+
+    @app.put("/collections/{name}")
+    async def create(name: str, request: Request):
+        body = await request.json()
+        vectors = body.get("vectors") or {}
+        if "size" not in vectors:  # named vectors: keep the first
+            vectors = next(iter(vectors.values()), {"size": args.dim, "distance": "Cosine"})
+        collections[name] = _Collection(int(vectors["size"]), vectors.get("distance", "Cosine"))
+        return ok(True, time.perf_counter())
+
+    @app.delete("/collections/{name}")
+    async def drop(name: str):
+        return ok(collections.pop(name, None) is not None, time.perf_counter())
+
+    @app.get("/collections/{name}")
+    async def info(name: str):
+        c = collections.get(name)
+        if c is None:
+            return missing(name)
+        return ok(
+            {
+                "status": "green",
+                "optimizer_status": "ok",
+                "indexed_vectors_count": len(c.points),
+                "points_count": len(c.points),
+                "segments_count": 1,
+                "config": {
+                    "params": {
+                        "vectors": {"size": c.size, "distance": c.distance},
+                        "shard_number": 1,
+                        "replication_factor": 1,
+                        "write_consistency_factor": 1,
+                        "on_disk_payload": True,
+                    },
+                    "hnsw_config": {"m": 16, "ef_construct": 100, "full_scan_threshold": 10000},
+                    "optimizer_config": {
+                        "deleted_threshold": 0.2,
+                        "vacuum_min_vector_number": 1000,
+                        "default_segment_number": 0,
+                        "flush_interval_sec": 5,
+                    },
+                    "wal_config": {"wal_capacity_mb": 32, "wal_segments_ahead": 0},
+                },
+                "payload_schema": c.payload_schema,
+            },
+            time.perf_counter(),
+        )
+
+    @app.put("/collections/{name}/index")
+    async def payload_index(name: str, request: Request):
+        c = collections.get(name)
+        if c is None:
+            return missing(name)
+        body = await request.json()
+        schema = body.get("field_schema") or "keyword"
+        c.payload_schema[body["field_name"]] = {"data_type": schema if isinstance(schema, str) else schema.get("type"), "points": 0}
+        return ok(update_result(), time.perf_counter())
+
+    @app.put("/collections/{name}/points")
+    async def upsert(name: str, request: Request):
+        t0 = time.perf_counter()
+        c = collections.get(name)
+        if c is None:
+            return missing(name)
+        body = await request.json()
+        if "batch" in body:
+            b = body["batch"]
+            payloads = b.get("payloads") or [None] * len(b["ids"])
+            for pid, vec, payload in zip(b["ids"], b["vectors"], payloads):
+                c.upsert(pid, vec, payload)
+        for p in body.get("points") or []:
+            c.upsert(p["id"], p.get("vector"), p.get("payload"))
+        return ok(update_result(), t0)
+
+    @app.post("/collections/{name}/points")
+    async def retrieve(name: str, request: Request):
+        t0 = time.perf_counter()
+        c = collections.get(name)
+        if c is None:
+            return missing(name)
+        body = await request.json()
+        ids = [pid for pid in body.get("ids") or [] if pid in c.points]
+        return ok([c.record(pid, body.get("with_payload", True), body.get("with_vector")) for pid in ids], t0)
+
+    @app.post("/collections/{name}/points/delete")
+    async def delete(name: str, request: Request):
+        t0 = time.perf_counter()
+        c = collections.get(name)
+        if c is None:
+            return missing(name)
+        body = await request.json()
+        if "points" in body:
+            doomed = [pid for pid in body["points"] if pid in c.points]
+        else:
+            doomed = [pid for pid, p in c.points.items() if _matches(p["payload"], pid, body.get("filter"))]
+        for pid in doomed:
+            del c.points[pid]
+        return ok(update_result(), t0)
+
+    def set_payload(c: _Collection, op: Dict[str, Any], overwrite: bool = False) -> None:
+        if "points" in op:
+            pids = [pid for pid in op["points"] if pid in c.points]
+        else:
+            pids = [pid for pid, p in c.points.items() if _matches(p["payload"], pid, op.get("filter"))]
+        for pid in pids:
+            point = c.points[pid]
+            point["payload"] = dict(op["payload"]) if overwrite else {**point["payload"], **op["payload"]}
+
+    @app.post("/collections/{name}/points/payload")
+    async def payload(name: str, request: Request):
+        t0 = time.perf_counter()
+        c = collections.get(name)
+        if c is None:
+            return missing(name)
+        set_payload(c, await request.json())
+        return ok(update_result(), t0)
+
+    @app.post("/collections/{name}/points/batch")
+    async def batch(name: str, request: Request):
+        # Payload updates only (what the memory writer sends); other operations are rejected
+        t0 = time.perf_counter()
+        c = collections.get(name)
+        if c is None:
+            return missing(name)
+        body = await request.json()
+        for op in body.get("operations") or []:
+            if "set_payload" in op:
+                set_payload(c, op["set_payload"])
+            elif "overwrite_payload" in op:
+                set_payload(c, op["overwrite_payload"], overwrite=True)
+            else:
+                return JSONResponse({"status": {"error": f"fake-qdrant: unsupported batch op {list(op)}"}}, status_code=400)
+        return ok([update_result() for _ in body.get("operations") or []], t0)
+
+    @app.post("/collections/{name}/points/count")
+    async def count(name: str, request: Request):
+        t0 = time.perf_counter()
+        c = collections.get(name)
+        if c is None:
+            return missing(name)
+        body = await request.json() if await request.body() else {}
+        n = sum(1 for pid, p in c.points.items() if _matches(p["payload"], pid, body.get("filter")))
+        return ok({"count": n}, t0)
+
+    @app.post("/collections/{name}/points/scroll")
+    async def scroll(name: str, request: Request):
+        t0 = time.perf_counter()
+        c = collections.get(name)
+        if c is None:
+            return missing(name)
+        body = await request.json() if await request.body() else {}
+        ids = sorted((pid for pid, p in c.points.items() if _matches(p["payload"], pid, body.get("filter"))), key=str)
+        if body.get("offset") is not None:
+            ids = [pid for pid in ids if str(pid) >= str(body["offset"])]
+        limit = body.get("limit") or 10
+        page, rest = ids[:limit], ids[limit:]
+        return ok(
+            {
+                "points": [c.record(pid, body.get("with_payload", True), body.get("with_vector")) for pid in page],
+                "next_page_offset": rest[0] if rest else None,
+            },
+            t0,
+        )
+
+    async def _search(c: _Collection, body: Dict[str, Any], vector: Any) -> List[Dict[str, Any]]:
+        if isinstance(vector, dict) and "vector" in vector:  # NamedVector
+            vector = vector["vector"]
+        await asyncio.sleep(args.qdrant_ms / 1000)
+        hits = c.search(vector, body.get("filter"), body.get("limit") or 10, body.get("offset") or 0)
+        threshold = body.get("score_threshold")
+        return [
+            c.record(pid, body.get("with_payload", False), body.get("with_vector"), score)
+            for pid, score in hits
+            if threshold is None or score >= threshold
+        ]
+
+    @app.post("/collections/{name}/points/search")
+    async def search(name: str, request: Request):
+        t0 = time.perf_counter()
+        c = collections.get(name)
+        if c is None:
+            return missing(name)
+        body = await request.json()
+        return ok(await _search(c, body, body["vector"]), t0)
+
+    @app.post("/collections/{name}/points/query")
+    async def query(name: str, request: Request):
+        t0 = time.perf_counter()
+        c = collections.get(name)
+        if c is None:
+            return missing(name)
+        body = await request.json()
+        q = body.get("query")
+        if isinstance(q, dict) and "nearest" in q:
+            q = q["nearest"]
+        if q is None:
+            return ok({"points": []}, t0)
+        return ok({"points": await _search(c, body, q)}, t0)
+
+    return app
+
+
+# ---------- entry point ----------
+
+
+async def serve(args: argparse.Namespace) -> None:
+    servers = [
+        uvicorn.Server(uvicorn.Config(build_ollama(args), host=args.host, port=args.ollama_port, log_level=args.log_level)),
+        uvicorn.Server(uvicorn.Config(build_qdrant(args), host=args.host, port=args.qdrant_port, log_level=args.log_level)),
+    ]
+    print(
+        f"fake Ollama on http://{args.host}:{args.ollama_port}, fake Qdrant on http://{args.host}:{args.qdrant_port} "
+        f"({args.tokens_per_s} tok/s, {args.max_tokens} tokens/reply, parallel={args.parallel})"
+    )
+    await asyncio.gather(*(s.serve() for s in servers))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Fake Ollama + Qdrant servers for load tests.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--ollama-port", type=int, default=11435)
+    ap.add_argument("--qdrant-port", type=int, default=6335)
+    ap.add_argument("--dim", type=int, default=768, help="embedding size (match EMBEDDING_DIM)")
+    ap.add_argument("--tokens-per-s", type=float, default=40.0, help="decode rate per generation")
+    ap.add_argument("--max-tokens", type=int, default=120, help="reply length (capped by num_predict)")
+    ap.add_argument("--jitter", type=float, default=0.2, help="+/- fraction applied to reply length")
+    ap.add_argument("--prompt-eval-ms", type=float, default=150.0, help="delay before the first token")
+    ap.add_argument("--parallel", type=int, default=4, help="concurrent generations; the rest queue")
+    ap.add_argument("--embed-ms", type=float, default=15.0, help="per /api/embed call")
+    ap.add_argument("--embed-item-ms", type=float, default=2.0, help="per embedded input")
+    ap.add_argument("--qdrant-ms", type=float, default=3.0, help="added to each search/query")
+    ap.add_argument("--log-level", default="warning")
+    return ap.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(parse_args()))
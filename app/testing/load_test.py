@@ -0,0 +1,197 @@
+# app/testing/load_test.py
+#
+# Concurrent /ws/chat load generator:
+#   python -m app.testing.load_test --users 20 --duration 60 [--think-ms 2000] [--corpus prompts.txt]
+# Each simulated user opens its own session, sends a prompt, reads the stream
+# until the meta frame, waits a think time (uniform 0.5x..1.5x --think-ms) and
+# repeats. Turn latency and TTFT are measured client-side from frame arrival
+# times; the server's own numbers (meta.usage) are reported next to them.
+# Point the server at app/testing/fake_backends.py to run without Ollama/Qdrant.
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import websockets
+
+
+def load_corpus(path: str) -> List[str]:
+    """Prompts from a .jsonl file ({"query": ...} per line) or a plain text file (one per line)."""
+    prompts = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                obj = json.loads(line)
+                line = obj.get("query") or obj.get("text") or ""
+            if line:
+                prompts.append(line)
+    if not prompts:
+        raise SystemExit(f"No prompts in {path}")
+    return prompts
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+    return ordered[k]
+
+
+class Results:
+    def __init__(self) -> None:
+        self.latency_ms: List[float] = []
+        self.ttft_ms: List[float] = []
+        self.server_latency_ms: List[float] = []
+        self.server_ttft_ms: List[float] = []
+        self.token_frames = 0
+        self.output_tokens = 0
+        self.cache_hits = 0
+        self.errors: Counter = Counter()
+
+    def summary(self, wall_s: float) -> Dict[str, Any]:
+        def dist(values: List[float]) -> Dict[str, Any]:
+            out = {f"p{p}": _round(percentile(values, p)) for p in (50, 95, 99)}
+            out["max"] = _round(max(values, default=None))
+            return out
+
+        turns = len(self.latency_ms)
+        return {
+            "wall_s": round(wall_s, 2),
+            "turns": turns,
+            "errors": dict(self.errors),
+            "turns_per_s": round(turns / wall_s, 3) if wall_s else 0.0,
+            "token_frames_per_s": round(self.token_frames / wall_s, 1) if wall_s else 0.0,
+            "output_tokens": self.output_tokens,
+            "cache_hits": self.cache_hits,
+            "latency_ms": dist(self.latency_ms),
+            "ttft_ms": dist(self.ttft_ms),
+            "server_latency_ms": dist(self.server_latency_ms),
+            "server_ttft_ms": dist(self.server_ttft_ms),
+        }
+
+
+def _round(v: Optional[float]) -> Optional[float]:
+    return round(v, 1) if v is not None else None
+
+
+async def run_turn(ws, session_id: str, user_id: str, text: str, results: Results, timeout_s: float) -> Optional[float]:
+    """Run one turn. Returns 0 on success, the server's retry-after on a busy frame, None on failure."""
+    await ws.send(json.dumps({"session_id": session_id, "user_id": user_id, "text": text}))
+    t_sent = time.perf_counter()
+    t_first: Optional[float] = None
+    deadline = t_sent + timeout_s
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            results.errors["timeout"] += 1
+            return None
+        raw = await asyncio.wait_for(ws.recv(), timeout=remaining)
+        now = time.perf_counter()
+        frame = json.loads(raw)
+        kind = frame.get("type")
+        if kind == "token":
+            results.token_frames += 1
+            if t_first is None:
+                t_first = now
+        elif kind == "meta":
+            results.latency_ms.append((now - t_sent) * 1000)
+            # A cache hit or an empty reply streams nothing: TTFT is the whole turn
+            results.ttft_ms.append(((t_first or now) - t_sent) * 1000)
+            usage = frame.get("usage") or {}
+            if usage.get("latency_ms") is not None:
+                results.server_latency_ms.append(usage["latency_ms"])
+            if usage.get("ttft_ms") is not None:
+                results.server_ttft_ms.append(usage["ttft_ms"])
+            results.output_tokens += usage.get("output_tokens") or 0
+            results.cache_hits += bool(frame.get("cache_hit"))
+            return 0.0
+        elif kind == "error":
+            if frame.get("code") == "busy":
+                # Admission control: the socket stays open, retry after the hint
+                results.errors["busy"] += 1
+                return float(frame.get("retry_after_s") or 1.0)
+            # Any other error frame is followed by the server closing the socket
+            results.errors["server_error"] += 1
+            return None
+
+
+async def user_loop(idx: int, args: argparse.Namespace, prompts: List[str], results: Results, stop_at: float) -> None:
+    await asyncio.sleep(args.ramp_s * idx / max(1, args.users))
+    session_id = f"load-{uuid.uuid4().hex[:8]}"
+    user_id = f"load-user-{idx}"
+    rng = random.Random(args.seed + idx)
+    turns = 0
+    try:
+        async with websockets.connect(args.url, max_size=None) as ws:
+            try:
+                await asyncio.wait_for(ws.recv(), timeout=2)  # greeting
+            except asyncio.TimeoutError:
+                pass
+            while time.perf_counter() < stop_at and (not args.turns or turns < args.turns):
+                retry_after = await run_turn(ws, session_id, user_id, rng.choice(prompts), results, args.turn_timeout_s)
+                turns += 1
+                if retry_after is None:
+                    break
+                if retry_after:
+                    await asyncio.sleep(retry_after)
+                elif args.think_ms:
+                    await asyncio.sleep(args.think_ms * rng.uniform(0.5, 1.5) / 1000)
+    except asyncio.TimeoutError:
+        results.errors["timeout"] += 1
+    except (websockets.ConnectionClosed, OSError) as e:
+        results.errors[type(e).__name__] += 1
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    prompts = load_corpus(args.corpus)
+    results = Results()
+    t0 = time.perf_counter()
+    stop_at = t0 + args.duration if args.duration else float("inf")
+    await asyncio.gather(*(user_loop(i, args, prompts, results, stop_at) for i in range(args.users)))
+    summary = results.summary(time.perf_counter() - t0)
+    summary["config"] = {
+        "users": args.users,
+        "think_ms": args.think_ms,
+        "duration_s": args.duration,
+        "turns_per_user": args.turns,
+        "prompts": len(prompts),
+    }
+    return summary
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Concurrent /ws/chat load test.")
+    ap.add_argument("--url", default="ws://localhost:8000/ws/chat")
+    ap.add_argument("--users", type=int, default=10, help="concurrent sessions")
+    ap.add_argument("--duration", type=float, default=60.0, help="seconds to run (0: until --turns)")
+    ap.add_argument("--turns", type=int, default=0, help="turns per user (0: until --duration)")
+    ap.add_argument("--think-ms", type=float, default=2000.0, help="mean pause between a reply and the next prompt")
+    ap.add_argument("--ramp-s", type=float, default=5.0, help="spread session starts over this many seconds")
+    ap.add_argument("--turn-timeout-s", type=float, default=120.0)
+    ap.add_argument("--corpus", default="app/testing/golden_queries.jsonl")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", dest="json_out", default=None, help="also write the report to this file")
+    args = ap.parse_args(argv)
+    if not args.duration and not args.turns:
+        ap.error("set --duration and/or --turns")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    print(json.dumps(report, indent=2))
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
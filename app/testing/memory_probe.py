@@ -1,4 +1,5 @@
 from app.services.memory_summarizer import memory_summarizer
+from app.services.retriever import build_filters
 from qdrant_client import QdrantClient
 from app.config import settings
 
@@ -12,6 +13,18 @@ if __name__ == "__main__":
     upserted_id = memory_summarizer._embed_and_upsert(TEXT, USER_ID, SESSION_ID)
     print("Upserted ID:", upserted_id)
 
+    # Same snippet again: dedup folds it into the stored point (touch), which
+    # must stay findable by vector search with its hit_count bumped
+    touched_id = memory_summarizer._embed_and_upsert(TEXT, USER_ID, SESSION_ID)
+    print("Second write ID:", touched_id, "dedup:", memory_summarizer.dedup_stats)
+    q_emb = memory_summarizer.ollama.embed([TEXT])[0]
+    hits = memory_summarizer.mem_retriever.run(
+        query_embedding=q_emb, top_k=1, filters=build_filters(user_id=USER_ID, session_id=SESSION_ID)
+    )["documents"]
+    assert hits and hits[0].id == touched_id, f"touched memory not found by vector search: {hits}"
+    assert hits[0].embedding, "touched memory lost its vector"
+    print("Vector search after touch:", hits[0].id, f"score={hits[0].score:.3f}", "hit_count=", hits[0].meta.get("hit_count"))
+
     # Read back a couple of points
     c = QdrantClient(url=settings.qdrant_url)
     pts, _ = c.scroll(collection_name=settings.qdrant_collection_memory, limit=5, with_payload=True)
@@ -0,0 +1,268 @@
+# app/testing/microbench.py
+#
+# Microbenchmarks for the pure-Python code that runs on every turn:
+#   python -m app.testing.microbench [--filter chunk] [--min-time 0.2]
+#   python -m app.testing.microbench --save-baseline      # record this machine's numbers
+#   python -m app.testing.microbench --compare             # fail (exit 1) on regressions
+# Each case runs on synthetic fixtures at a realistic and an extreme size
+# (10k-message histories, 88 KB documents, long token streams) and reports
+# ops/sec (best of --repeat runs of at least --min-time each) plus, from one
+# traced call, the peak bytes allocated and the number of allocated blocks
+# still alive when it returns.
+# Prompt-side cases time PromptAssembler.assemble, which replaced the old
+# _format_context / _history_to_messages helpers.
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from haystack import Document
+from haystack.dataclasses import ChatMessage
+
+from app.schemas import TokenOut
+from app.services.generator import LLMGenerator, _to_ollama_messages
+from app.services.ollama_client import _NDJSONDecoder
+from app.services.RAG_pipeline import _system_prompt
+from app.services.prompt_builder import PromptAssembler
+from app.services.retriever import DualRetriever, build_filters
+
+DEFAULT_BASELINE = ".cache/microbench_baseline.json"
+
+_WORDS = (
+    "sleep stress water walk breathe routine energy mood focus rest meal protein fibre stretch "
+    "calm habit morning evening screen caffeine hydrate anxiety gratitude journal posture"
+).split()
+
+
+# ---------- fixtures ----------
+
+
+def words(rng: random.Random, n: int) -> str:
+    """n words in sentences of 8-20 words."""
+    out, left = [], n
+    while left > 0:
+        k = min(left, rng.randint(8, 20))
+        out.append(" ".join(rng.choice(_WORDS) for _ in range(k)).capitalize() + ".")
+        left -= k
+    return " ".join(out)
+
+
+def text_of_size(rng: random.Random, n_bytes: int) -> str:
+    text = words(rng, n_bytes // 6 + 1)
+    return text[:n_bytes]
+
+
+def docs(rng: random.Random, n: int, n_bytes: int, prefix: str) -> List[Document]:
+    return [
+        Document(
+            id=f"{prefix}-{i}",
+            content=text_of_size(rng, n_bytes),
+            meta={"source": f"{prefix}.md", "user_id": "u1", "timestamp_epoch": 1.7e9 + i},
+            score=rng.random(),
+        )
+        for i in range(n)
+    ]
+
+
+def history(rng: random.Random, n: int) -> List[Dict[str, str]]:
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": words(rng, rng.randint(5, 60))}
+        for i in range(n)
+    ]
+
+
+def token_stream(rng: random.Random, n: int) -> List[str]:
+    return [(" " if i else "") + rng.choice(_WORDS) for i in range(n)]
+
+
+def ndjson_chunks(tokens: List[str], chunk_bytes: int = 512) -> List[str]:
+    body = "".join(
+        json.dumps({"model": "m", "message": {"role": "assistant", "content": t}, "done": False}) + "\n" for t in tokens
+    ) + json.dumps({"model": "m", "done": True, "eval_count": len(tokens)}) + "\n"
+    return [body[i : i + chunk_bytes] for i in range(0, len(body), chunk_bytes)]
+
+
+# ---------- cases ----------
+
+Case = Tuple[str, Callable[[], Any]]
+
+
+def build_cases(seed: int = 0) -> List[Case]:
+    rng = random.Random(seed)
+    assembler = PromptAssembler()
+    generator = LLMGenerator()
+    system = _system_prompt()
+    query = "How can I sleep better when I feel stressed in the evening?"
+
+    ctx_small = docs(rng, 6, 700, "kb")
+    ctx_huge = docs(rng, 6, 88_000, "kb")
+    hist_small = history(rng, 8)
+    hist_huge = history(rng, 10_000)
+    msgs_small = [ChatMessage.from_system(system)] + [
+        ChatMessage.from_user(m["content"]) if m["role"] == "user" else ChatMessage.from_assistant(m["content"])
+        for m in hist_small
+    ]
+    msgs_huge = [
+        ChatMessage.from_user(m["content"]) if m["role"] == "user" else ChatMessage.from_assistant(m["content"])
+        for m in hist_huge
+    ]
+    reply = words(rng, 120)
+    reply_huge = text_of_size(rng, 88_000)
+    kb_small, mem_small = docs(rng, 4, 300, "kb"), docs(rng, 4, 200, "mem")
+    kb_huge, mem_huge = docs(rng, 500, 300, "kb"), docs(rng, 500, 200, "mem")
+    stream_small = token_stream(rng, 200)
+    stream_huge = token_stream(rng, 20_000)
+    chunks_small = ndjson_chunks(stream_small)
+    chunks_huge = ndjson_chunks(stream_huge)
+
+    def frames(tokens: List[str]) -> int:
+        return sum(len(TokenOut(text=t).model_dump_json()) for t in tokens)
+
+    def decode(chunks: List[str]) -> int:
+        return sum(1 for _ in _NDJSONDecoder().iter_frames(chunks))
+
+    return [
+        ("assemble/6x700B+8msg", lambda: assembler.assemble(system=system, query=query, docs=ctx_small, history=hist_small)),
+        ("assemble/6x88KB+10kmsg", lambda: assembler.assemble(system=system, query=query, docs=ctx_huge, history=hist_huge)),
+        ("to_ollama_messages/9", lambda: _to_ollama_messages(msgs_small)),
+        ("to_ollama_messages/10k", lambda: _to_ollama_messages(msgs_huge)),
+        ("chunk_text/120w", lambda: generator._chunk_text(reply)),
+        ("chunk_text/88KB", lambda: generator._chunk_text(reply_huge)),
+        ("combine_results/4+4", lambda: DualRetriever.combine_results(kb_small, mem_small)),
+        ("combine_results/500+500", lambda: DualRetriever.combine_results(kb_huge, mem_huge)),
+        ("build_filters/user+session+ts", lambda: build_filters(user_id="u1", session_id="s1", min_timestamp_epoch=1.7e9)),
+        ("token_frames/200", lambda: frames(stream_small)),
+        ("token_frames/20k", lambda: frames(stream_huge)),
+        ("ndjson_decode/200", lambda: decode(chunks_small)),
+        ("ndjson_decode/20k", lambda: decode(chunks_huge)),
+    ]
+
+
+# ---------- measurement ----------
+
+
+def measure(fn: Callable[[], Any], min_time: float, repeat: int) -> Dict[str, Any]:
+    fn()  # warm caches / lazy imports
+
+    # Calibrate the loop count so one run lasts at least min_time
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)))
+
+    best = elapsed
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat - 1):
+            t0 = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            best = min(best, time.perf_counter() - t0)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    tracemalloc.start()
+    try:
+        base_blocks = sys.getallocatedblocks()
+        tracemalloc.reset_peak()
+        base_bytes = tracemalloc.get_traced_memory()[0]
+        result = fn()
+        peak = tracemalloc.get_traced_memory()[1] - base_bytes
+        blocks = sys.getallocatedblocks() - base_blocks
+        del result
+    finally:
+        tracemalloc.stop()
+
+    per_op = best / loops
+    return {
+        "ops_per_s": round(1.0 / per_op, 1),
+        "us_per_op": round(per_op * 1e6, 2),
+        "alloc_peak_kb": round(peak / 1024, 1),
+        "alloc_blocks": blocks,
+    }
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    """Names of cases whose ops/sec fell more than `tolerance` below the baseline."""
+    regressions = []
+    for name, res in results.items():
+        ref = baseline.get(name)
+        if not ref:
+            res["vs_baseline"] = None
+            continue
+        ratio = res["ops_per_s"] / ref["ops_per_s"]
+        res["vs_baseline"] = round(ratio, 3)
+        if ratio < 1.0 - tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def print_table(results: Dict[str, Dict[str, Any]]) -> None:
+    show_ratio = any("vs_baseline" in r for r in results.values())
+    header = f"{'case':34} {'ops/s':>12} {'us/op':>12} {'peak KB':>10} {'blocks':>8}"
+    print(header + (f" {'vs base':>8}" if show_ratio else ""))
+    for name, r in results.items():
+        line = f"{name:34} {r['ops_per_s']:>12,.1f} {r['us_per_op']:>12,.2f} {r['alloc_peak_kb']:>10,.1f} {r['alloc_blocks']:>8}"
+        if show_ratio:
+            ratio = r.get("vs_baseline")
+            line += f" {ratio:>8.2f}" if ratio is not None else f" {'-':>8}"
+        print(line)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Microbenchmarks for per-turn hot paths.")
+    ap.add_argument("--filter", default="", help="only run cases whose name contains this")
+    ap.add_argument("--min-time", type=float, default=0.2, help="seconds per timed run")
+    ap.add_argument("--repeat", type=int, default=5, help="timed runs per case (best is kept)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE)
+    ap.add_argument("--save-baseline", action="store_true", help="write results to --baseline")
+    ap.add_argument("--compare", action="store_true", help="compare with --baseline; exit 1 on regressions")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed ops/sec drop before flagging")
+    ap.add_argument("--json", dest="json_out", default=None, help="also write results to this file")
+    args = ap.parse_args(argv)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, fn in build_cases(args.seed):
+        if args.filter in name:
+            results[name] = measure(fn, args.min_time, args.repeat)
+
+    regressions: List[str] = []
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save-baseline first.")
+            return 2
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+
+    print_table(results)
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "created_at": time.time(), "results": results}, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    if regressions:
+        print(f"Regressions (> {args.tolerance:.0%} slower than baseline): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
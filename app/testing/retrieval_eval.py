@@ -0,0 +1,79 @@
+# app/testing/retrieval_eval.py
+#
+# Compares dense-only and hybrid (BM25 + dense, RRF) KB retrieval on a golden
+# query set against the live Qdrant/Ollama stack:
+#   python -m app.testing.retrieval_eval [--golden app/testing/golden_queries.jsonl] [--top-k 4]
+# A hit is a retrieved chunk containing one of the query's `expect` strings.
+# Reports hit@1, hit@k, MRR and the context characters the top-k would cost.
+
+import argparse
+import asyncio
+import json
+import time
+
+from app.config import settings
+from app.services.retriever import DualRetriever, RetrieverConfig, build_filters
+
+
+def load_golden(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def first_hit_rank(docs, expect):
+    needles = [e.lower() for e in expect]
+    for rank, d in enumerate(docs, start=1):
+        text = (d.content or "").lower()
+        if any(n in text for n in needles):
+            return rank
+    return None
+
+
+async def evaluate(name, retriever, golden, top_k):
+    # Memory side is filtered to a user with no memories: KB only
+    no_memories = build_filters(user_id="__retrieval_eval__")
+    ranks, chars, t0 = [], 0, time.perf_counter()
+    for item in golden:
+        kb_docs, _ = await retriever.aretrieve(query=item["query"], user_filters=no_memories)
+        kb_docs = kb_docs[:top_k]
+        rank = first_hit_rank(kb_docs, item["expect"])
+        ranks.append(rank)
+        chars += sum(len(d.content or "") for d in kb_docs)
+        if rank is None:
+            print(f"  [{name}] miss: {item['query']}")
+    n = len(golden)
+    elapsed_ms = (time.perf_counter() - t0) * 1000 / max(n, 1)
+    print(
+        f"{name:>7}: hit@1={sum(r == 1 for r in ranks) / n:.2f}  "
+        f"hit@{top_k}={sum(r is not None for r in ranks) / n:.2f}  "
+        f"MRR={sum(1 / r for r in ranks if r) / n:.3f}  "
+        f"ctx_chars/query={chars // n}  latency={elapsed_ms:.0f} ms/query"
+    )
+
+
+def build(hybrid, top_k):
+    return DualRetriever(
+        kb_cfg=RetrieverConfig(
+            collection=settings.qdrant_collection_docs,
+            top_k=top_k,
+            hybrid=hybrid,
+            candidate_k=settings.hybrid_candidate_k,
+        ),
+        mem_cfg=RetrieverConfig(collection=settings.qdrant_collection_memory, top_k=1),
+    )
+
+
+async def main():
+    ap = argparse.ArgumentParser(description="Dense vs hybrid retrieval on a golden query set")
+    ap.add_argument("--golden", default="app/testing/golden_queries.jsonl")
+    ap.add_argument("--top-k", type=int, default=4)
+    args = ap.parse_args()
+
+    golden = load_golden(args.golden)
+    print(f"{len(golden)} golden queries, top_k={args.top_k}")
+    await evaluate("dense", build(False, args.top_k), golden, args.top_k)
+    await evaluate("hybrid", build(True, args.top_k), golden, args.top_k)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
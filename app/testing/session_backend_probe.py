@@ -0,0 +1,114 @@
+# app/testing/session_backend_probe.py
+#
+# Exercises both session backends without a Redis server:
+#   python -m app.testing.session_backend_probe
+# The Redis backend runs against FakeRedis, an in-process stand-in for the
+# handful of list/TTL commands it uses. Two backend instances sharing one
+# FakeRedis play the role of two uvicorn workers.
+
+import asyncio
+
+from app.state.redis_session_store import RedisSessionBackend
+from app.state.session_store import MemorySessionBackend, SessionStore
+
+
+class FakeRedis:
+    """Minimal async Redis stand-in: lists, EXPIRE bookkeeping and MULTI/EXEC pipelines."""
+
+    def __init__(self):
+        self.lists = {}
+        self.ttls = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def delete(self, key):
+        self.ttls.pop(key, None)
+        return 1 if self.lists.pop(key, None) is not None else 0
+
+    async def aclose(self):
+        pass
+
+    # commands (sync; applied at EXEC time by the pipeline)
+    def _rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(values)
+        return len(self.lists[key])
+
+    def _ltrim(self, key, start, stop):
+        lst = self.lists.get(key, [])
+        n = len(lst)
+        start = max(n + start, 0) if start < 0 else start
+        stop = n + stop if stop < 0 else stop
+        self.lists[key] = lst[start : stop + 1]
+        return True
+
+    def _expire(self, key, seconds):
+        if key not in self.lists:
+            return False
+        self.ttls[key] = seconds
+        return True
+
+    def _lrange(self, key, start, stop):
+        lst = self.lists.get(key, [])
+        stop = len(lst) + stop if stop < 0 else stop
+        return list(lst[start : stop + 1])
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.ops = []
+
+    def __getattr__(self, name):
+        fn = getattr(self.redis, f"_{name}")
+
+        def queue(*args):
+            self.ops.append((fn, args))
+            return self
+
+        return queue
+
+    async def execute(self):
+        # No awaits between ops: atomic with respect to other coroutines, like MULTI/EXEC
+        results = [fn(*args) for fn, args in self.ops]
+        self.ops = []
+        return results
+
+
+async def check_backend(name, worker_a, worker_b):
+    sid = "probe-session"
+    await worker_a.delete(sid)
+
+    for i in range(7):
+        await worker_a.append_history(sid, {"role": "user", "content": f"u{i}"})
+        hist = await worker_b.append_history(sid, {"role": "assistant", "content": f"a{i}"})
+
+    assert len(hist) == 10, hist
+    assert hist[-1] == {"role": "assistant", "content": "a6"}, hist[-1]
+    assert await worker_a.get_history(sid) == hist
+
+    await worker_b.delete(sid)
+    assert await worker_a.get_history(sid) == []
+    print(f"{name}: ok ({await worker_a.stats()})")
+
+
+async def main():
+    store = SessionStore(max_sessions=100, idle_ttl_s=60, max_history=10)
+    mem = MemorySessionBackend(store)
+    await check_backend("memory", mem, mem)
+
+    fake = FakeRedis()
+    worker_a = RedisSessionBackend(client=fake, max_history=10, ttl_s=60)
+    worker_b = RedisSessionBackend(client=fake, max_history=10, ttl_s=60)
+    await check_backend("redis (fake)", worker_a, worker_b)
+    assert all(ttl == 60 for ttl in fake.ttls.values())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,14 @@
+# app/utils/aio.py
+
+from __future__ import annotations
+
+import inspect
+from typing import Any, Callable
+
+
+async def call_maybe_async(fn: Callable[..., Any], *args: Any) -> Any:
+    """Call a sync or async callback and await the result when needed."""
+    res = fn(*args)
+    if inspect.isawaitable(res):
+        res = await res
+    return res
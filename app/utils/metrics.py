@@ -0,0 +1,299 @@
+# app/utils/metrics.py
+
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+# Latency buckets (seconds): 5 ms .. 60 s
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, Any] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: str, **kw: str) -> Any:
+        """Child for one label combination; created once, then a dict lookup."""
+        key = tuple(values) if values else tuple(kw[n] for n in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self) -> Any:
+        return self.labels() if not self.labelnames else None
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in list(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key: LabelValues, child: Any) -> List[str]:
+        return [f"{self.name}{_fmt_labels(self.labelnames, key)} {_fmt_value(child.value)}"]
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default().dec(amount)
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot: +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+    def _render_child(self, key: LabelValues, child: _HistogramChild) -> List[str]:
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        lines = []
+        cumulative = 0
+        for bound, n in zip((*self.buckets, float("inf")), counts):
+            cumulative += n
+            le = ("le", _fmt_value(bound))
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {cumulative}")
+        labels = _fmt_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_fmt_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """
+    Gauge or counter whose samples are read from their owner at scrape time
+    (queue depth, cache hit counters), so the hot path does no extra work.
+    `fn` returns {label values tuple: value}.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        kind: str,
+        fn: Callable[[], Mapping[LabelValues, float]],
+        labelnames: Sequence[str] = (),
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.kind = kind
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            samples = self.fn()
+        except Exception:
+            samples = {}
+        for key, value in samples.items():
+            lines.append(f"{self.name}{_fmt_labels(self.labelnames, key)} {_fmt_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        if not metric.labelnames and not isinstance(metric, CallbackMetric):
+            metric.labels()  # export zeros before the first observation
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(
+        self,
+        name: str,
+        help: str,
+        kind: str,
+        fn: Callable[[], Mapping[LabelValues, float]],
+        labelnames: Sequence[str] = (),
+    ) -> CallbackMetric:
+        return self.register(CallbackMetric(name, help, kind, fn, labelnames))
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+registry = Registry()
+
+# ---------- service metrics ----------
+
+TURN_LATENCY = registry.histogram("wellbot_turn_latency_seconds", "End-to-end chat turn latency.")
+TTFT = registry.histogram("wellbot_ttft_seconds", "Turn start to first streamed token.")
+STAGE_LATENCY = registry.histogram(
+    "wellbot_stage_latency_seconds", "Per-stage latency of a chat turn.", ["stage"]
+)
+OLLAMA_DURATION = registry.histogram(
+    "wellbot_ollama_request_duration_seconds", "Ollama HTTP call duration (streams: until closed).", ["endpoint"]
+)
+WS_CONNECTIONS = registry.gauge("wellbot_ws_connections_active", "Open /ws/chat connections.")
+TURNS_IN_FLIGHT = registry.gauge("wellbot_turns_in_flight", "Chat turns currently being processed.")
+TURNS_CANCELLED = registry.counter(
+    "wellbot_turns_cancelled_total", "Turns aborted before completion, by reason.", ["reason"]
+)
+TOKENS = registry.counter("wellbot_tokens_total", "LLM tokens processed, by direction.", ["direction", "job"])
+ERRORS = registry.counter("wellbot_errors_total", "Errors by where they happened and exception type.", ["where", "type"])
+MEMORY_DEDUP = registry.counter(
+    "wellbot_memory_dedup_total", "Memory writes by dedup decision (inserted, touched, merged).", ["decision"]
+)
+
+# UsageMeta stage fields -> stage label
+_STAGES = (
+    ("embed_ms", "embed"),
+    ("lexical_ms", "lexical"),
+    ("kb_search_ms", "kb_search"),
+    ("mem_search_ms", "mem_search"),
+    ("rerank_ms", "rerank"),
+    ("prompt_build_ms", "prompt_build"),
+    ("generation_ms", "generation"),
+    ("prompt_eval_ms", "prompt_eval"),
+    ("decode_ms", "decode"),
+)
+_STAGE_CHILDREN = {key: STAGE_LATENCY.labels(stage) for key, stage in _STAGES}
+
+
+def observe_turn(usage: Mapping[str, Any]) -> None:
+    """Record one finished turn from its UsageMeta fields (once per turn, never per token)."""
+    if usage.get("latency_ms") is not None:
+        TURN_LATENCY.observe(usage["latency_ms"] / 1000)
+    if usage.get("ttft_ms") is not None:
+        TTFT.observe(usage["ttft_ms"] / 1000)
+    for key, child in _STAGE_CHILDREN.items():
+        if usage.get(key) is not None:
+            child.observe(usage[key] / 1000)
+    observe_tokens("chat", usage)
+
+
+def observe_tokens(job: str, usage: Mapping[str, Any]) -> None:
+    if usage.get("input_tokens"):
+        TOKENS.labels("input", job).inc(usage["input_tokens"])
+    if usage.get("output_tokens"):
+        TOKENS.labels("output", job).inc(usage["output_tokens"])
+
+
+def count_error(where: str, exc: BaseException) -> None:
+    ERRORS.labels(where, type(exc).__name__).inc()
+
+
+def cache_samples(caches: Iterable[Tuple[str, Any]]) -> Dict[LabelValues, float]:
+    """Hit/miss samples from caches exposing `.hits` / `.misses` (None entries skipped)."""
+    out: Dict[LabelValues, float] = {}
+    for name, cache in caches:
+        if cache is not None:
+            out[(name, "hit")] = cache.hits
+            out[(name, "miss")] = cache.misses
+    return out
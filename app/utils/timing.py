@@ -0,0 +1,54 @@
+# app/utils/timing.py
+
+from __future__ import annotations
+
+import time
+from typing import Any, Awaitable, Dict, Mapping, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+def ms_since(t0: float) -> int:
+    """Milliseconds elapsed since a time.perf_counter() reading."""
+    return int((time.perf_counter() - t0) * 1000)
+
+
+async def timed(aw: Awaitable[T], timings: Optional[Dict[str, int]], key: str) -> T:
+    """Await `aw`, recording its wall time under timings[key] (when a dict is given)."""
+    t0 = time.perf_counter()
+    try:
+        return await aw
+    finally:
+        if timings is not None:
+            timings[key] = ms_since(t0)
+
+
+class StageStats:
+    """
+    Running per-stage aggregates (count / mean / max) plus the last sample,
+    for background jobs that have no meta frame to report into.
+    """
+
+    def __init__(self) -> None:
+        self.jobs = 0
+        self.last: Dict[str, Any] = {}
+        self._count: Dict[str, int] = {}
+        self._sum: Dict[str, float] = {}
+        self._max: Dict[str, float] = {}
+
+    def record(self, sample: Mapping[str, Any]) -> None:
+        self.jobs += 1
+        self.last = dict(sample)
+        for key, value in sample.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self._count[key] = self._count.get(key, 0) + 1
+                self._sum[key] = self._sum.get(key, 0.0) + value
+                self._max[key] = max(self._max.get(key, value), value)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "jobs": self.jobs,
+            "mean": {k: round(v / self._count[k], 2) for k, v in self._sum.items()},
+            "max": dict(self._max),
+            "last": self.last,
+        }
@@ -0,0 +1,138 @@
+# app/utils/tokens.py
+
+from __future__ import annotations
+
+import math
+import re
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import settings
+from app.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Sentence ends (., !, ? or … followed by whitespace) and line breaks
+_SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+# Plausible chars/token for the chat models we run; samples outside are ignored
+_CPT_RANGE = (1.5, 6.0)
+
+
+class TokenCounter:
+    """
+    Prompt token counts for budgeting.
+
+    With `tokenizer_path` (a Hugging Face tokenizer.json matching the chat
+    model, loaded through the optional `tokenizers` package) counts are exact
+    and memoized per text. Otherwise a chars-per-token estimator is used and
+    calibrated online from Ollama's `prompt_eval_count` via `observe()`.
+    """
+
+    def __init__(
+        self,
+        *,
+        tokenizer_path: Optional[str] = None,
+        chars_per_token: Optional[float] = None,
+    ) -> None:
+        self.chars_per_token = chars_per_token or settings.prompt_chars_per_token
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._tokenizer = None
+        path = tokenizer_path if tokenizer_path is not None else settings.prompt_tokenizer_path
+        if path:
+            try:
+                # Imported lazily: tokenizers is only required when a tokenizer file is configured
+                from tokenizers import Tokenizer
+
+                self._tokenizer = Tokenizer.from_file(path)
+            except Exception as e:
+                logger.warning(f"Tokenizer {path} unavailable ({e}); using the calibrated estimator")
+        self._encode_len: Callable[[str], int] = lru_cache(maxsize=8192)(self._tokenizer_len)
+
+    @property
+    def exact(self) -> bool:
+        return self._tokenizer is not None
+
+    def _tokenizer_len(self, text: str) -> int:
+        return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._tokenizer is not None:
+            return self._encode_len(text)
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def observe(self, prompt_chars: int, prompt_tokens: Optional[int]) -> None:
+        """Fold one (prompt chars, tokens Ollama evaluated) sample into the estimate."""
+        if self._tokenizer is not None or not prompt_tokens or prompt_chars <= 0:
+            return
+        cpt = prompt_chars / prompt_tokens
+        # A reused KV cache makes Ollama report fewer tokens than the prompt has;
+        # such samples (and garbage) fall outside the plausible range
+        if not (_CPT_RANGE[0] <= cpt <= _CPT_RANGE[1]):
+            return
+        with self._lock:
+            self.samples += 1
+            alpha = max(0.05, 1.0 / self.samples)
+            self.chars_per_token += alpha * (cpt - self.chars_per_token)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": "tokenizer" if self.exact else "estimator",
+            "chars_per_token": round(self.chars_per_token, 3),
+            "samples": self.samples,
+        }
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in _SENTENCE_RE.split(text.strip()) if s]
+
+
+def trim_to_tokens(text: str, max_tokens: int, counter: TokenCounter, *, keep: str = "head") -> str:
+    """
+    Longest run of whole sentences from the start (keep="head") or the end
+    (keep="tail") of `text` that fits `max_tokens`. If not even one sentence
+    fits, the first/last one is cut at a word boundary and marked with "…".
+    """
+    if max_tokens <= 0:
+        return ""
+    if counter.count(text) <= max_tokens:
+        return text
+    sentences = split_sentences(text)
+    if keep == "tail":
+        sentences.reverse()
+
+    kept: List[str] = []
+    used = 0
+    for s in sentences:
+        n = counter.count(s) + (1 if kept else 0)
+        if used + n > max_tokens:
+            break
+        kept.append(s)
+        used += n
+    if kept:
+        if keep == "tail":
+            kept.reverse()
+        return " ".join(kept)
+
+    words = sentences[0].split() if sentences else []
+    if keep == "tail":
+        words.reverse()
+    out: List[str] = []
+    for w in words:
+        if counter.count(" ".join([*out, w])) + 1 > max_tokens:
+            break
+        out.append(w)
+    if not out:
+        return ""
+    if keep == "tail":
+        out.reverse()
+        return "… " + " ".join(out)
+    return " ".join(out) + " …"
+
+
+# Shared by the prompt assembler and the usage calibration in the pipeline
+token_counter = TokenCounter()